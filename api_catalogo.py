@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import json
+from collections import namedtuple
+from flask import request, make_response
+from models import db, User, Produto, Cupom
+from categorias import obter_arvore
+from imagens import url_imagem
+from paginacao import paginar_keyset, limitar_por_pagina
+
+# --- API REST DE CATÁLOGO (/api/v1, somente leitura) ---
+# Para o app e os parceiros, que hoje raspam o HTML do catálogo. Cada campo
+# da resposta declara as colunas de que precisa: a query busca só as colunas
+# dos campos pedidos (?fields=), sem montar objetos do ORM, e o JOIN com
+# Usuarios só entra se o nome do vendedor for pedido.
+# As respostas têm ETag forte (hash do corpo), respondem 304 a If-None-Match
+# e vão com gzip quando o cliente aceita.
+
+POR_PAGINA_API = 50
+POR_PAGINA_API_MAXIMO = 200
+MAX_IDS = 100
+TAMANHO_MINIMO_GZIP = 1024  # bytes; abaixo disso a compressão não compensa
+MAX_AGE = 60  # segundos de cache no cliente
+
+# `colunas`: o que a query precisa selecionar; `valor(linha)`: o valor no JSON
+Campo = namedtuple('Campo', ['colunas', 'valor'])
+
+
+class ErroApi(Exception):
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _texto(valor):
+    return str(valor) if valor is not None else None
+
+
+def _data(valor):
+    return valor.isoformat() if valor is not None else None
+
+
+CAMPOS_PRODUTO = {
+    'id_produto': Campo((Produto.id_produto,), lambda l: l.id_produto),
+    'nome': Campo((Produto.nome,), lambda l: l.nome),
+    'descricao': Campo((Produto.descricao,), lambda l: l.descricao),
+    'preco': Campo((Produto.preco,), lambda l: _texto(l.preco)),
+    'estoque': Campo((Produto.estoque,), lambda l: l.estoque),
+    'categoria': Campo((Produto.categoria,), lambda l: l.categoria),
+    'id_categoria': Campo((Produto.id_categoria,), lambda l: l.id_categoria),
+    'id_vendedor': Campo((Produto.id_vendedor,), lambda l: l.id_vendedor),
+    'vendedor': Campo((User.nome.label('vendedor_nome'),), lambda l: l.vendedor_nome),
+    'imagem': Campo((Produto.id_produto, Produto.url_imagem),
+                    lambda l: url_imagem(l) if l.url_imagem else None),
+    'data_cadastro': Campo((Produto.data_cadastro,), lambda l: _data(l.data_cadastro)),
+}
+PADRAO_PRODUTOS = ('id_produto', 'nome', 'preco', 'estoque', 'categoria', 'imagem')
+
+CAMPOS_CUPOM = {
+    'id_cupom': Campo((Cupom.id_cupom,), lambda l: l.id_cupom),
+    'codigo': Campo((Cupom.codigo,), lambda l: l.codigo),
+    'tipo': Campo((Cupom.tipo,), lambda l: l.tipo),
+    'valor': Campo((Cupom.valor,), lambda l: _texto(l.valor)),
+}
+
+# Categorias vêm da árvore em memória (categorias.py), não de uma query
+CAMPOS_CATEGORIA = {
+    'id_categoria': Campo((), lambda no: no.id_categoria),
+    'id_pai': Campo((), lambda no: no.id_pai),
+    'nome': Campo((), lambda no: no.nome),
+    'caminho': Campo((), lambda no: no.caminho),
+    'nivel': Campo((), lambda no: no.nivel),
+    'total_produtos': Campo((), lambda no: no.total),
+}
+
+ORDENACOES_API = {
+    'nome': (Produto.nome, False),
+    'preco': (Produto.preco, False),
+    'preco_desc': (Produto.preco, True),
+    'recentes': (Produto.data_cadastro, True),
+    'id': (Produto.id_produto, False),
+}
+
+
+# --- Parâmetros ---
+
+def escolher_campos(parametro, campos, padrao=None):
+    """?fields=a,b -> ['a', 'b'] (todos, ou `padrao`, se ausente). ErroApi se houver campo desconhecido."""
+    if not parametro:
+        return list(padrao or campos)
+    pedidos = list(dict.fromkeys(nome.strip() for nome in parametro.split(',') if nome.strip()))
+    desconhecidos = [nome for nome in pedidos if nome not in campos]
+    if desconhecidos or not pedidos:
+        raise ErroApi(f"Campos inválidos: {', '.join(desconhecidos) or '(nenhum)'}. "
+                      f"Disponíveis: {', '.join(campos)}.")
+    return pedidos
+
+
+def ler_ids(parametro):
+    """?ids=3,1,2 -> [3, 1, 2] (sem repetidos, no máximo MAX_IDS)."""
+    try:
+        ids = list(dict.fromkeys(int(valor) for valor in parametro.split(',') if valor.strip()))
+    except ValueError:
+        raise ErroApi('ids deve ser uma lista de números separados por vírgula.')
+    if not ids or len(ids) > MAX_IDS:
+        raise ErroApi(f'Informe de 1 a {MAX_IDS} ids.')
+    return ids
+
+
+def serializar(linhas, campos, definicoes):
+    valores = [(nome, definicoes[nome].valor) for nome in campos]
+    return [{nome: valor(linha) for nome, valor in valores} for linha in linhas]
+
+
+# --- Consultas ---
+
+def _query_produtos(campos, extras=()):
+    colunas = {}
+    for nome in campos:
+        for coluna in CAMPOS_PRODUTO[nome].colunas:
+            colunas.setdefault(coluna.key, coluna)
+    for coluna in extras:
+        colunas.setdefault(coluna.key, coluna)
+    query = db.session.query(*colunas.values())
+    if 'vendedor' in campos:
+        query = query.join(User, User.id_usuario == Produto.id_vendedor)
+    return query
+
+
+def listar_produtos(args, campos):
+    """Página de produtos (ordem, categoria, cursor e por_pagina de `args`). Retorna (itens, próximo cursor)."""
+    ordem = args.get('ordem', 'nome')
+    if ordem not in ORDENACOES_API:
+        raise ErroApi(f"Ordem inválida. Use: {', '.join(ORDENACOES_API)}.")
+    coluna_ordem, decrescente = ORDENACOES_API[ordem]
+
+    # As colunas da ordenação entram na query para montar o cursor
+    query = _query_produtos(campos, extras=(coluna_ordem, Produto.id_produto))
+    categoria = args.get('categoria')
+    if categoria:
+        no = obter_arvore().buscar(categoria)
+        query = query.filter(Produto.id_categoria.in_(no.ids_subarvore if no else ()))
+
+    por_pagina = limitar_por_pagina(args.get('por_pagina'), padrao=POR_PAGINA_API, maximo=POR_PAGINA_API_MAXIMO)
+    colunas = (coluna_ordem, Produto.id_produto) if coluna_ordem is not Produto.id_produto else (Produto.id_produto,)
+    pagina = paginar_keyset(query, colunas, cursor=args.get('cursor'), por_pagina=por_pagina,
+                            decrescente=decrescente)
+    return serializar(pagina.itens, campos, CAMPOS_PRODUTO), pagina.proximo_cursor
+
+
+def produtos_por_id(ids, campos):
+    """Produtos de `ids`, na ordem pedida. Retorna (itens, ids não encontrados)."""
+    linhas = _query_produtos(campos, extras=(Produto.id_produto,)).filter(Produto.id_produto.in_(ids)).all()
+    por_id = {linha.id_produto: linha for linha in linhas}
+    encontrados = [por_id[id_produto] for id_produto in ids if id_produto in por_id]
+    return serializar(encontrados, campos, CAMPOS_PRODUTO), [i for i in ids if i not in por_id]
+
+
+def listar_cupons(campos):
+    colunas = {'id_cupom': Cupom.id_cupom}
+    for nome in campos:
+        colunas.update((coluna.key, coluna) for coluna in CAMPOS_CUPOM[nome].colunas)
+    linhas = db.session.query(*colunas.values()).filter(Cupom.ativo == True).order_by(Cupom.id_cupom)
+    return serializar(linhas, campos, CAMPOS_CUPOM)
+
+
+def listar_categorias(campos, ids=None):
+    arvore = obter_arvore()
+    if ids is not None:
+        nos = [arvore.por_id[i] for i in ids if i in arvore.por_id]
+    else:
+        nos = sorted(arvore.por_id.values(), key=lambda no: (no.nivel, no.caminho))
+    return serializar(nos, campos, CAMPOS_CATEGORIA)
+
+
+# --- Resposta ---
+
+def _aceita_gzip():
+    for parte in request.headers.get('Accept-Encoding', '').split(','):
+        codificacao, _, parametros = parte.partition(';')
+        if codificacao.strip() == 'gzip' and parametros.replace(' ', '') not in ('q=0', 'q=0.0'):
+            return True
+    return False
+
+
+def responder_json(dados, status=200, max_age=MAX_AGE):
+    """
+    JSON com ETag forte do corpo (304 se o cliente já tem esta versão) e
+    gzip quando aceito. A versão comprimida tem ETag própria (sufixo -gz).
+    """
+    corpo = json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha256(corpo).hexdigest()[:32]
+    comprimir = len(corpo) >= TAMANHO_MINIMO_GZIP and _aceita_gzip()
+    if comprimir:
+        etag += '-gz'
+
+    if status == 200 and request.if_none_match.contains(etag):
+        resposta = make_response('', 304)
+    else:
+        resposta = make_response(gzip.compress(corpo, compresslevel=6, mtime=0) if comprimir else corpo, status)
+        resposta.headers['Content-Type'] = 'application/json; charset=utf-8'
+        if comprimir:
+            resposta.headers['Content-Encoding'] = 'gzip'
+    resposta.set_etag(etag)
+    resposta.vary.add('Accept-Encoding')
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = max_age
+    return resposta
+
+
+def erro_json(mensagem, status):
+    resposta = make_response(json.dumps({'erro': mensagem}, ensure_ascii=False), status)
+    resposta.headers['Content-Type'] = 'application/json; charset=utf-8'
+    return resposta
@@ -2,15 +2,43 @@ import os
 import secrets
 import string
 import collections
-import locale 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from flask_bcrypt import Bcrypt
+import mimetypes
+import io
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, make_response, send_file
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from functools import wraps
 from dotenv import load_dotenv
-from models import db, User, Produto, Cupom, Pedido, ItensPedido, ItemCarrinho
-from sqlalchemy import or_, func
-from decimal import Decimal
+from models import db, User, Produto, Cupom, Pedido, ItensPedido, ItemCarrinho, VendasProduto, VendasProdutoDia
+from vitrines import obter_vitrines, invalidar_vitrines
+from categorias import obter_arvore, invalidar_categorias, garantir_categoria
+from paginacao import paginar_keyset, limitar_por_pagina
+from busca import obter_indice, obter_prefixos, indexar_produto, desindexar_produto, registrar_pesos, invalidar_indices
+from precificacao import resumo_carrinho, invalidar_carrinho, invalidar_precos, invalidar_cupons
+from checkout import finalizar_compra, CarrinhoVazio, EstoqueInsuficiente
+from carrinho import (ItemNaoEncontrado, ProdutoNaoEncontrado, QuantidadeIndisponivel, ler_inteiro,
+                      adicionar_item, alterar_quantidade, remover_item, cupom_ativo,
+                      serializar_linha, serializar_totais)
+from usuarios import carregar_usuario, invalidar_usuario
+from senhas import ServicoSenhasOcupado
+from recomendacoes import recomendar_produtos, registrar_cesta
+from imagens import (LARGURAS, MIME, ImagemIndisponivel, escolher_formato, variante,
+                     url_imagem, srcset_imagem, url_estatica, srcset_estatico)
+from assets import iniciar_assets, localizar_asset
+from paginas import pagina_em_cache, invalidar_paginas, estatisticas_paginas
+from formatacao import formatar_brl
+from fragmentos import card_produto, estatisticas_fragmentos
+from metricas import iniciar_metricas, registrar_coletor, texto_prometheus
+from importacao import importar_produtos, ler_linhas, formato_do_arquivo
+from relatorios import relatorio_vendas, AGRUPAMENTOS
+from tarefas import enfileirar, iniciar_worker_embutido, metricas_tarefas, estatisticas_tarefas
+from api_catalogo import (ErroApi, CAMPOS_PRODUTO, PADRAO_PRODUTOS, CAMPOS_CATEGORIA, CAMPOS_CUPOM,
+                          escolher_campos, ler_ids, listar_produtos, produtos_por_id, listar_categorias,
+                          listar_cupons, responder_json, erro_json)
+from replicas import configurar_replicas, iniciar_replicas, ler_de_replica, metricas_replicas, estado_replicas
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
 
 # --- CONFIGURAÇÃO INICIAL ---
 load_dotenv()
@@ -18,39 +46,44 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('mssql+pyodbc'):
+    # executemany em lote no driver (importação de produtos, itens do pedido)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'fast_executemany': True}
+# Réplicas de leitura (opcional): URLs separadas por vírgula (ver replicas.py)
+configurar_replicas(app, os.getenv('DATABASE_REPLICA_URLS'))
 
 db.init_app(app)
-bcrypt = Bcrypt(app)
+iniciar_replicas(app, db)
+iniciar_assets(app)
+iniciar_metricas(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Você precisa estar logado para acessar esta página.'
 login_manager.login_message_category = 'info'
 
-# --- CONFIGURAÇÃO DE MOEDA (LOCALE) ---
-try:
-    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
-except locale.Error:
-    try:
-        locale.setlocale(locale.LC_ALL, 'Portuguese_Brazil.1252')
-    except locale.Error:
-        locale.setlocale(locale.LC_ALL, '')
-        print("Aviso: Locale 'pt_BR' não encontrado. Formatando com o padrão do sistema.")
-
+# --- FORMATAÇÃO DE MOEDA ---
 @app.template_filter('currency')
 def format_currency(value):
     """Formata um valor (Decimal ou float) como moeda BRL."""
-    if value is None:
-        return "R$ 0,00"
-    try:
-        return locale.currency(float(value), grouping=True, symbol='R$')
-    except (TypeError, ValueError):
-        return str(value)
+    return formatar_brl(value)
+
+app.jinja_env.globals.update(url_imagem=url_imagem, srcset_imagem=srcset_imagem,
+                             url_estatica=url_estatica, srcset_estatico=srcset_estatico,
+                             card_produto=card_produto)
 
 # --- GERENCIAMENTO DE LOGIN ---
+@app.errorhandler(ServicoSenhasOcupado)
+def senhas_ocupado(erro):
+    """Pool de hash de senhas cheio: pede para o cliente tentar de novo."""
+    db.session.rollback()
+    resposta = make_response('Muitos acessos no momento. Tente novamente em alguns segundos.', 503)
+    resposta.headers['Retry-After'] = '2'
+    return resposta
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.filter_by(id_usuario=int(user_id)).first()
+    return carregar_usuario(int(user_id))
 
 def admin_required(f):
     @wraps(f)
@@ -82,6 +115,11 @@ def login():
         user = User.query.filter_by(email=email).first()
 
         if user and user.check_password(senha):
+            # Hash antigo (outro algoritmo/custo): refaz agora que temos a senha
+            if user.precisa_rehash():
+                user.set_password(senha)
+                db.session.commit()
+                invalidar_usuario(user.id_usuario)
             login_user(user)
             flash('Login realizado com sucesso!', 'success')
             return redirect(url_for('home'))
@@ -164,6 +202,7 @@ def meu_perfil():
             flash('Senha alterada com sucesso!', 'success')
         
         db.session.commit()
+        invalidar_usuario(user.id_usuario)
         
         if not nova_senha:
             flash('Perfil atualizado com sucesso!', 'success')
@@ -175,122 +214,249 @@ def meu_perfil():
 # --- ROTAS PRINCIPAIS (E-COMMERCE) ---
 
 @app.route('/')
+@ler_de_replica
+@pagina_em_cache('vitrines')
 def home():
-    # 1. Novidades (10 mais recentes)
-    produtos_recentes = Produto.query.order_by(Produto.data_cadastro.desc()).limit(10).all()
-    
-    # ========================================
-    #           (SQL CORRIGIDO)
-    # Adicionadas todas as colunas de Produto ao GROUP BY
-    # ========================================
-    query_mais_vendidos = db.session.query(
-        Produto, func.sum(ItensPedido.quantidade).label('total_vendido')
-    ).join(
-        ItensPedido, Produto.id_produto == ItensPedido.id_produto
-    ).group_by(
-        Produto.id_produto,
-        Produto.id_vendedor,
-        Produto.nome,
-        Produto.descricao,
-        Produto.preco,
-        Produto.estoque,
-        Produto.categoria,
-        Produto.url_imagem,
-        Produto.data_cadastro
-    ).order_by(
-        func.sum(ItensPedido.quantidade).desc()
-    ).limit(10).all()
-    
-    mais_vendidos = [produto for produto, total in query_mais_vendidos]
-
-    # 3. Categoria Específica (Relógios de Luxo)
-    relogios_luxo = Produto.query.filter(
-        Produto.categoria.startswith('Relógios de Luxo')
-    ).order_by(Produto.data_cadastro.desc()).limit(10).all()
+    # As vitrines (Novidades, Mais Vendidos, Relógios de Luxo e Em Destaque)
+    # são pré-calculadas em vitrines.py e mantidas pelos contadores de vendas.
+    return render_template('home.html', **obter_vitrines())
 
-    # 4. Em Destaque (10 com mais estoque)
-    produtos_destaque = Produto.query.order_by(Produto.estoque.desc()).limit(10).all()
-
-    return render_template('home.html', 
-                           produtos_recentes=produtos_recentes,
-                           mais_vendidos=mais_vendidos,
-                           relogios_luxo=relogios_luxo,
-                           produtos_destaque=produtos_destaque
-                           )
 
+# Ordenações do catálogo: chave da URL -> (coluna de ordenação, decrescente)
+ORDENACOES_CATALOGO = {
+    'nome': (Produto.nome, False),
+    'preco': (Produto.preco, False),
+    'preco_desc': (Produto.preco, True),
+    'recentes': (Produto.data_cadastro, True),
+}
 
 @app.route('/catalogo')
+@ler_de_replica
+@pagina_em_cache('catalogo')
 def catalogo():
     categoria = request.args.get('categoria')
-    query = Produto.query
+    ordem = request.args.get('ordem', 'nome')
+    if ordem not in ORDENACOES_CATALOGO:
+        ordem = 'nome'
+    coluna_ordem, decrescente = ORDENACOES_CATALOGO[ordem]
+    por_pagina = limitar_por_pagina(request.args.get('por_pagina'))
+
+    query = Produto.query.options(joinedload(Produto.vendedor))
     
     if categoria:
-        query = query.filter(Produto.categoria.startswith(categoria))
-    
-    todos_produtos = query.order_by(Produto.nome).all()
-    
-    categorias_db = db.session.query(Produto.categoria).distinct().all()
-    categorias_set = set()
-    for cat_tuple in categorias_db:
-        if cat_tuple[0]:
-            primeira_categoria = cat_tuple[0].split('/')[0].strip()
-            if primeira_categoria:
-                categorias_set.add(primeira_categoria)
-    
-    categorias = sorted(list(categorias_set))
+        no_categoria = obter_arvore().buscar(categoria)
+        ids_categorias = no_categoria.ids_subarvore if no_categoria else ()
+        query = query.filter(Produto.id_categoria.in_(ids_categorias))
     
+    pagina = paginar_keyset(query, (coluna_ordem, Produto.id_produto),
+                            cursor=request.args.get('cursor'),
+                            por_pagina=por_pagina,
+                            decrescente=decrescente)
+
+    proxima_url = None
+    if pagina.tem_proxima:
+        proxima_url = url_for('catalogo', categoria=categoria, ordem=ordem,
+                              por_pagina=request.args.get('por_pagina'),
+                              cursor=pagina.proximo_cursor)
+
+    # Rolagem infinita: o main.js pede só os cards da próxima página
+    if request.args.get('parcial'):
+        resposta = make_response(render_template('catalogo_cards.html', produtos=pagina.itens))
+        if proxima_url:
+            resposta.headers['X-Proxima-Pagina'] = proxima_url
+        return resposta
+
     return render_template('catalogo.html', 
-                           produtos=todos_produtos, 
-                           categorias=categorias, 
-                           categoria_selecionada=categoria)
+                           produtos=pagina.itens, 
+                           categorias=[no for no in obter_arvore().raizes if no.total > 0], 
+                           categoria_selecionada=categoria,
+                           ordem_selecionada=ordem,
+                           proxima_url=proxima_url)
 
 @app.route('/produto/<int:id>')
+@ler_de_replica
+@pagina_em_cache('produto:{id}')
 def detalhes(id):
     produto = Produto.query.get_or_404(id)
-    return render_template('detalhes.html', produto=produto)
+    return render_template('detalhes.html', produto=produto,
+                           produtos_recomendados=recomendar_produtos([produto.id_produto]))
 
 @app.route('/venda')
 @login_required
 @seller_required
 def venda():
+    query = Produto.query.options(joinedload(Produto.vendedor))
     if current_user.tipo_usuario == 'admin':
-        produtos_vendedor = Produto.query.order_by(Produto.nome).all()
+        produtos_vendedor = query.order_by(Produto.nome).all()
     else:
-        produtos_vendedor = Produto.query.filter_by(id_vendedor=current_user.id_usuario).order_by(Produto.nome).all()
+        produtos_vendedor = query.filter_by(id_vendedor=current_user.id_usuario).order_by(Produto.nome).all()
         
     return render_template('venda.html', produtos=produtos_vendedor)
 
 @app.route('/cupons')
+@ler_de_replica
+@pagina_em_cache('cupons')
 def cupons():
     cupons_ativos = Cupom.query.filter_by(ativo=True).all()
     return render_template('cupom.html', cupons=cupons_ativos)
 
+PEDIDOS_POR_PAGINA = 10
+
 @app.route('/pedidos')
+@ler_de_replica
 @login_required
 def pedidos():
-    meus_pedidos = Pedido.query.filter_by(id_usuario=current_user.id_usuario).order_by(Pedido.data_pedido.desc()).all()
-    return render_template('pedidos.html', pedidos=meus_pedidos)
+    # ?resumo=1 mostra só a contagem de itens; os itens são carregados ao expandir
+    modo_resumo = request.args.get('resumo') == '1'
+    por_pagina = limitar_por_pagina(request.args.get('por_pagina'), padrao=PEDIDOS_POR_PAGINA)
+    colunas = (Pedido.data_pedido, Pedido.id_pedido)
+
+    if modo_resumo:
+        total_itens = db.select(func.count(ItensPedido.id_item_pedido)).where(
+            ItensPedido.id_pedido == Pedido.id_pedido
+        ).correlate(Pedido).scalar_subquery()
+        query = db.session.query(Pedido, total_itens).filter(Pedido.id_usuario == current_user.id_usuario)
+        pagina = paginar_keyset(query, colunas, request.args.get('cursor'), por_pagina, decrescente=True,
+                                extrair=lambda linha: [linha[0].data_pedido, linha[0].id_pedido])
+        meus_pedidos = [pedido for pedido, _ in pagina.itens]
+        contagem_itens = {pedido.id_pedido: total for pedido, total in pagina.itens}
+    else:
+        query = Pedido.query.filter_by(id_usuario=current_user.id_usuario).options(
+            selectinload(Pedido.itens).joinedload(ItensPedido.produto)
+        )
+        pagina = paginar_keyset(query, colunas, request.args.get('cursor'), por_pagina, decrescente=True)
+        meus_pedidos = pagina.itens
+        contagem_itens = None
+
+    proxima_url = None
+    if pagina.tem_proxima:
+        proxima_url = url_for('pedidos', cursor=pagina.proximo_cursor,
+                              resumo='1' if modo_resumo else None,
+                              por_pagina=request.args.get('por_pagina'))
+
+    return render_template('pedidos.html',
+                           pedidos=meus_pedidos,
+                           modo_resumo=modo_resumo,
+                           contagem_itens=contagem_itens,
+                           proxima_url=proxima_url)
+
+@app.route('/pedidos/<int:id_pedido>/itens')
+@ler_de_replica
+@login_required
+def pedido_itens(id_pedido):
+    """Linhas de um pedido (fragmento HTML), usado pelo modo resumo."""
+    pedido = Pedido.query.get_or_404(id_pedido)
+    if pedido.id_usuario != current_user.id_usuario:
+        return 'Acesso não autorizado.', 403
+
+    itens = ItensPedido.query.options(joinedload(ItensPedido.produto)).filter_by(
+        id_pedido=id_pedido
+    ).order_by(ItensPedido.id_item_pedido).all()
+    return render_template('pedidos_itens.html', itens=itens)
+
+# --- ASSETS COM HASH (CSS/JS/IMAGENS) ---
+@app.route('/assets/<path:nome>')
+def asset(nome):
+    encontrado = localizar_asset(nome, request.headers.get('Accept-Encoding'))
+    if encontrado is None:
+        return 'Arquivo não encontrado.', 404
+    caminho, codificacao, original = encontrado
+
+    resposta = send_file(caminho, mimetype=mimetypes.guess_type(original)[0] or 'application/octet-stream',
+                         conditional=True, max_age=31536000)
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    resposta.vary.add('Accept-Encoding')
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    return resposta
+
+# --- IMAGENS REDIMENSIONADAS ---
+def _responder_imagem(origem, largura):
+    if largura not in LARGURAS:
+        return 'Tamanho de imagem não suportado.', 404
+
+    try:
+        dados, formato, etag = variante(origem, largura, escolher_formato(request.headers.get('Accept')))
+    except ImagemIndisponivel:
+        # Sem conseguir processar, deixa o navegador buscar a original
+        if origem.startswith(('http://', 'https://')):
+            return redirect(origem)
+        return 'Imagem não encontrada.', 404
+
+    resposta = make_response(dados)
+    resposta.headers['Content-Type'] = MIME[formato]
+    resposta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    resposta.headers['Vary'] = 'Accept'
+    resposta.set_etag(etag)
+    return resposta.make_conditional(request)
+
+@app.route('/img/<int:id_produto>/<int:largura>')
+def imagem_produto(id_produto, largura):
+    origem = db.session.query(Produto.url_imagem).filter_by(id_produto=id_produto).scalar()
+    if not origem:
+        return 'Imagem não encontrada.', 404
+    return _responder_imagem(origem, largura)
+
+@app.route('/img/estatico/<int:largura>/<path:arquivo>')
+def imagem_estatica(largura, arquivo):
+    return _responder_imagem('static/' + arquivo, largura)
 
 @app.route('/sobre')
 def sobre():
     return render_template('sobre.html')
 
 @app.route('/search')
+@ler_de_replica
 def search():
     query = request.args.get('query')
     if not query:
         flash('Digite algo para pesquisar.', 'info')
         return redirect(request.referrer or url_for('home'))
     
-    search_term = f"%{query}%"
-    
-    produtos_encontrados = Produto.query.filter(
-        or_(Produto.nome.ilike(search_term), Produto.descricao.ilike(search_term), Produto.categoria.ilike(search_term))
-    ).all()
+    try:
+        pagina = max(1, int(request.args.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    por_pagina = limitar_por_pagina(request.args.get('por_pagina'))
+
+    # Ranking feito pelo índice em memória (busca.py); o banco só carrega a página
+    ids, total = obter_indice().buscar(query, inicio=(pagina - 1) * por_pagina, limite=por_pagina)
+
+    produtos_encontrados = []
+    if ids:
+        por_id = {
+            p.id_produto: p for p in Produto.query.options(joinedload(Produto.vendedor))
+            .filter(Produto.id_produto.in_(ids)).all()
+        }
+        produtos_encontrados = [por_id[i] for i in ids if i in por_id]
     
     return render_template('search_results.html', 
                            query=query, 
-                           produtos=produtos_encontrados)
+                           produtos=produtos_encontrados,
+                           total=total,
+                           pagina=pagina,
+                           tem_proxima=pagina * por_pagina < total)
+
+@app.route('/api/search/suggest')
+@ler_de_replica
+def search_suggest():
+    try:
+        limite = max(1, min(int(request.args.get('limite', 8)), 20))
+    except ValueError:
+        limite = 8
+    produtos, categorias = obter_prefixos().sugerir(request.args.get('q', ''), limite)
+
+    sugestoes = [
+        {'tipo': 'produto', 'texto': nome, 'url': url_for('detalhes', id=id_produto)}
+        for id_produto, nome in produtos
+    ] + [
+        {'tipo': 'categoria', 'texto': caminho, 'url': url_for('catalogo', categoria=caminho)}
+        for caminho in categorias
+    ]
+    resposta = jsonify(sugestoes=sugestoes)
+    resposta.headers['Cache-Control'] = 'public, max-age=60'
+    return resposta
 
 # --- ROTAS DO CARRINHO ---
 
@@ -307,220 +473,195 @@ def carrinho():
             flash('Cupom removido.', 'info')
             return redirect(url_for('carrinho'))
 
-        cupom = Cupom.query.filter_by(codigo=codigo_cupom, ativo=True).first()
-        
-        if cupom:
-            session['cupom_codigo'] = cupom.codigo
-            flash(f'Cupom "{cupom.codigo}" aplicado com sucesso!', 'success')
+        codigo = cupom_ativo(codigo_cupom)
+        if codigo:
+            session['cupom_codigo'] = codigo
+            flash(f'Cupom "{codigo}" aplicado com sucesso!', 'success')
         else:
             flash('Cupom inválido ou expirado.', 'danger')
         return redirect(url_for('carrinho'))
 
-    itens_carrinho = ItemCarrinho.query.filter_by(id_usuario=current_user.id_usuario).all()
-    
-    subtotal = Decimal('0.00')
-    for item in itens_carrinho:
-        subtotal += item.produto.preco * item.quantidade
-        
-    cupom_aplicado = None
-    desconto = Decimal('0.00') 
-    cupom_codigo_sessao = session.get('cupom_codigo')
-    
-    if cupom_codigo_sessao:
-        cupom_aplicado = Cupom.query.filter_by(codigo=cupom_codigo_sessao, ativo=True).first()
-        if cupom_aplicado:
-            if cupom_aplicado.tipo == 'porcentagem':
-                desconto = (subtotal * cupom_aplicado.valor) / 100
-            elif cupom_aplicado.tipo == 'fixo':
-                desconto = cupom_aplicado.valor
-            
-            desconto = min(desconto, subtotal) 
-        else:
-            session.pop('cupom_codigo', None)
-            flash('O cupom aplicado anteriormente não é mais válido.', 'info')
-
-    total = subtotal - desconto
+    resumo = resumo_carrinho(current_user.id_usuario, session.get('cupom_codigo'))
+    if resumo.cupom_invalido:
+        session.pop('cupom_codigo', None)
+        flash('O cupom aplicado anteriormente não é mais válido.', 'info')
 
-    produtos_recomendados = []
-    if itens_carrinho:
-        ids_no_carrinho = [item.id_produto for item in itens_carrinho]
-        
-        categorias_no_carrinho = set()
-        for item in itens_carrinho:
-            categoria_principal = item.produto.categoria.split('/')[0].strip()
-            if categoria_principal:
-                categorias_no_carrinho.add(categoria_principal)
-        
-        if categorias_no_carrinho:
-            filtros_categoria = [Produto.categoria.startswith(cat) for cat in categorias_no_carrinho]
-            
-            produtos_recomendados = Produto.query.filter(
-                or_(*filtros_categoria),
-                Produto.id_produto.notin_(ids_no_carrinho)
-            ).limit(4).all()
+    produtos_recomendados = recomendar_produtos([linha.id_produto for linha in resumo.linhas])
 
     return render_template('carrinho.html', 
-                           itens_carrinho=itens_carrinho, 
-                           subtotal=subtotal,
-                           desconto=desconto,
-                           total=total,
-                           cupom_aplicado=cupom_aplicado,
+                           itens_carrinho=resumo.linhas, 
+                           subtotal=resumo.subtotal,
+                           desconto=resumo.desconto,
+                           total=resumo.total,
+                           cupom_aplicado=resumo.cupom,
                            produtos_recomendados=produtos_recomendados)
 
 
 @app.route('/add-carrinho', methods=['POST'])
 @login_required
 def add_carrinho():
-    produto_id = request.form.get('produto_id')
+    quantidade = ler_inteiro(request.form.get('quantidade', 1), padrao=1)
     try:
-        quantidade = int(request.form.get('quantidade', 1))
-        if quantidade <= 0:
-            quantidade = 1
-    except ValueError:
-        quantidade = 1
-
-    produto = Produto.query.get(produto_id)
-    if not produto:
+        nome, existia = adicionar_item(current_user.id_usuario, request.form.get('produto_id', type=int), quantidade)
+    except ProdutoNaoEncontrado:
         flash('Produto não encontrado.', 'danger')
-        return redirect(request.referrer)
-        
-    item_existente = ItemCarrinho.query.filter_by(
-        id_usuario=current_user.id_usuario, 
-        id_produto=produto_id
-    ).first()
-    
-    if item_existente:
-        item_existente.quantidade += quantidade
-        flash(f'Quantidade de "{produto.nome}" atualizada no carrinho!', 'info')
+        return redirect(request.referrer or url_for('catalogo'))
+
+    if existia:
+        flash(f'Quantidade de "{nome}" atualizada no carrinho!', 'info')
     else:
-        novo_item = ItemCarrinho(
-            id_usuario=current_user.id_usuario,
-            id_produto=produto_id,
-            quantidade=quantidade
-        )
-        db.session.add(novo_item)
-        flash(f'"{produto.nome}" adicionado ao carrinho!', 'success')
-        
-    db.session.commit()
+        flash(f'"{nome}" adicionado ao carrinho!', 'success')
     return redirect(url_for('carrinho'))
 
 
 @app.route('/remove-carrinho/<int:id_item>', methods=['POST'])
 @login_required
 def remove_carrinho(id_item):
-    item = ItemCarrinho.query.get_or_404(id_item)
-    
-    if item.id_usuario != current_user.id_usuario:
-        flash('Acesso não autorizado.', 'danger')
-        return redirect(url_for('carrinho'))
-        
-    db.session.delete(item)
-    db.session.commit()
-    flash('Item removido do carrinho.', 'info')
+    try:
+        remover_item(current_user.id_usuario, id_item)
+        flash('Item removido do carrinho.', 'info')
+    except ItemNaoEncontrado:
+        flash('Item não encontrado no carrinho.', 'danger')
     return redirect(url_for('carrinho'))
 
 
 @app.route('/update-carrinho/<int:id_item>', methods=['POST'])
 @login_required
 def update_carrinho(id_item):
-    item = ItemCarrinho.query.get_or_404(id_item)
-    
-    if item.id_usuario != current_user.id_usuario:
-        flash('Acesso não autorizado.', 'danger')
-        return redirect(url_for('carrinho'))
-
     try:
-        quantidade = int(request.form.get('quantidade'))
-        if quantidade <= 0:
-            return remove_carrinho(id_item)
-        
-        if quantidade > item.produto.estoque:
-            flash(f'Estoque insuficiente. Temos apenas {item.produto.estoque} unidades.', 'danger')
-            return redirect(url_for('carrinho'))
-            
-        item.quantidade = quantidade
-        db.session.commit()
-        flash('Quantidade atualizada.', 'info')
-        
+        if alterar_quantidade(current_user.id_usuario, id_item, ler_inteiro(request.form.get('quantidade'))):
+            flash('Quantidade atualizada.', 'info')
+        else:
+            flash('Item removido do carrinho.', 'info')
     except ValueError:
         flash('Quantidade inválida.', 'danger')
-        
+    except QuantidadeIndisponivel as erro:
+        flash(str(erro), 'danger')
+    except ItemNaoEncontrado:
+        flash('Item não encontrado no carrinho.', 'danger')
     return redirect(url_for('carrinho'))
 
 
+# --- API DO CARRINHO (JSON) ---
+# Mesmas operações dos formulários acima, mas a resposta traz só a linha
+# alterada e os novos totais: o main.js atualiza a página do carrinho sem
+# recarregá-la (sem recomendações, sem redirect). Aceita JSON ou formulário.
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify(erro='Faça login para usar o carrinho.'), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _dados_api():
+    return request.get_json(silent=True) or request.form
+
+def responder_carrinho(mensagem=None, id_item=None, status=200, **extras):
+    """Totais do carrinho e, se `id_item`, a linha desse item (None se saiu do carrinho)."""
+    resumo = resumo_carrinho(current_user.id_usuario, session.get('cupom_codigo'))
+    if resumo.cupom_invalido:
+        session.pop('cupom_codigo', None)
+    corpo = dict(extras, totais=serializar_totais(resumo), mensagem=mensagem)
+    if id_item is not None:
+        linha = resumo.linha(id_item)
+        corpo['linha'] = serializar_linha(linha) if linha else None
+        corpo['id_item'] = id_item
+    return jsonify(corpo), status
+
+def erro_carrinho(mensagem, status):
+    return jsonify(erro=mensagem), status
+
+@app.route('/api/cart')
+@api_login_required
+def api_carrinho():
+    resumo = resumo_carrinho(current_user.id_usuario, session.get('cupom_codigo'))
+    return jsonify(linhas=[serializar_linha(linha) for linha in resumo.linhas],
+                   totais=serializar_totais(resumo))
+
+@app.route('/api/cart/items', methods=['POST'])
+@api_login_required
+def api_carrinho_adicionar():
+    dados = _dados_api()
+    id_produto = ler_inteiro(dados.get('produto_id'), padrao=0)
+    try:
+        nome, existia = adicionar_item(current_user.id_usuario, id_produto,
+                                       ler_inteiro(dados.get('quantidade', 1), padrao=1))
+    except ProdutoNaoEncontrado:
+        return erro_carrinho('Produto não encontrado.', 404)
+
+    resumo = resumo_carrinho(current_user.id_usuario, session.get('cupom_codigo'))
+    linha = next((linha for linha in resumo.linhas if linha.id_produto == id_produto), None)
+    mensagem = f'Quantidade de "{nome}" atualizada no carrinho!' if existia else f'"{nome}" adicionado ao carrinho!'
+    return responder_carrinho(mensagem, linha.id_item_carrinho if linha else None,
+                              status=200 if existia else 201)
+
+@app.route('/api/cart/items/<int:id_item>', methods=['PATCH', 'DELETE'])
+@api_login_required
+def api_carrinho_item(id_item):
+    try:
+        if request.method == 'DELETE':
+            remover_item(current_user.id_usuario, id_item)
+            return responder_carrinho('Item removido do carrinho.', id_item)
+        quantidade = ler_inteiro(_dados_api().get('quantidade'))
+        if alterar_quantidade(current_user.id_usuario, id_item, quantidade):
+            return responder_carrinho('Quantidade atualizada.', id_item)
+        return responder_carrinho('Item removido do carrinho.', id_item)
+    except ValueError:
+        return erro_carrinho('Quantidade inválida.', 400)
+    except QuantidadeIndisponivel as erro:
+        return jsonify(erro=str(erro), estoque=erro.estoque), 409
+    except ItemNaoEncontrado:
+        return erro_carrinho('Item não encontrado no carrinho.', 404)
+
+@app.route('/api/cart/coupon', methods=['PUT', 'DELETE'])
+@api_login_required
+def api_carrinho_cupom():
+    if request.method == 'DELETE' or not _dados_api().get('codigo_cupom'):
+        session.pop('cupom_codigo', None)
+        return responder_carrinho('Cupom removido.')
+
+    codigo = cupom_ativo(_dados_api().get('codigo_cupom'))
+    if not codigo:
+        return erro_carrinho('Cupom inválido ou expirado.', 422)
+    session['cupom_codigo'] = codigo
+    return responder_carrinho(f'Cupom "{codigo}" aplicado com sucesso!')
+
+
 # --- ROTA DE CHECKOUT E DEVOLUÇÃO ---
 
 @app.route('/finalizar-pedido', methods=['POST'])
 @login_required
 def finalizar_pedido():
-    itens_carrinho = ItemCarrinho.query.filter_by(id_usuario=current_user.id_usuario).all()
-    
-    if not itens_carrinho:
-        flash('Seu carrinho está vazio.', 'danger')
-        return redirect(url_for('carrinho'))
-
-    # 1. VERIFICAÇÃO DE ESTOQUE
-    for item in itens_carrinho:
-        if item.quantidade > item.produto.estoque:
-            flash(f'Erro: Estoque insuficiente para "{item.produto.nome}". Temos apenas {item.produto.estoque} unidades. Pedido não finalizado.', 'danger')
-            return redirect(url_for('carrinho'))
-
-    # 2. CÁLCULO DO TOTAL
-    subtotal = Decimal('0.00')
-    for item in itens_carrinho:
-        subtotal += item.produto.preco * item.quantidade
-        
-    desconto = Decimal('0.00') 
-    cupom_codigo_sessao = session.get('cupom_codigo')
-    
-    if cupom_codigo_sessao:
-        cupom_aplicado = Cupom.query.filter_by(codigo=cupom_codigo_sessao, ativo=True).first()
-        if cupom_aplicado:
-            if cupom_aplicado.tipo == 'porcentagem':
-                desconto = (subtotal * cupom_aplicado.valor) / 100
-            elif cupom_aplicado.tipo == 'fixo':
-                desconto = cupom_aplicado.valor
-            desconto = min(desconto, subtotal)
-
-    total = subtotal - desconto
-
-    # 3. CRIAÇÃO DO PEDIDO
+    # Pedido, baixa de estoque e itens numa única transação (checkout.py)
     try:
-        novo_pedido = Pedido(
-            id_usuario=current_user.id_usuario,
-            valor_total=total,
-            status='Enviado' 
-        )
-        db.session.add(novo_pedido)
-        db.session.commit() 
-
-        for item in itens_carrinho:
-            produto = item.produto 
-            
-            novo_item_pedido = ItensPedido(
-                id_pedido=novo_pedido.id_pedido,
-                id_produto=item.id_produto,
-                quantidade=item.quantidade,
-                preco_unitario=produto.preco 
-            )
-            
-            produto.estoque -= item.quantidade
-            
-            db.session.add(novo_item_pedido)
-            db.session.delete(item) 
+        novo_pedido, vendidos = finalizar_compra(current_user.id_usuario, session.get('cupom_codigo'))
 
-        session.pop('cupom_codigo', None)
-        
-        db.session.commit()
+    except CarrinhoVazio:
+        flash('Seu carrinho está vazio.', 'danger')
+        return redirect(url_for('carrinho'))
 
-        flash('Pedido finalizado com sucesso!', 'success')
-        return redirect(url_for('pedidos'))
+    except EstoqueInsuficiente as e:
+        flash(f'Erro: Estoque insuficiente para "{e.nome}". Temos apenas {e.estoque} unidades. Pedido não finalizado.', 'danger')
+        return redirect(url_for('carrinho'))
 
     except Exception as e:
-        db.session.rollback() 
         flash(f'Ocorreu um erro ao finalizar seu pedido: {e}', 'danger')
         return redirect(url_for('carrinho'))
 
+    session.pop('cupom_codigo', None)
+    invalidar_carrinho(current_user.id_usuario)
+    invalidar_precos()
+    invalidar_vitrines()
+    # Estoque dos produtos vendidos mudou (página do produto e Home)
+    invalidar_paginas('vitrines', *(f'produto:{id_produto}' for id_produto, _ in vendidos))
+    registrar_pesos(vendidos)
+    registrar_cesta([id_produto for id_produto, _ in vendidos], novo_pedido.id_pedido)
+
+    flash('Pedido finalizado com sucesso!', 'success')
+    return redirect(url_for('pedidos'))
+
 
 @app.route('/solicitar-devolucao/<int:id_pedido>', methods=['POST'])
 @login_required
@@ -535,7 +676,13 @@ def solicitar_devolucao(id_pedido):
 
     if pedido.status in status_permitidos:
         pedido.status = 'Devolução Solicitada'
+        devolvidos = [(item.id_produto, item.quantidade) for item in pedido.itens]
+        # Contadores e resumo dos relatórios são descontados pelo worker
+        enfileirar('devolucao_pedido', id_pedido=pedido.id_pedido)
         db.session.commit()
+        invalidar_vitrines()
+        invalidar_paginas('vitrines')
+        registrar_pesos(devolvidos, sinal=-1)
         flash(f'Solicitação de devolução para o Pedido #{pedido.id_pedido} foi enviada.', 'success')
     else:
         flash(f'Este pedido não pode ser devolvido (Status: {pedido.status}).', 'info')
@@ -544,23 +691,218 @@ def solicitar_devolucao(id_pedido):
 
 
 # --- ROTAS DE ADMIN ---
+ADMIN_POR_PAGINA = 10
+
+# Pedidos que precisam de atenção aparecem primeiro no painel
+PRIORIDADE_PEDIDOS = {'Devolução Solicitada': 2, 'pendente': 1}
+
+def pagina_admin(secao, cursor=None, por_pagina=ADMIN_POR_PAGINA):
+    """Uma página (keyset) de uma seção do painel, com as relações já carregadas."""
+    if secao == 'usuarios':
+        return paginar_keyset(User.query, (User.id,), cursor, por_pagina)
+    if secao == 'produtos':
+        return paginar_keyset(Produto.query.options(joinedload(Produto.vendedor)),
+                              (Produto.id_produto,), cursor, por_pagina)
+    if secao == 'cupons':
+        return paginar_keyset(Cupom.query, (Cupom.id_cupom,), cursor, por_pagina)
+    if secao == 'pedidos':
+        prioridade = db.case(
+            *[(Pedido.status == status, valor) for status, valor in PRIORIDADE_PEDIDOS.items()],
+            else_=0
+        )
+        return paginar_keyset(
+            Pedido.query.options(joinedload(Pedido.comprador)),
+            (prioridade, Pedido.data_pedido, Pedido.id_pedido), cursor, por_pagina,
+            decrescente=True,
+            extrair=lambda p: [PRIORIDADE_PEDIDOS.get(p.status, 0), p.data_pedido, p.id_pedido]
+        )
+    return None
+
+def serializar_admin(secao, item):
+    if secao == 'usuarios':
+        return {'id': item.id, 'id_usuario': item.id_usuario, 'nome': item.nome,
+                'email': item.email, 'tipo_usuario': item.tipo_usuario}
+    if secao == 'produtos':
+        return {'id_produto': item.id_produto, 'nome': item.nome, 'vendedor': item.vendedor.nome,
+                'preco': str(item.preco), 'estoque': item.estoque}
+    if secao == 'cupons':
+        return {'id_cupom': item.id_cupom, 'codigo': item.codigo, 'tipo': item.tipo,
+                'valor': str(item.valor), 'ativo': item.ativo}
+    return {'id_pedido': item.id_pedido, 'cliente': item.comprador.nome,
+            'data_pedido': item.data_pedido.isoformat(), 'valor_total': str(item.valor_total),
+            'status': item.status}
+
 @app.route('/admin')
 @login_required
 @admin_required
 def admin_panel():
-    users = User.query.all()
-    produtos = Produto.query.all()
-    cupons = Cupom.query.all()
-    pedidos = Pedido.query.order_by(db.case(
-        (Pedido.status == 'Devolução Solicitada', 1),
-        (Pedido.status == 'pendente', 2)
-    ), Pedido.data_pedido.desc()).all()
+    # Contagens e totais do cabeçalho num único SELECT de agregados
+    contagem = lambda coluna: db.select(func.count(coluna)).scalar_subquery()
+    totais = db.session.query(
+        contagem(User.id).label('usuarios'),
+        contagem(Produto.id_produto).label('produtos'),
+        contagem(Cupom.id_cupom).label('cupons'),
+        contagem(Pedido.id_pedido).label('pedidos'),
+        db.select(func.coalesce(func.sum(Pedido.valor_total), 0)).scalar_subquery().label('faturamento'),
+        db.select(func.count(Pedido.id_pedido)).where(
+            Pedido.status == 'Devolução Solicitada'
+        ).scalar_subquery().label('devolucoes'),
+    ).one()
+
+    secoes = {secao: pagina_admin(secao) for secao in ('usuarios', 'produtos', 'cupons', 'pedidos')}
     
-    return render_template('admin_panel.html', 
-                           users=users, 
-                           produtos=produtos, 
-                           cupons=cupons,
-                           pedidos=pedidos)
+    return render_template('admin_panel.html', totais=totais, secoes=secoes)
+
+@app.route('/admin/secao/<secao>')
+@login_required
+@admin_required
+def admin_secao(secao):
+    """Próximas páginas das seções do painel: linhas HTML ou JSON (?formato=json)."""
+    por_pagina = limitar_por_pagina(request.args.get('por_pagina'), padrao=ADMIN_POR_PAGINA)
+    pagina = pagina_admin(secao, request.args.get('cursor'), por_pagina)
+    if pagina is None:
+        return jsonify(erro='Seção inválida.'), 404
+
+    proxima_url = None
+    if pagina.tem_proxima:
+        proxima_url = url_for('admin_secao', secao=secao, cursor=pagina.proximo_cursor,
+                              por_pagina=request.args.get('por_pagina'),
+                              formato=request.args.get('formato'))
+
+    if request.args.get('formato') == 'json':
+        return jsonify(itens=[serializar_admin(secao, item) for item in pagina.itens],
+                       proxima=proxima_url)
+
+    resposta = make_response(render_template('admin_linhas.html', secao=secao, itens=pagina.itens))
+    if proxima_url:
+        resposta.headers['X-Proxima-Pagina'] = proxima_url
+    return resposta
+
+def _metricas_cache():
+    for nome, estatisticas in (('paginas', estatisticas_paginas()), ('fragmentos', estatisticas_fragmentos())):
+        yield 'midnight_cache_acertos_total', {'cache': nome}, estatisticas['acertos']
+        yield 'midnight_cache_falhas_total', {'cache': nome}, estatisticas['falhas']
+        yield 'midnight_cache_taxa_acerto', {'cache': nome}, estatisticas['taxa_acerto']
+
+registrar_coletor(_metricas_cache)
+registrar_coletor(metricas_tarefas)
+registrar_coletor(metricas_replicas)
+
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato texto do Prometheus (ver metricas.py)."""
+    token = os.getenv('METRICAS_TOKEN')
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return 'Não autorizado.', 401
+    resposta = make_response(texto_prometheus())
+    resposta.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return resposta
+
+@app.route('/admin/cache')
+@login_required
+@admin_required
+def admin_cache():
+    """Taxa de acerto dos caches de páginas e de fragmentos e estado das réplicas (monitoramento)."""
+    return jsonify(paginas=estatisticas_paginas(), fragmentos=estatisticas_fragmentos(),
+                   replicas=estado_replicas())
+
+@app.route('/admin/tarefas')
+@login_required
+@admin_required
+def admin_tarefas():
+    """Fila de tarefas por tipo: pendentes, falhas, idade da mais antiga e latência."""
+    return jsonify(estatisticas_tarefas())
+
+# --- API REST v1 (catálogo, somente leitura; ver api_catalogo.py) ---
+@app.errorhandler(ErroApi)
+def erro_api(erro):
+    return erro_json(str(erro), erro.status)
+
+@app.route('/api/v1/products')
+@ler_de_replica
+def api_produtos():
+    """
+    ?fields=, ?ordem=, ?categoria=, ?por_pagina= e ?cursor= (da resposta anterior),
+    ou ?ids=1,2,3 para buscar vários produtos de uma vez.
+    """
+    campos = escolher_campos(request.args.get('fields'), CAMPOS_PRODUTO, PADRAO_PRODUTOS)
+    if request.args.get('ids'):
+        itens, nao_encontrados = produtos_por_id(ler_ids(request.args['ids']), campos)
+        return responder_json({'itens': itens, 'nao_encontrados': nao_encontrados})
+
+    itens, proximo_cursor = listar_produtos(request.args, campos)
+    proxima_url = None
+    if proximo_cursor:
+        proxima_url = url_for('api_produtos', **dict(request.args.items(), cursor=proximo_cursor))
+    return responder_json({'itens': itens, 'proximo_cursor': proximo_cursor, 'proxima': proxima_url})
+
+@app.route('/api/v1/products/<int:id_produto>')
+@ler_de_replica
+def api_produto(id_produto):
+    campos = escolher_campos(request.args.get('fields'), CAMPOS_PRODUTO)
+    itens, _ = produtos_por_id([id_produto], campos)
+    if not itens:
+        return erro_json('Produto não encontrado.', 404)
+    return responder_json(itens[0])
+
+@app.route('/api/v1/categories')
+@ler_de_replica
+def api_categorias():
+    campos = escolher_campos(request.args.get('fields'), CAMPOS_CATEGORIA)
+    ids = ler_ids(request.args['ids']) if request.args.get('ids') else None
+    return responder_json({'itens': listar_categorias(campos, ids)}, max_age=300)
+
+@app.route('/api/v1/coupons')
+@ler_de_replica
+def api_cupons():
+    campos = escolher_campos(request.args.get('fields'), CAMPOS_CUPOM)
+    return responder_json({'itens': listar_cupons(campos)})
+
+# --- RELATÓRIOS DE VENDAS (leem só o resumo em relatorios.py) ---
+DIAS_RELATORIO = 30
+
+def _data_param(nome, padrao):
+    try:
+        return datetime.strptime(request.args.get(nome, ''), '%Y-%m-%d').date()
+    except ValueError:
+        return padrao
+
+def responder_relatorio(titulo, id_vendedor=None):
+    """Página (ou JSON, com ?formato=json) do relatório de vendas do período."""
+    fim = _data_param('fim', date.today())
+    inicio = _data_param('inicio', fim - timedelta(days=DIAS_RELATORIO - 1))
+    agrupar = request.args.get('agrupar', 'dia')
+    if agrupar not in AGRUPAMENTOS:
+        agrupar = 'dia'
+    relatorio = relatorio_vendas(inicio, fim, agrupar, id_vendedor)
+
+    if request.args.get('formato') == 'json':
+        def serializar(linha):
+            return {chave: (valor.isoformat() if isinstance(valor, date) else
+                            str(valor) if isinstance(valor, Decimal) else valor)
+                    for chave, valor in linha.items()}
+        return jsonify(inicio=inicio.isoformat(), fim=fim.isoformat(), agrupar=agrupar,
+                       totais=serializar(relatorio['totais']),
+                       linhas=[serializar(linha) for linha in relatorio['linhas']])
+
+    return render_template('relatorio_vendas.html', titulo=titulo, relatorio=relatorio,
+                           inicio=inicio, fim=fim, agrupar=agrupar, agrupamentos=AGRUPAMENTOS)
+
+@app.route('/admin/relatorios')
+@ler_de_replica
+@login_required
+@admin_required
+def admin_relatorios():
+    return responder_relatorio('Relatório de Vendas', request.args.get('vendedor', type=int))
+
+@app.route('/venda/relatorios')
+@ler_de_replica
+@login_required
+@seller_required
+def venda_relatorios():
+    if current_user.tipo_usuario == 'admin':
+        return responder_relatorio('Relatório de Vendas')
+    return responder_relatorio('Minhas Vendas', current_user.id_usuario)
 
 # --- CRUD de PRODUTOS ---
 @app.route('/produto/add', methods=['GET', 'POST'])
@@ -574,16 +916,54 @@ def add_produto():
             preco=request.form.get('preco'),
             estoque=request.form.get('estoque'),
             categoria=request.form.get('categoria'),
+            id_categoria=garantir_categoria(request.form.get('categoria')),
             url_imagem=request.form.get('url_imagem'),
             id_vendedor=current_user.id_usuario
         )
         db.session.add(novo_produto)
+        if novo_produto.url_imagem:
+            db.session.flush()
+            enfileirar('variantes_imagem', id_produto=novo_produto.id_produto)
         db.session.commit()
+        invalidar_vitrines()
+        invalidar_categorias()
+        invalidar_paginas('vitrines', 'catalogo')
+        indexar_produto(novo_produto)
         flash('Produto adicionado com sucesso!', 'success')
         return redirect(url_for('venda'))
     
     return render_template('add_produto.html')
 
+@app.route('/produto/importar', methods=['GET', 'POST'])
+@login_required
+@seller_required
+def importar_produtos_view():
+    relatorio = None
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo CSV ou JSONL.', 'danger')
+            return redirect(url_for('importar_produtos_view'))
+
+        # Lê direto do upload, linha a linha
+        texto = io.TextIOWrapper(arquivo.stream, encoding='utf-8-sig', newline='')
+        relatorio = importar_produtos(ler_linhas(texto, formato_do_arquivo(arquivo.filename)),
+                                      current_user.id_usuario,
+                                      eh_admin=current_user.tipo_usuario == 'admin')
+        if relatorio.inseridos or relatorio.atualizados:
+            invalidar_apos_importacao(relatorio)
+        flash(f'Importação concluída: {relatorio.inseridos} inseridos, {relatorio.atualizados} atualizados, '
+              f'{relatorio.total_erros} com erro.', 'success' if not relatorio.total_erros else 'info')
+
+    return render_template('importar_produtos.html', relatorio=relatorio)
+
+def invalidar_apos_importacao(relatorio):
+    invalidar_vitrines()
+    invalidar_precos()
+    invalidar_categorias()
+    invalidar_indices()
+    invalidar_paginas('vitrines', 'catalogo', *(f'produto:{id_produto}' for id_produto in relatorio.ids_atualizados))
+
 @app.route('/produto/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 @seller_required
@@ -600,8 +980,16 @@ def edit_produto(id):
         produto.preco = request.form.get('preco')
         produto.estoque = request.form.get('estoque')
         produto.categoria = request.form.get('categoria')
-        produto.url_imagem = request.form.get('url_imagem')
+        produto.id_categoria = garantir_categoria(produto.categoria)
+        url_anterior, produto.url_imagem = produto.url_imagem, request.form.get('url_imagem')
+        if produto.url_imagem and produto.url_imagem != url_anterior:
+            enfileirar('variantes_imagem', id_produto=produto.id_produto)
         db.session.commit()
+        invalidar_vitrines()
+        invalidar_precos()
+        invalidar_categorias()
+        invalidar_paginas('vitrines', 'catalogo', f'produto:{produto.id_produto}')
+        indexar_produto(produto)
         flash('Produto atualizado com sucesso!', 'success')
         return redirect(url_for('venda'))
         
@@ -623,8 +1011,15 @@ def delete_produto(id):
         flash('Este produto não pode ser excluído pois está associado a pedidos existentes. Considere apenas zerar o estoque.', 'danger')
         return redirect(url_for('venda'))
         
+    VendasProdutoDia.query.filter_by(id_produto=produto.id_produto).delete()
+    VendasProduto.query.filter_by(id_produto=produto.id_produto).delete()
     db.session.delete(produto)
     db.session.commit()
+    invalidar_vitrines()
+    invalidar_precos()
+    invalidar_categorias()
+    invalidar_paginas('vitrines', 'catalogo', f'produto:{id}')
+    desindexar_produto(id)
     flash('Produto excluído com sucesso!', 'success')
     return redirect(url_for('venda'))
 
@@ -642,6 +1037,8 @@ def add_cupom():
         )
         db.session.add(novo_cupom)
         db.session.commit()
+        invalidar_cupons()
+        invalidar_paginas('cupons')
         flash('Cupom adicionado com sucesso!', 'success')
         return redirect(url_for('admin_panel'))
     
@@ -659,6 +1056,8 @@ def edit_cupom(id):
         cupom.ativo = request.form.get('ativo') == 'True' 
         
         db.session.commit()
+        invalidar_cupons()
+        invalidar_paginas('cupons')
         flash('Cupom atualizado com sucesso!', 'success')
         return redirect(url_for('admin_panel'))
         
@@ -671,6 +1070,8 @@ def delete_cupom(id):
     cupom = Cupom.query.get_or_404(id)
     db.session.delete(cupom)
     db.session.commit()
+    invalidar_cupons()
+    invalidar_paginas('cupons')
     flash('Cupom excluído com sucesso!', 'success')
     return redirect(url_for('admin_panel'))
 
@@ -719,6 +1120,7 @@ def edit_user(id):
             flash('Usuário atualizado com sucesso!', 'success')
             
         db.session.commit()
+        invalidar_usuario(user.id_usuario)
         return redirect(url_for('admin_panel'))
     return render_template('edit_user.html', user=user)
 
@@ -735,12 +1137,17 @@ def delete_user(id):
     Pedido.query.filter_by(id_usuario=user_to_delete.id_usuario).delete()
     ItemCarrinho.query.filter_by(id_usuario=user_to_delete.id_usuario).delete()
     
+    id_usuario = user_to_delete.id_usuario
     db.session.delete(user_to_delete)
     db.session.commit()
+    invalidar_usuario(id_usuario)
     flash('Usuário excluído com sucesso!', 'success')
     return redirect(url_for('admin_panel'))
 
 
 # --- Ponto de Entrada ---
 if __name__ == '__main__':
+    # Em desenvolvimento o worker da fila roda dentro do app; em produção use worker.py
+    if os.getenv('TAREFAS_WORKER_EMBUTIDO', '1') == '1':
+        iniciar_worker_embutido(app)
     app.run(debug=True)
\ No newline at end of file
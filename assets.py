@@ -0,0 +1,165 @@
+"""
+Pipeline dos arquivos estáticos: gera cópias com hash do conteúdo no nome
+(css/style.3f2a9c1b04de.css) e versões pré-comprimidas (.gz e, se o pacote
+brotli estiver instalado, .br). Os templates usam static_url(), e a rota
+/assets/ serve a melhor codificação aceita pelo navegador com cache
+"immutable" de um ano: mudou o conteúdo, mudou a URL.
+
+Roda na inicialização do app (só reprocessa o que mudou) ou manualmente:
+    python assets.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from flask import current_app, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRIMIVEIS = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.html', '.ico'}
+TAMANHO_MINIMO = 1024  # abaixo disso a compressão não compensa
+MANIFESTO = 'manifest.json'
+
+# url(...) relativo dentro do CSS, para apontar para os nomes com hash
+_URL_CSS = re.compile(r'''url\(\s*(['"]?)(?!data:|https?:|/|#)([^'")]+)\1\s*\)''')
+
+_manifesto = {}  # 'css/style.css' -> 'css/style.3f2a9c1b04de.css'
+_reverso = {}    # nome com hash -> nome original
+_destino = None
+_lock = threading.Lock()
+
+
+def _com_hash(relativo, conteudo):
+    raiz, extensao = os.path.splitext(relativo)
+    return f'{raiz}.{hashlib.sha256(conteudo).hexdigest()[:12]}{extensao}'
+
+
+def _gravar(caminho, conteudo):
+    if os.path.exists(caminho):
+        return  # nome com hash: se existe, o conteúdo é o mesmo
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _reescrever_css(relativo, conteudo, manifesto):
+    pasta = os.path.dirname(relativo)
+
+    def trocar(match):
+        aspas, alvo = match.group(1), match.group(2)
+        caminho = alvo.partition('?')[0]
+        original = os.path.normpath(os.path.join(pasta, caminho)).replace(os.sep, '/')
+        if original not in manifesto:
+            return match.group(0)
+        novo = os.path.relpath(manifesto[original], pasta or '.').replace(os.sep, '/')
+        return f'url({aspas}{novo}{aspas})'
+
+    return _URL_CSS.sub(trocar, conteudo.decode('utf-8')).encode('utf-8')
+
+
+def construir(pasta_static, destino):
+    """Processa `pasta_static` em `destino` e retorna o manifesto."""
+    arquivos = []
+    for raiz, _, nomes in os.walk(pasta_static):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            arquivos.append(os.path.relpath(caminho, pasta_static).replace(os.sep, '/'))
+
+    # CSS por último: suas referências usam os nomes já calculados
+    arquivos.sort(key=lambda relativo: (relativo.endswith('.css'), relativo))
+
+    manifesto = {}
+    for relativo in arquivos:
+        with open(os.path.join(pasta_static, relativo), 'rb') as arquivo:
+            conteudo = arquivo.read()
+        if relativo.endswith('.css'):
+            conteudo = _reescrever_css(relativo, conteudo, manifesto)
+
+        nome = _com_hash(relativo, conteudo)
+        manifesto[relativo] = nome
+        alvo = os.path.join(destino, nome)
+        _gravar(alvo, conteudo)
+
+        if os.path.splitext(relativo)[1] in COMPRIMIVEIS and len(conteudo) >= TAMANHO_MINIMO:
+            _gravar(alvo + '.gz', gzip.compress(conteudo, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _gravar(alvo + '.br', brotli.compress(conteudo, quality=11))
+
+    _gravar_manifesto(destino, manifesto)
+    return manifesto
+
+
+def _gravar_manifesto(destino, manifesto):
+    os.makedirs(destino, exist_ok=True)
+    caminho = os.path.join(destino, MANIFESTO)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    os.replace(temporario, caminho)
+
+
+def _pasta_destino(app):
+    return os.getenv('ASSETS_DIR') or os.path.join(app.instance_path, 'assets')
+
+
+def iniciar_assets(app):
+    """Constrói os assets e registra o helper static_url() nos templates."""
+    global _destino
+    destino = _pasta_destino(app)
+    manifesto = construir(app.static_folder, destino)
+    with _lock:
+        _destino = destino
+        _manifesto.clear()
+        _manifesto.update(manifesto)
+        _reverso.clear()
+        _reverso.update({nome: original for original, nome in manifesto.items()})
+    app.jinja_env.globals['static_url'] = static_url
+
+
+def static_url(arquivo):
+    # Em modo debug os arquivos mudam a todo momento: serve direto de static/,
+    # com a data de modificação no ?v= para o navegador não usar cópia velha
+    if current_app.debug or arquivo not in _manifesto:
+        try:
+            versao = int(os.path.getmtime(os.path.join(current_app.static_folder, arquivo)))
+        except OSError:
+            return url_for('static', filename=arquivo)
+        return url_for('static', filename=arquivo, v=versao)
+    return url_for('asset', nome=_manifesto[arquivo])
+
+
+def localizar_asset(nome, accept_encoding):
+    """
+    Retorna (caminho_no_disco, codificacao, nome_original) para servir `nome`,
+    escolhendo br > gzip > sem compressão conforme o Accept-Encoding.
+    None se `nome` não for um asset conhecido.
+    """
+    original = _reverso.get(nome)
+    if original is None:
+        return None
+    caminho = os.path.join(_destino, nome)
+    aceitas = set()
+    for parte in (accept_encoding or '').split(','):
+        codificacao, _, parametros = parte.partition(';')
+        if parametros.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            aceitas.add(codificacao.strip())
+    for codificacao, sufixo in (('br', '.br'), ('gzip', '.gz')):
+        if codificacao in aceitas and os.path.exists(caminho + sufixo):
+            return caminho + sufixo, codificacao, original
+    return caminho, None, original
+
+
+if __name__ == '__main__':
+    from app import app
+    manifesto = construir(app.static_folder, _pasta_destino(app))
+    for original, nome in sorted(manifesto.items()):
+        print(f'{original} -> {nome}')
+    if brotli is None:
+        print("Aviso: pacote 'brotli' não instalado; apenas .gz foi gerado.")
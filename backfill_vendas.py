@@ -0,0 +1,36 @@
+"""
+Backfill do resumo de vendas dos relatórios (VendasResumoDia) a partir do
+histórico de pedidos. Sem datas, reconstrói tudo; com --inicio/--fim,
+apenas os dias do intervalo (ex: para corrigir um período).
+
+Uso:
+    python backfill_vendas.py
+    python backfill_vendas.py --inicio 2024-01-01 --fim 2024-12-31
+"""
+import argparse
+import time
+from datetime import datetime
+
+
+def data(texto):
+    return datetime.strptime(texto, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstrói o resumo de vendas dos relatórios.')
+    parser.add_argument('--inicio', type=data, help='primeiro dia (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=data, help='último dia (AAAA-MM-DD)')
+    args = parser.parse_args()
+
+    from app import app
+    from relatorios import recalcular_resumos
+
+    inicio = time.perf_counter()
+    with app.app_context():
+        grupos = recalcular_resumos(args.inicio, args.fim)
+    print(f'Resumo reconstruído: {grupos} linhas (dia x vendedor x categoria) '
+          f'em {time.perf_counter() - inicio:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark do hash de senhas: mede logins/s (verificações) e a latência para
+cada custo, passando pelo mesmo serviço (pool limitado) usado pelo app.
+
+Uso:
+    python bench_senhas.py --algoritmo scrypt --custos 14,15,16
+    python bench_senhas.py --algoritmo bcrypt --custos 10,12 --logins 100 --threads 32
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import senhas
+
+
+def medir(algoritmo, custo, logins, threads, workers):
+    servico = senhas.configurar(algoritmo=algoritmo, custo=custo, workers=workers,
+                                fila=threads, espera=60)
+    senha_hash = servico.gerar_hash('senha-de-teste')
+
+    restantes = [logins]
+    lock = threading.Lock()
+    latencias = []
+    recusados = [0]
+
+    def cliente():
+        while True:
+            with lock:
+                if restantes[0] == 0:
+                    return
+                restantes[0] -= 1
+            inicio = time.perf_counter()
+            try:
+                assert servico.verificar(senha_hash, 'senha-de-teste')
+            except senhas.ServicoSenhasOcupado:
+                with lock:
+                    recusados[0] += 1
+                continue
+            duracao = time.perf_counter() - inicio
+            with lock:
+                latencias.append(duracao)
+
+    inicio = time.perf_counter()
+    ts = [threading.Thread(target=cliente) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))] * 1000 if latencias else 0
+    media = statistics.mean(latencias) * 1000 if latencias else 0
+    print(f'{algoritmo:>7} custo={custo:<8} workers={servico.workers:<3} '
+          f'{len(latencias) / total:8.1f} logins/s  média={media:7.1f}ms  p95={p95:7.1f}ms  '
+          f'recusados={recusados[0]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do hash de senhas.')
+    parser.add_argument('--algoritmo', default='scrypt', choices=sorted(senhas.CUSTO_PADRAO))
+    parser.add_argument('--custos', help='lista separada por vírgula (padrão: custo padrão do algoritmo)')
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16, help='requisições simultâneas')
+    parser.add_argument('--workers', type=int, help='tamanho do pool (padrão: nº de CPUs)')
+    args = parser.parse_args()
+
+    custos = [int(c) for c in args.custos.split(',')] if args.custos else [senhas.CUSTO_PADRAO[args.algoritmo]]
+    for custo in custos:
+        medir(args.algoritmo, custo, args.logins, args.threads, args.workers)
+    senhas.obter_servico().encerrar()
+
+
+if __name__ == '__main__':
+    main()
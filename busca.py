@@ -0,0 +1,340 @@
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from flask import current_app
+from models import db, Produto, VendasProduto
+from categorias import obter_arvore
+from replicas import leitura_no_primario
+
+# --- MOTOR DE BUSCA DE PRODUTOS ---
+# Índice invertido em memória sobre nome, categoria e descrição, com ranking
+# BM25F (o nome pesa mais que a descrição). É construído a partir do banco no
+# primeiro uso e atualizado incrementalmente pelas rotas de CRUD de produtos,
+# então não depende do full-text do SQL Server. Essas atualizações só valem
+# para o processo que atendeu a rota: o índice é reconstruído em segundo plano
+# a cada TTL_INDICES para trazer o que mudou em outros processos e pelos
+# scripts (import_products.py), sem bloquear as buscas.
+
+PESOS = {'nome': 3.0, 'categoria': 1.5, 'descricao': 1.0}
+NORMALIZACAO = {'nome': 0.75, 'categoria': 0.3, 'descricao': 0.75}  # parâmetro b do BM25
+K1 = 1.2
+TTL_INDICES = 300  # segundos
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'no', 'na',
+    'nos', 'nas', 'um', 'uma', 'uns', 'umas', 'para', 'pra', 'por', 'com', 'sem',
+    'ao', 'aos', 'que', 'se', 'ou', 'seu', 'sua', 'seus', 'suas',
+}
+
+_TOKEN = re.compile(r'\w+')
+
+
+def remover_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def _radical(termo):
+    # Redução simples de plural: 'relogios' -> 'relogio', 'aneis' -> 'anel'
+    if len(termo) > 4:
+        for sufixo, troca in (('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ns', 'm')):
+            if termo.endswith(sufixo):
+                return termo[:-len(sufixo)] + troca
+        if termo.endswith('s') and not termo.endswith('ss'):
+            return termo[:-1]
+    return termo
+
+
+def tokenizar(texto):
+    """Texto -> lista de termos sem acento, minúsculos, sem stopwords."""
+    texto = remover_acentos(texto or '').lower()
+    return [_radical(t) for t in _TOKEN.findall(texto) if t not in STOPWORDS]
+
+
+class IndiceBusca:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = defaultdict(set)   # termo -> {id_produto}
+        self.frequencias = {}              # id_produto -> {campo: Counter(termo)}
+        self.comprimentos = {}             # id_produto -> {campo: nº de termos}
+        self.soma_comprimentos = Counter() # campo -> soma dos comprimentos
+
+    def __len__(self):
+        return len(self.frequencias)
+
+    def adicionar(self, id_produto, nome, descricao, categoria):
+        """Indexa (ou reindexa) um produto."""
+        campos = {'nome': nome, 'descricao': descricao, 'categoria': categoria}
+        with self._lock:
+            self.remover(id_produto)
+            frequencias = {campo: Counter(tokenizar(texto)) for campo, texto in campos.items()}
+            comprimentos = {campo: sum(f.values()) for campo, f in frequencias.items()}
+            self.frequencias[id_produto] = frequencias
+            self.comprimentos[id_produto] = comprimentos
+            self.soma_comprimentos.update(comprimentos)
+            for f in frequencias.values():
+                for termo in f:
+                    self.postings[termo].add(id_produto)
+
+    def remover(self, id_produto):
+        with self._lock:
+            frequencias = self.frequencias.pop(id_produto, None)
+            if frequencias is None:
+                return
+            self.soma_comprimentos.subtract(self.comprimentos.pop(id_produto))
+            for f in frequencias.values():
+                for termo in f:
+                    docs = self.postings.get(termo)
+                    if docs is not None:
+                        docs.discard(id_produto)
+                        if not docs:
+                            del self.postings[termo]
+
+    def buscar(self, consulta, inicio=0, limite=24):
+        """Retorna ([id_produto, ...] da página, total de resultados)."""
+        termos = set(tokenizar(consulta))
+        with self._lock:
+            total_docs = len(self.frequencias)
+            if not termos or not total_docs:
+                return [], 0
+            medias = {campo: (self.soma_comprimentos[campo] / total_docs) or 1 for campo in PESOS}
+
+            pontuacoes = defaultdict(float)
+            for termo in termos:
+                docs = self.postings.get(termo)
+                if not docs:
+                    continue
+                idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for id_produto in docs:
+                    frequencias = self.frequencias[id_produto]
+                    comprimentos = self.comprimentos[id_produto]
+                    tf = 0.0
+                    for campo, peso in PESOS.items():
+                        f = frequencias[campo].get(termo)
+                        if f:
+                            b = NORMALIZACAO[campo]
+                            tf += peso * f / (1 - b + b * comprimentos[campo] / medias[campo])
+                    pontuacoes[id_produto] += idf * tf / (K1 + tf)
+
+        melhores = heapq.nlargest(inicio + limite, pontuacoes.items(), key=lambda kv: (kv[1], -kv[0]))
+        return [id_produto for id_produto, _ in melhores[inicio:]], len(pontuacoes)
+
+
+# --- AUTOCOMPLETE (ÍNDICE DE PREFIXOS) ---
+# Lista ordenada de chaves normalizadas, consultada com bisect. Cada produto
+# entra com o nome completo e a partir de cada palavra ('relogio suico ouro',
+# 'suico ouro', 'ouro'), para que qualquer palavra do nome sirva de prefixo.
+# As sugestões são ordenadas pelo peso (unidades vendidas).
+
+MAX_VARREDURA = 400  # limite de chaves examinadas por consulta
+
+
+def _chaves_texto(texto):
+    palavras = remover_acentos(texto or '').lower().split()
+    return {' '.join(palavras[i:]) for i in range(len(palavras))}
+
+
+class IndicePrefixos:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.chaves = []   # [(chave, id_produto)] ordenada
+        self.produtos = {} # id_produto -> (nome, chaves)
+        self.pesos = Counter()
+        self.categorias = []    # [(chave, caminho, total)] ordenada
+        self._arvore = None
+
+    def adicionar(self, id_produto, nome):
+        with self._lock:
+            self.remover(id_produto)
+            chaves = _chaves_texto(nome)
+            for chave in chaves:
+                bisect.insort(self.chaves, (chave, id_produto))
+            self.produtos[id_produto] = (nome, chaves)
+
+    def remover(self, id_produto):
+        with self._lock:
+            registro = self.produtos.pop(id_produto, None)
+            if registro is None:
+                return
+            for chave in registro[1]:
+                posicao = bisect.bisect_left(self.chaves, (chave, id_produto))
+                if posicao < len(self.chaves) and self.chaves[posicao] == (chave, id_produto):
+                    del self.chaves[posicao]
+
+    def somar_peso(self, id_produto, quantidade):
+        with self._lock:
+            self.pesos[id_produto] += quantidade
+
+    def _sincronizar_categorias(self):
+        # A árvore é um objeto novo a cada invalidação; só então reindexa
+        arvore = obter_arvore()
+        if arvore is self._arvore:
+            return
+        categorias = []
+        for no in arvore.por_id.values():
+            if no.total > 0:
+                for chave in _chaves_texto(no.nome):
+                    categorias.append((chave, no.caminho, no.total))
+        categorias.sort()
+        self.categorias, self._arvore = categorias, arvore
+
+    @staticmethod
+    def _varrer(lista, prefixo):
+        inicio = bisect.bisect_left(lista, (prefixo,))
+        for entrada in lista[inicio:inicio + MAX_VARREDURA]:
+            if not entrada[0].startswith(prefixo):
+                break
+            yield entrada
+
+    def sugerir(self, prefixo, limite=8):
+        """Retorna ([(id_produto, nome)], [caminho_categoria]) para o prefixo."""
+        prefixo = ' '.join(remover_acentos(prefixo or '').lower().split())
+        if not prefixo:
+            return [], []
+        with self._lock:
+            self._sincronizar_categorias()
+            ids = {id_produto for _, id_produto in self._varrer(self.chaves, prefixo)}
+            melhores = heapq.nsmallest(
+                limite, ids, key=lambda i: (-self.pesos[i], self.produtos[i][0])
+            )
+            produtos = [(i, self.produtos[i][0]) for i in melhores]
+
+            totais = {}
+            for _, caminho, total in self._varrer(self.categorias, prefixo):
+                totais[caminho] = total
+            categorias = sorted(totais, key=lambda c: -totais[c])
+        # No máximo `limite` no total: as categorias ficam com até metade, ou com o que sobrar
+        categorias = categorias[:max(limite // 2, limite - len(produtos))]
+        return produtos[:limite - len(categorias)], categorias
+
+
+class IndiceDoProcesso:
+    """
+    Guarda um índice do processo: construído no primeiro uso e, depois, a
+    cada TTL_INDICES reconstruído numa thread enquanto o atual continua
+    atendendo. As alterações incrementais feitas durante a reconstrução são
+    reaplicadas no índice novo antes da troca.
+    """
+
+    def __init__(self, construir, nome):
+        self.construir = construir
+        self.nome = nome
+        self._lock = threading.Lock()
+        self.atual = None
+        self.proxima_construcao = 0.0
+        self.pendentes = None  # alterações durante uma reconstrução (None = nenhuma em andamento)
+
+    def obter(self):
+        with self._lock:
+            if self.atual is None:
+                # Primeiro uso: não há índice anterior para servir enquanto isso
+                with leitura_no_primario():
+                    self.atual = self.construir()
+                self.proxima_construcao = time.monotonic() + TTL_INDICES
+            elif self.pendentes is None and time.monotonic() >= self.proxima_construcao:
+                self.pendentes = []
+                threading.Thread(target=self._reconstruir, args=(current_app._get_current_object(),),
+                                 name=f'indice-{self.nome}', daemon=True).start()
+            return self.atual
+
+    def _reconstruir(self, app):
+        try:
+            with app.app_context():
+                # Fora de requisição: a sessão lê do primário (replicas.py)
+                novo = self.construir()
+            with self._lock:
+                for alteracao in self.pendentes:
+                    alteracao(novo)
+                self.atual = novo
+        except Exception:
+            logger.exception('Falha ao reconstruir o índice %s', self.nome)
+        finally:
+            with self._lock:
+                self.pendentes = None
+                self.proxima_construcao = time.monotonic() + TTL_INDICES
+
+    def aplicar(self, alteracao):
+        """Aplica `alteracao(indice)` ao índice atual (se já construído) e ao que estiver sendo reconstruído."""
+        with self._lock:
+            if self.atual is None:
+                return  # a construção vai ler o banco
+            alteracao(self.atual)
+            if self.pendentes is not None:
+                self.pendentes.append(alteracao)
+
+    def invalidar(self):
+        """Agenda a reconstrução para o próximo acesso (o índice atual continua em uso até lá)."""
+        with self._lock:
+            self.proxima_construcao = 0.0
+
+
+def construir_indice():
+    indice = IndiceBusca()
+    linhas = db.session.query(
+        Produto.id_produto, Produto.nome, Produto.descricao, Produto.categoria
+    ).yield_per(1000)
+    for id_produto, nome, descricao, categoria in linhas:
+        indice.adicionar(id_produto, nome, descricao, categoria)
+    return indice
+
+
+def construir_prefixos():
+    prefixos = IndicePrefixos()
+    # Carga em lote: ordena uma vez só em vez de inserir chave a chave
+    for id_produto, nome in db.session.query(Produto.id_produto, Produto.nome).yield_per(1000):
+        chaves = _chaves_texto(nome)
+        prefixos.produtos[id_produto] = (nome, chaves)
+        prefixos.chaves.extend((chave, id_produto) for chave in chaves)
+    prefixos.chaves.sort()
+    for id_produto, quantidade in db.session.query(VendasProduto.id_produto, VendasProduto.quantidade):
+        prefixos.somar_peso(id_produto, quantidade)
+    return prefixos
+
+
+_indice = IndiceDoProcesso(construir_indice, 'busca')
+_prefixos = IndiceDoProcesso(construir_prefixos, 'prefixos')
+
+
+def obter_indice():
+    """Índice de busca do processo (ver IndiceDoProcesso)."""
+    return _indice.obter()
+
+
+def obter_prefixos():
+    """Índice de autocomplete do processo (ver IndiceDoProcesso)."""
+    return _prefixos.obter()
+
+
+def invalidar_indices():
+    """Agenda a reconstrução dos índices (ex: após importação em lote)."""
+    _indice.invalidar()
+    _prefixos.invalidar()
+
+
+def indexar_produto(produto):
+    id_produto, nome, descricao, categoria = produto.id_produto, produto.nome, produto.descricao, produto.categoria
+    _indice.aplicar(lambda indice: indice.adicionar(id_produto, nome, descricao, categoria))
+    _prefixos.aplicar(lambda prefixos: prefixos.adicionar(id_produto, nome))
+
+
+def desindexar_produto(id_produto):
+    _indice.aplicar(lambda indice: indice.remover(id_produto))
+    _prefixos.aplicar(lambda prefixos: prefixos.remover(id_produto))
+
+
+def registrar_pesos(itens, sinal=1):
+    """Atualiza o peso (vendas) das sugestões após um pedido ou devolução."""
+    itens = list(itens)
+
+    def somar(prefixos):
+        for id_produto, quantidade in itens:
+            prefixos.somar_peso(id_produto, sinal * quantidade)
+    _prefixos.aplicar(somar)
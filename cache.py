@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- CACHE LRU EM MEMÓRIA ---
+# Cache simples, limitado por número de itens e com TTL opcional, seguro para
+# uso entre as threads do servidor. Usado pelos caches do app (carrinho,
+# usuários, páginas...).
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    def __init__(self, maximo=1024, ttl=None):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            registro = self._dados.get(chave, _AUSENTE)
+            if registro is not _AUSENTE:
+                valor, expira_em = registro
+                if expira_em is None or expira_em > time.monotonic():
+                    self._dados.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                del self._dados[chave]
+            self.falhas += 1
+            return padrao
+
+    def set(self, chave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expira_em = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._dados[chave] = (valor, expira_em)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maximo:
+                self._dados.popitem(last=False)
+
+    def delete(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+    @property
+    def taxa_acerto(self):
+        total = self.acertos + self.falhas
+        return self.acertos / total if total else 0.0
@@ -0,0 +1,251 @@
+"""
+Teste de carga por rota: várias sessões simuladas ao mesmo tempo navegando
+pelo app (Home, catálogo, produto, busca, carrinho e checkout), com visitantes
+anônimos e clientes logados. Ao final mostra a vazão e os percentis de
+latência de cada rota.
+
+Roda contra o banco gerado por gerar_dados.py (SQLite local por padrão).
+Com --saida os resultados são gravados em JSON; com --comparar, o p95 de cada
+rota é comparado a uma execução anterior e o script termina com erro se
+alguma rota piorar além da --tolerancia (para pegar regressões antes do
+release).
+
+Uso:
+    python gerar_dados.py --db sqlite:///carga.db --produtos 20000 --pedidos 100000
+    python carga.py --db sqlite:///carga.db --usuarios 16 --duracao 60 --saida base.json
+    python carga.py --db sqlite:///carga.db --usuarios 16 --duracao 60 --comparar base.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from gerar_dados import DOMINIO, SENHA_PADRAO
+
+# Peso de cada ação na navegação simulada
+ACOES = {
+    'home': 20,
+    'catalogo': 18,
+    'produto': 25,
+    'busca': 12,
+    'sugestao': 6,
+    'add_carrinho': 8,
+    'carrinho': 6,
+    'checkout': 3,
+    'pedidos': 2,
+}
+ACOES_LOGADO = ('add_carrinho', 'carrinho', 'checkout', 'pedidos')
+DIFERENCA_MINIMA_MS = 5.0  # abaixo disso a variação de p95 é ruído
+
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.erros = defaultdict(int)
+
+    def registrar(self, rota, duracao, ok):
+        with self.lock:
+            self.latencias[rota].append(duracao)
+            if not ok:
+                self.erros[rota] += 1
+
+    def resumo(self, duracao_total):
+        rotas = {}
+        for rota, latencias in sorted(self.latencias.items()):
+            latencias = sorted(latencias)
+            percentil = lambda p: latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000
+            rotas[rota] = {
+                'requisicoes': len(latencias),
+                'erros': self.erros[rota],
+                'rps': len(latencias) / duracao_total,
+                'media_ms': statistics.mean(latencias) * 1000,
+                'p50_ms': percentil(0.50),
+                'p95_ms': percentil(0.95),
+                'p99_ms': percentil(0.99),
+                'max_ms': latencias[-1] * 1000,
+            }
+        return rotas
+
+
+class Sessao:
+    """Um visitante: navega por `acoes` páginas, logado ou não."""
+
+    def __init__(self, app, dados, resultados, rng, logado):
+        self.client = app.test_client()
+        self.dados = dados
+        self.resultados = resultados
+        self.rng = rng
+        self.logado = logado
+        self.itens_no_carrinho = 0
+
+    def requisitar(self, rota, metodo, url, esperado=(200,), **kwargs):
+        inicio = time.perf_counter()
+        resposta = getattr(self.client, metodo)(url, **kwargs)
+        duracao = time.perf_counter() - inicio
+        self.resultados.registrar(rota, duracao, resposta.status_code in esperado)
+        return resposta
+
+    def entrar(self):
+        email = self.rng.choice(self.dados['clientes'])
+        resposta = self.requisitar('POST /login', 'post', '/login', esperado=(302,),
+                                   data={'email': email, 'senha': SENHA_PADRAO})
+        self.logado = resposta.status_code == 302
+
+    def executar(self, acao):
+        rng = self.rng
+        if acao == 'home':
+            self.requisitar('GET /', 'get', '/')
+        elif acao == 'catalogo':
+            categoria = rng.choice(self.dados['categorias'] + [None])
+            url = f'/catalogo?categoria={categoria}' if categoria else '/catalogo'
+            self.requisitar('GET /catalogo', 'get', url)
+        elif acao == 'produto':
+            self.requisitar('GET /produto/<id>', 'get', f"/produto/{rng.choice(self.dados['produtos'])}")
+        elif acao == 'busca':
+            self.requisitar('GET /search', 'get', f"/search?query={rng.choice(self.dados['termos'])}")
+        elif acao == 'sugestao':
+            termo = rng.choice(self.dados['termos'])
+            self.requisitar('GET /api/search/suggest', 'get', f'/api/search/suggest?q={termo[:rng.randint(2, 4)]}')
+        elif acao == 'add_carrinho':
+            self.requisitar('POST /add-carrinho', 'post', '/add-carrinho', esperado=(302,),
+                            data={'produto_id': rng.choice(self.dados['produtos']), 'quantidade': 1})
+            self.itens_no_carrinho += 1
+        elif acao == 'carrinho':
+            self.requisitar('GET /carrinho', 'get', '/carrinho')
+        elif acao == 'checkout' and self.itens_no_carrinho:
+            self.requisitar('POST /finalizar-pedido', 'post', '/finalizar-pedido', esperado=(302,))
+            self.itens_no_carrinho = 0
+        elif acao == 'pedidos':
+            self.requisitar('GET /pedidos', 'get', '/pedidos')
+
+    def navegar(self, acoes):
+        nomes = [acao for acao in ACOES if self.logado or acao not in ACOES_LOGADO]
+        pesos = [ACOES[acao] for acao in nomes]
+        for acao in self.rng.choices(nomes, weights=pesos, k=acoes):
+            self.executar(acao)
+
+
+def carregar_dados(app):
+    from models import db, User, Produto
+    from categorias import categorias_principais
+
+    with app.app_context():
+        produtos = [row[0] for row in db.session.query(Produto.id_produto).limit(50000)]
+        nomes = [row[0] for row in db.session.query(Produto.nome).limit(2000)]
+        clientes = [row[0] for row in db.session.query(User.email).filter(
+            User.email.like(f'cliente%@{DOMINIO}')).limit(5000)]
+        categorias = list(categorias_principais())
+    termos = sorted({palavra for nome in nomes for palavra in nome.split() if not palavra.isdigit()})
+    return {'produtos': produtos, 'clientes': clientes, 'categorias': categorias, 'termos': termos or ['relogio']}
+
+
+def imprimir(rotas, duracao_total):
+    print(f"\n{'Rota':<28} {'req':>7} {'req/s':>8} {'erros':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for rota, r in rotas.items():
+        print(f"{rota:<28} {r['requisicoes']:>7} {r['rps']:>8.1f} {r['erros']:>6} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}")
+    total = sum(r['requisicoes'] for r in rotas.values())
+    print(f'\nTotal: {total} requisições em {duracao_total:.1f}s ({total / duracao_total:.1f} req/s). '
+          f'Latências em ms.')
+
+
+def comparar(rotas, arquivo_base, tolerancia):
+    with open(arquivo_base, encoding='utf-8') as arquivo:
+        base = json.load(arquivo)['rotas']
+    regressoes = []
+    for rota, atual in rotas.items():
+        anterior = base.get(rota)
+        if not anterior:
+            continue
+        limite = anterior['p95_ms'] * (1 + tolerancia)
+        if atual['p95_ms'] > limite and atual['p95_ms'] - anterior['p95_ms'] > DIFERENCA_MINIMA_MS:
+            regressoes.append(f"{rota}: p95 {anterior['p95_ms']:.1f} -> {atual['p95_ms']:.1f} ms")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga por rota.')
+    parser.add_argument('--db', help='URL do banco (padrão: DATABASE_URL ou sqlite:///carga.db)')
+    parser.add_argument('--usuarios', type=int, default=16, help='sessões simultâneas (threads)')
+    parser.add_argument('--duracao', type=float, default=30, help='segundos de medição')
+    parser.add_argument('--acoes', type=int, default=15, help='páginas por sessão antes de começar outra')
+    parser.add_argument('--anonimos', type=float, default=0.5, help='fração de sessões sem login')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--sem-aquecimento', action='store_true', help='não aquecer caches e índices antes')
+    parser.add_argument('--saida', help='grava os resultados em JSON')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior (base)')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='piora aceitável do p95 (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['DATABASE_URL'] = args.db
+    else:
+        os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.abspath('carga.db'))
+    os.environ.setdefault('SECRET_KEY', 'teste-de-carga')
+
+    # Importado depois de definir DATABASE_URL
+    from app import app
+    app.logger.setLevel('ERROR')  # avisos de N+1 etc. ficam em /metrics, não no meio do relatório
+
+    dados = carregar_dados(app)
+    if not dados['produtos']:
+        print('Banco sem produtos: rode gerar_dados.py antes.')
+        return 1
+    if not dados['clientes']:
+        print(f'Sem clientes @{DOMINIO}: todas as sessões serão anônimas.')
+        args.anonimos = 1.0
+    print(f"Banco: {os.environ['DATABASE_URL']} ({len(dados['produtos'])} produtos, "
+          f"{len(dados['clientes'])} clientes)")
+
+    if not args.sem_aquecimento:
+        # Primeiro acesso monta índices de busca, vitrines e árvore de categorias
+        aquecimento = Sessao(app, dados, Resultados(), random.Random(args.semente), logado=False)
+        for acao in ('home', 'catalogo', 'produto', 'busca', 'sugestao'):
+            aquecimento.executar(acao)
+
+    resultados = Resultados()
+    fim = time.monotonic() + args.duracao
+
+    def trabalhador(numero):
+        rng = random.Random(args.semente + numero)
+        while time.monotonic() < fim:
+            sessao = Sessao(app, dados, resultados, rng, logado=False)
+            if rng.random() >= args.anonimos:
+                sessao.entrar()
+            sessao.navegar(args.acoes)
+
+    print(f'Medindo por {args.duracao:.0f}s com {args.usuarios} sessões simultâneas...')
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(args.usuarios)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao_total = time.perf_counter() - inicio
+
+    rotas = resultados.resumo(duracao_total)
+    imprimir(rotas, duracao_total)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump({'usuarios': args.usuarios, 'duracao': duracao_total, 'rotas': rotas}, arquivo, indent=2)
+        print(f'Resultados gravados em {args.saida}')
+
+    falhas = [f"{rota}: {r['erros']} erro(s)" for rota, r in rotas.items() if r['erros']]
+    if args.comparar:
+        falhas += comparar(rotas, args.comparar, args.tolerancia)
+    if falhas:
+        print('FALHOU:\n  ' + '\n  '.join(falhas))
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+from decimal import Decimal
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Produto, Cupom, ItemCarrinho
+from precificacao import invalidar_carrinho
+from formatacao import formatar_brl
+
+# --- OPERAÇÕES DO CARRINHO ---
+# Usadas tanto pelos formulários (POST + redirect, sem JavaScript) quanto pela
+# API JSON /api/cart. Cada operação é um único UPDATE/DELETE filtrado pelo
+# dono do item, faz commit e muda a versão do carrinho (precificacao.py).
+
+
+class ItemNaoEncontrado(Exception):
+    """Item inexistente ou de outro usuário."""
+
+
+class ProdutoNaoEncontrado(Exception):
+    pass
+
+
+class QuantidadeIndisponivel(Exception):
+    def __init__(self, estoque):
+        super().__init__(f'Estoque insuficiente. Temos apenas {estoque} unidades.')
+        self.estoque = estoque
+
+
+def ler_inteiro(valor, padrao=None):
+    """int(valor) do formulário/JSON; `padrao` se não for um número (sem padrão, ValueError)."""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        if padrao is None:
+            raise ValueError(f'Número inválido: {valor!r}')
+        return padrao
+
+
+def adicionar_item(id_usuario, id_produto, quantidade):
+    """Soma `quantidade` ao item do produto (ou cria o item). Retorna (nome do produto, já existia)."""
+    nome = db.session.query(Produto.nome).filter(Produto.id_produto == id_produto).scalar()
+    if nome is None:
+        raise ProdutoNaoEncontrado()
+    quantidade = max(quantidade, 1)
+
+    # (id_usuario, id_produto) é único: soma no item existente ou cria um novo
+    somar_item = update(ItemCarrinho).where(
+        ItemCarrinho.id_usuario == id_usuario,
+        ItemCarrinho.id_produto == id_produto
+    ).values(quantidade=ItemCarrinho.quantidade + quantidade)
+
+    existia = bool(db.session.execute(somar_item).rowcount)
+    if existia:
+        db.session.commit()
+    else:
+        try:
+            db.session.add(ItemCarrinho(id_usuario=id_usuario, id_produto=id_produto, quantidade=quantidade))
+            db.session.commit()
+        except IntegrityError:
+            # Outra requisição do mesmo usuário inseriu o item ao mesmo tempo
+            db.session.rollback()
+            db.session.execute(somar_item)
+            db.session.commit()
+    invalidar_carrinho(id_usuario)
+    return nome, existia
+
+
+def alterar_quantidade(id_usuario, id_item, quantidade):
+    """Define a quantidade do item (0 ou menos remove). Retorna False se o item foi removido."""
+    if quantidade <= 0:
+        remover_item(id_usuario, id_item)
+        return False
+
+    # Só altera se houver estoque, no mesmo UPDATE
+    estoque = select(Produto.estoque).where(
+        Produto.id_produto == ItemCarrinho.id_produto
+    ).scalar_subquery()
+    resultado = db.session.execute(
+        update(ItemCarrinho).where(
+            ItemCarrinho.id_item_carrinho == id_item,
+            ItemCarrinho.id_usuario == id_usuario,
+            estoque >= quantidade
+        ).values(quantidade=quantidade).execution_options(synchronize_session=False)
+    )
+    if not resultado.rowcount:
+        db.session.rollback()
+        disponivel = db.session.query(Produto.estoque).join(
+            ItemCarrinho, ItemCarrinho.id_produto == Produto.id_produto
+        ).filter(
+            ItemCarrinho.id_item_carrinho == id_item, ItemCarrinho.id_usuario == id_usuario
+        ).scalar()
+        if disponivel is None:
+            raise ItemNaoEncontrado()
+        raise QuantidadeIndisponivel(disponivel)
+    db.session.commit()
+    invalidar_carrinho(id_usuario)
+    return True
+
+
+def remover_item(id_usuario, id_item):
+    resultado = db.session.execute(
+        delete(ItemCarrinho).where(
+            ItemCarrinho.id_item_carrinho == id_item, ItemCarrinho.id_usuario == id_usuario
+        ).execution_options(synchronize_session=False)
+    )
+    if not resultado.rowcount:
+        db.session.rollback()
+        raise ItemNaoEncontrado()
+    db.session.commit()
+    invalidar_carrinho(id_usuario)
+
+
+def cupom_ativo(codigo):
+    """Código do cupom ativo (como está no banco) ou None."""
+    return db.session.query(Cupom.codigo).filter(Cupom.codigo == codigo, Cupom.ativo == True).scalar()
+
+
+# --- Serialização para a API ---
+
+def _dinheiro(valor):
+    valor = Decimal(valor).quantize(Decimal('0.01'))
+    return {'valor': str(valor), 'formatado': formatar_brl(valor)}
+
+
+def serializar_linha(linha):
+    return {
+        'id_item': linha.id_item_carrinho,
+        'id_produto': linha.id_produto,
+        'nome': linha.nome,
+        'quantidade': linha.quantidade,
+        'estoque': linha.estoque,
+        'preco': _dinheiro(linha.preco),
+        'total': _dinheiro(linha.total),
+    }
+
+
+def serializar_totais(resumo):
+    return {
+        'itens': len(resumo.linhas),
+        'unidades': sum(linha.quantidade for linha in resumo.linhas),
+        'subtotal': _dinheiro(resumo.subtotal),
+        'desconto': _dinheiro(resumo.desconto),
+        'total': _dinheiro(resumo.total),
+        'cupom': resumo.cupom.codigo if resumo.cupom else None,
+    }
@@ -0,0 +1,169 @@
+import threading
+import time
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Produto, Categoria
+from replicas import leitura_no_primario
+
+# --- ÁRVORE DE CATEGORIAS ---
+# Produto.categoria continua guardando o caminho digitado pelo vendedor
+# ('Relógios de Luxo / Suíço / Automático'), mas cada nível vira uma linha em
+# Categorias e o produto aponta para a folha via Produto.id_categoria.
+# A árvore (com as contagens de produtos por nó) fica em memória e é
+# reconstruída quando invalidada pelas rotas de produto ou quando o TTL expira.
+
+SEPARADOR = ' / '
+TTL_ARVORE = 300  # segundos
+
+
+def normalizar_caminho(caminho):
+    """' Joias/ Anéis ' -> 'Joias / Anéis'"""
+    partes = [parte.strip() for parte in (caminho or '').split('/')]
+    return SEPARADOR.join(parte for parte in partes if parte)
+
+
+def categoria_principal(caminho):
+    """'Relógios de Luxo / Suíço' -> 'Relógios de Luxo'"""
+    return (caminho or '').split('/')[0].strip()
+
+
+class NoCategoria:
+    def __init__(self, id_categoria, id_pai, nome, caminho, nivel):
+        self.id_categoria = id_categoria
+        self.id_pai = id_pai
+        self.nome = nome
+        self.caminho = caminho
+        self.nivel = nivel
+        self.filhos = []
+        self.total_direto = 0   # produtos ligados exatamente a este nó
+        self.total = 0          # produtos neste nó e em todos os descendentes
+        self.ids_subarvore = ()  # id deste nó e de todos os descendentes
+
+
+class ArvoreCategorias:
+    def __init__(self, linhas, contagens):
+        self.por_id = {}
+        self.por_caminho = {}
+        for id_categoria, id_pai, nome, caminho, nivel in linhas:
+            no = NoCategoria(id_categoria, id_pai, nome, caminho, nivel)
+            no.total_direto = contagens.get(id_categoria, 0)
+            self.por_id[id_categoria] = no
+            self.por_caminho[caminho] = no
+
+        self.raizes = []
+        for no in self.por_id.values():
+            pai = self.por_id.get(no.id_pai)
+            (pai.filhos if pai else self.raizes).append(no)
+
+        for no in self.raizes:
+            self._acumular(no)
+
+        self.raizes.sort(key=lambda n: n.nome)
+        for no in self.por_id.values():
+            no.filhos.sort(key=lambda n: n.nome)
+
+    def _acumular(self, no):
+        ids = [no.id_categoria]
+        total = no.total_direto
+        for filho in no.filhos:
+            self._acumular(filho)
+            ids.extend(filho.ids_subarvore)
+            total += filho.total
+        no.ids_subarvore = tuple(ids)
+        no.total = total
+
+    def buscar(self, caminho):
+        """Nó pelo caminho (aceita o caminho sem normalizar); None se não existir."""
+        return self.por_caminho.get(normalizar_caminho(caminho))
+
+    def raiz_de(self, id_categoria):
+        no = self.por_id.get(id_categoria)
+        while no is not None and no.id_pai is not None:
+            no = self.por_id.get(no.id_pai)
+        return no
+
+
+_lock = threading.Lock()
+_arvore = None
+_carregada_em = 0.0
+
+
+def invalidar_categorias():
+    global _arvore
+    with _lock:
+        _arvore = None
+
+
+def obter_arvore():
+    global _arvore, _carregada_em
+    with _lock:
+        if _arvore is None or time.monotonic() - _carregada_em > TTL_ARVORE:
+            with leitura_no_primario():
+                linhas = db.session.query(
+                    Categoria.id_categoria, Categoria.id_pai, Categoria.nome,
+                    Categoria.caminho, Categoria.nivel
+                ).all()
+                contagens = dict(db.session.query(
+                    Produto.id_categoria, func.count(Produto.id_produto)
+                ).filter(Produto.id_categoria.isnot(None)).group_by(Produto.id_categoria).all())
+            _arvore = ArvoreCategorias(linhas, contagens)
+            _carregada_em = time.monotonic()
+        return _arvore
+
+
+def categorias_principais():
+    """Lista ordenada das categorias de primeiro nível que têm produtos."""
+    return [no.nome for no in obter_arvore().raizes if no.total > 0]
+
+
+def garantir_categoria(caminho):
+    """
+    Cria (se preciso) todos os níveis de `caminho` e retorna o id da folha.
+    Não faz commit: roda na mesma transação do produto.
+    """
+    caminho = normalizar_caminho(caminho)
+    if not caminho:
+        return None
+
+    arvore = obter_arvore()
+    id_pai = None
+    partes = caminho.split(SEPARADOR)
+    for nivel in range(len(partes)):
+        caminho_nivel = SEPARADOR.join(partes[:nivel + 1])
+        no = arvore.por_caminho.get(caminho_nivel)
+        if no is not None:
+            id_pai = no.id_categoria
+            continue
+
+        categoria = Categoria.query.filter_by(caminho=caminho_nivel).first()
+        if categoria is None:
+            try:
+                with db.session.begin_nested():
+                    categoria = Categoria(id_pai=id_pai, nome=partes[nivel],
+                                          caminho=caminho_nivel, nivel=nivel)
+                    db.session.add(categoria)
+            except IntegrityError:
+                # Outro processo criou a mesma categoria ao mesmo tempo
+                categoria = Categoria.query.filter_by(caminho=caminho_nivel).one()
+        id_pai = categoria.id_categoria
+    return id_pai
+
+
+def vincular_categorias():
+    """
+    Cria as categorias dos caminhos já existentes em Produto.categoria e
+    preenche Produto.id_categoria. Não faz commit (usada dentro de migrações).
+    """
+    caminhos = [c for (c,) in db.session.query(Produto.categoria).distinct().all()]
+    for caminho in caminhos:
+        id_categoria = garantir_categoria(caminho)
+        db.session.execute(
+            update(Produto).where(Produto.categoria == caminho).values(id_categoria=id_categoria)
+        )
+
+
+def sincronizar_categorias():
+    """Popula a árvore a partir dos caminhos já existentes em Produto.categoria."""
+    vincular_categorias()
+    db.session.commit()
+    invalidar_categorias()
@@ -0,0 +1,122 @@
+import random
+import time
+from collections import Counter
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import DBAPIError
+from models import db, Produto, Pedido, ItensPedido, ItemCarrinho
+from precificacao import resumo_carrinho
+from tarefas import enfileirar
+
+# --- CHECKOUT ATÔMICO ---
+# Todo o pedido roda numa única transação: cria o Pedido, baixa o estoque de
+# todos os produtos com um único UPDATE condicional (WHERE estoque >= qtd),
+# insere os itens em lote, esvazia o carrinho e enfileira a tarefa
+# 'vendas_pedido', que atualiza depois os contadores de Mais Vendidos e o
+# resumo dos relatórios. Se algum produto não tiver estoque, nada é gravado.
+# Deadlocks e conflitos de serialização são repetidos algumas vezes com
+# backoff.
+
+MAX_TENTATIVAS = 4
+ESPERA_BASE = 0.05  # segundos
+
+
+class CarrinhoVazio(Exception):
+    pass
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, nome, estoque):
+        super().__init__(f'Estoque insuficiente para "{nome}"')
+        self.nome = nome
+        self.estoque = estoque
+
+
+def _eh_conflito(erro):
+    """Deadlock, timeout de lock ou falha de serialização (vale repetir)."""
+    original = getattr(erro, 'orig', None)
+    sqlstate = getattr(original, 'sqlstate', None) or getattr(original, 'pgcode', None)
+    if not sqlstate and original is not None and original.args and isinstance(original.args[0], str):
+        sqlstate = original.args[0]  # pyodbc: args = (sqlstate, mensagem)
+    mensagem = str(original or erro).lower()
+    return (
+        sqlstate in ('40001', '40P01', 'HYT00')
+        or 'deadlock' in mensagem
+        or '(1205)' in mensagem  # SQL Server: código nativo de deadlock
+        or 'database is locked' in mensagem
+    )
+
+
+def _baixar_estoque(quantidades):
+    """Baixa o estoque de todos os produtos num só UPDATE; False se faltar estoque."""
+    qtd = case(quantidades, value=Produto.id_produto)
+    resultado = db.session.execute(
+        update(Produto)
+        .where(Produto.id_produto.in_(list(quantidades)), Produto.estoque >= qtd)
+        .values(estoque=Produto.estoque - qtd)
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount == len(quantidades)
+
+
+def _finalizar(id_usuario, codigo_cupom):
+    resumo = resumo_carrinho(id_usuario, codigo_cupom, usar_cache=False)
+    if not resumo:
+        raise CarrinhoVazio()
+
+    quantidades = Counter()
+    for linha in resumo.linhas:
+        quantidades[linha.id_produto] += linha.quantidade
+
+    if not _baixar_estoque(dict(quantidades)):
+        db.session.rollback()
+        # Descobre qual produto ficou sem estoque para avisar o cliente
+        estoques = dict(db.session.query(Produto.id_produto, Produto.estoque).filter(
+            Produto.id_produto.in_(list(quantidades))
+        ).all())
+        for linha in resumo.linhas:
+            if quantidades[linha.id_produto] > estoques.get(linha.id_produto, 0):
+                raise EstoqueInsuficiente(linha.nome, estoques.get(linha.id_produto, 0))
+        raise EstoqueInsuficiente(resumo.linhas[0].nome, 0)
+
+    pedido = Pedido(id_usuario=id_usuario, valor_total=resumo.total, status='Enviado')
+    db.session.add(pedido)
+    db.session.flush()
+
+    db.session.execute(insert(ItensPedido), [
+        {
+            'id_pedido': pedido.id_pedido,
+            'id_produto': linha.id_produto,
+            'quantidade': linha.quantidade,
+            'preco_unitario': linha.preco,
+        }
+        for linha in resumo.linhas
+    ])
+
+    ItemCarrinho.query.filter_by(id_usuario=id_usuario).delete(synchronize_session=False)
+
+    # Contadores de Mais Vendidos e resumo dos relatórios ficam para o worker;
+    # a tarefa é gravada no mesmo commit do pedido
+    vendidos = [(linha.id_produto, linha.quantidade) for linha in resumo.linhas]
+    enfileirar('vendas_pedido', id_pedido=pedido.id_pedido)
+
+    db.session.commit()
+    return pedido, vendidos
+
+
+def finalizar_compra(id_usuario, codigo_cupom=None):
+    """
+    Fecha o pedido do carrinho de `id_usuario`.
+    Retorna (pedido, [(id_produto, quantidade), ...]).
+    Levanta CarrinhoVazio ou EstoqueInsuficiente (sem gravar nada).
+    """
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        try:
+            return _finalizar(id_usuario, codigo_cupom)
+        except DBAPIError as erro:
+            db.session.rollback()
+            if tentativa == MAX_TENTATIVAS or not _eh_conflito(erro):
+                raise
+            time.sleep(ESPERA_BASE * 2 ** (tentativa - 1) * (1 + random.random()))
+        except Exception:
+            db.session.rollback()
+            raise
@@ -1,11 +1,17 @@
 from app import app, db
 from models import User
+from vitrines import recalcular_vendas
+from relatorios import recalcular_resumos
+from migracoes import migrar
+from categorias import sincronizar_categorias
 
 # Cria as tabelas
 def create_tables():
     print("Conectando ao banco de dados...")
     with app.app_context():
         db.create_all()
+        # Num banco novo as migrações só são registradas; num antigo, aplica as pendentes
+        migrar()
     print("Tabelas do Midnight Indigo criadas com sucesso!")
 
 # Cria usuários iniciais
@@ -48,6 +54,30 @@ def create_initial_users():
         else:
             print("Usuário vendedor já existe.")
 
+# Reconstrói os contadores de vendas (Mais Vendidos) a partir dos pedidos existentes
+def rebuild_sales_counters():
+    print("Recalculando contadores de vendas...")
+    with app.app_context():
+        recalcular_vendas()
+    print("Contadores de vendas atualizados!")
+
+# Reconstrói o resumo de vendas dos relatórios a partir do histórico de pedidos
+def rebuild_sales_rollups():
+    print("Recalculando resumo de vendas dos relatórios...")
+    with app.app_context():
+        grupos = recalcular_resumos()
+    print(f"Resumo de vendas atualizado ({grupos} linhas)!")
+
+# Monta a árvore de categorias a partir dos caminhos em Produto.categoria
+def sync_categories():
+    print("Sincronizando árvore de categorias...")
+    with app.app_context():
+        sincronizar_categorias()
+    print("Categorias sincronizadas!")
+
 if __name__ == '__main__':
     create_tables()
-    create_initial_users()
\ No newline at end of file
+    create_initial_users()
+    sync_categories()
+    rebuild_sales_counters()
+    rebuild_sales_rollups()
\ No newline at end of file
@@ -0,0 +1,22 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# --- FORMATAÇÃO DE MOEDA (BRL) ---
+# Formatação fixa em pt-BR, sem depender do locale do sistema operacional:
+# locale.setlocale() altera o estado do processo inteiro (não é thread-safe)
+# e o pt_BR nem sempre está instalado no servidor.
+
+LOCALE_MOEDA = 'pt_BR'
+_CENTAVOS = Decimal('0.01')
+_TROCA_SEPARADORES = str.maketrans(',.', '.,')
+
+
+def formatar_brl(valor):
+    """1234.5 -> 'R$ 1.234,50'; None -> 'R$ 0,00'."""
+    if valor is None:
+        return 'R$ 0,00'
+    try:
+        numero = Decimal(str(valor)).quantize(_CENTAVOS, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return str(valor)
+    texto = f'{abs(numero):,.2f}'.translate(_TROCA_SEPARADORES)
+    return f'-R$ {texto}' if numero < 0 else f'R$ {texto}'
@@ -0,0 +1,37 @@
+from flask import current_app
+from markupsafe import Markup
+from cache import CacheLRU
+from formatacao import LOCALE_MOEDA
+
+# --- CACHE DE FRAGMENTOS (CARDS DE PRODUTO) ---
+# O mesmo card aparece nas vitrines da Home, no catálogo, na busca e nas
+# recomendações. O HTML de cada card é guardado pela versão do produto, que
+# aqui é o próprio conteúdo exibido (nome, preço, imagem, vendedor): se algo
+# muda, a chave muda e o card é renderizado de novo. Não há invalidação
+# explícita; entradas antigas saem pelo LRU.
+
+_cache = CacheLRU(maximo=5000)
+
+
+def _versao(produto):
+    return (produto.nome, str(produto.preco), produto.url_imagem, produto.vendedor.nome)
+
+
+def card_produto(produto, lazy=False):
+    """Usado nos templates: {{ card_produto(produto) }}."""
+    chave = (produto.id_produto, _versao(produto), LOCALE_MOEDA, lazy)
+    html = _cache.get(chave)
+    if html is None:
+        template = current_app.jinja_env.get_template('card_produto.html')
+        html = Markup(template.render(produto=produto, lazy=lazy))
+        _cache.set(chave, html)
+    return html
+
+
+def estatisticas_fragmentos():
+    return {
+        'itens': len(_cache),
+        'acertos': _cache.acertos,
+        'falhas': _cache.falhas,
+        'taxa_acerto': round(_cache.taxa_acerto, 4),
+    }
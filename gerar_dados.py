@@ -0,0 +1,238 @@
+"""
+Gerador de dados sintéticos em volume: vendedores, clientes, árvore de
+categorias profunda, produtos, histórico de pedidos e carrinhos ativos.
+Determinístico: a mesma --semente gera sempre os mesmos dados (as datas são
+relativas ao momento da geração). Tudo é inserido em lotes (executemany),
+sem montar objetos do ORM linha a linha.
+
+A popularidade dos produtos segue uma cauda longa (poucos produtos concentram
+a maior parte das vendas), como numa loja real. Todos os usuários gerados
+usam a senha SENHA_PADRAO, para o teste de carga (carga.py) poder logar.
+
+Uso (SQLite local por padrão):
+    python gerar_dados.py --produtos 100000 --pedidos 1000000 --carrinhos 5000
+    python gerar_dados.py --db sqlite:///carga.db --produtos 5000 --pedidos 20000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+SENHA_PADRAO = 'carga123'
+DOMINIO = 'carga.local'
+
+RAIZES = ['Relógios de Luxo', 'Joias', 'Bolsas', 'Perfumes', 'Óculos', 'Acessórios', 'Canetas', 'Decoração']
+SUBNIVEIS = [
+    ['Suíço', 'Alemão', 'Japonês', 'Italiano', 'Francês', 'Inglês'],
+    ['Clássico', 'Esportivo', 'Vintage', 'Contemporâneo', 'Edição Limitada'],
+    ['Ouro', 'Prata', 'Platina', 'Titânio', 'Couro'],
+    ['Masculino', 'Feminino', 'Unissex'],
+]
+ADJETIVOS = ['Élite', 'Royal', 'Noir', 'Imperial', 'Aurora', 'Safira', 'Ônix', 'Celeste', 'Vértice', 'Lumière']
+SUBSTANTIVOS = ['Cronógrafo', 'Colar', 'Anel', 'Bracelete', 'Bolsa', 'Carteira', 'Fragrância', 'Caneta',
+                'Abotoadura', 'Relógio', 'Pingente', 'Óculos', 'Vaso', 'Broche']
+MATERIAIS = ['ouro 18k', 'prata 925', 'platina', 'couro italiano', 'aço cirúrgico', 'cristal', 'titânio']
+STATUS = [('Enviado', 70), ('Concluido', 27), ('Devolução Solicitada', 3)]
+
+
+def caminhos_categorias(profundidade):
+    """Todas as folhas da árvore: 8 raízes x 6 x 5 x 5 x 3 (até `profundidade` níveis)."""
+    caminhos = [[raiz] for raiz in RAIZES]
+    for nivel in SUBNIVEIS[:max(0, profundidade - 1)]:
+        caminhos = [caminho + [nome] for caminho in caminhos for nome in nivel]
+    return [' / '.join(caminho) for caminho in caminhos]
+
+
+def em_lotes(linhas, tamanho):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos em volume.')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--vendedores', type=int, default=200)
+    parser.add_argument('--clientes', type=int, default=20000)
+    parser.add_argument('--produtos', type=int, default=100000)
+    parser.add_argument('--pedidos', type=int, default=1000000)
+    parser.add_argument('--carrinhos', type=int, default=5000, help='clientes com carrinho ativo')
+    parser.add_argument('--profundidade', type=int, default=5, help='níveis da árvore de categorias (1 a 5)')
+    parser.add_argument('--dias', type=int, default=365, help='período coberto pelo histórico de pedidos')
+    parser.add_argument('--lote', type=int, default=5000)
+    parser.add_argument('--db', help='URL do banco (padrão: DATABASE_URL ou sqlite:///carga.db)')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['DATABASE_URL'] = args.db
+    else:
+        os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.abspath('carga.db'))
+    os.environ.setdefault('SECRET_KEY', 'gerar-dados')
+
+    # Importado depois de definir DATABASE_URL
+    from sqlalchemy import insert, update, func
+    from app import app
+    from models import db, User, Produto, Categoria, Pedido, ItensPedido, ItemCarrinho
+    from categorias import invalidar_categorias
+    from senhas import gerar_hash
+    from vitrines import recalcular_vendas
+    from relatorios import recalcular_resumos
+
+    rng = random.Random(args.semente)
+    agora = datetime.now().replace(microsecond=0)
+    inicio_total = time.perf_counter()
+
+    def etapa(nome, inicio):
+        print(f'  {nome}: {time.perf_counter() - inicio:.1f}s')
+
+    print(f"Banco: {os.environ['DATABASE_URL']} (semente {args.semente})")
+    with app.app_context():
+        db.create_all()
+        if db.session.query(User.id).filter(User.email.like(f'%@{DOMINIO}')).first():
+            print(f'O banco já tem usuários @{DOMINIO}; use um banco novo.')
+            return 1
+
+        # --- Usuários ---
+        inicio = time.perf_counter()
+        senha_hash = gerar_hash(SENHA_PADRAO)  # um hash só: o custo do scrypt não entra na geração
+        usuarios = [
+            {'nome': f'Vendedor {i}', 'email': f'vendedor{i}@{DOMINIO}', 'senha_hash': senha_hash,
+             'tipo_usuario': 'vendedor'} for i in range(args.vendedores)
+        ] + [
+            {'nome': f'Cliente {i}', 'email': f'cliente{i}@{DOMINIO}', 'senha_hash': senha_hash,
+             'tipo_usuario': 'cliente'} for i in range(args.clientes)
+        ]
+        for lote in em_lotes(usuarios, args.lote):
+            db.session.execute(insert(User), lote)
+        db.session.execute(update(User).where(User.id_usuario.is_(None)).values(id_usuario=User.id))
+        db.session.commit()
+        vendedores = [row[0] for row in db.session.query(User.id_usuario).filter(
+            User.email.like(f'vendedor%@{DOMINIO}')).order_by(User.id_usuario)]
+        clientes = [row[0] for row in db.session.query(User.id_usuario).filter(
+            User.email.like(f'cliente%@{DOMINIO}')).order_by(User.id_usuario)]
+        etapa(f'{len(usuarios)} usuários', inicio)
+
+        # --- Categorias ---
+        inicio = time.perf_counter()
+        caminhos = caminhos_categorias(args.profundidade)
+        # Um INSERT em lote por nível; os ids do nível anterior viram id_pai
+        ids_categoria = dict(db.session.query(Categoria.caminho, Categoria.id_categoria))
+        for nivel in range(args.profundidade):
+            novos = {' / '.join(caminho.split(' / ')[:nivel + 1]) for caminho in caminhos} - set(ids_categoria)
+            if novos:
+                db.session.execute(insert(Categoria), [
+                    {'caminho': caminho, 'nome': caminho.split(' / ')[-1], 'nivel': nivel,
+                     'id_pai': ids_categoria.get(caminho.rpartition(' / ')[0])}
+                    for caminho in sorted(novos)
+                ])
+                ids_categoria.update(db.session.query(Categoria.caminho, Categoria.id_categoria)
+                                     .filter(Categoria.nivel == nivel))
+        db.session.commit()
+        invalidar_categorias()
+        etapa(f'{len(caminhos)} categorias folha', inicio)
+
+        # --- Produtos ---
+        inicio = time.perf_counter()
+        primeiro_produto = (db.session.query(func.max(Produto.id_produto)).scalar() or 0) + 1
+
+        def gerar_produtos():
+            for i in range(args.produtos):
+                caminho = rng.choice(caminhos)
+                nome = f'{rng.choice(SUBSTANTIVOS)} {rng.choice(ADJETIVOS)} {i}'
+                yield {
+                    'id_vendedor': rng.choice(vendedores),
+                    'nome': nome,
+                    'descricao': f'{nome} em {rng.choice(MATERIAIS)}, linha {caminho.split(" / ")[-1].lower()}.',
+                    'preco': Decimal(rng.randint(5000, 5000000)) / 100,
+                    'estoque': rng.randint(0, 500),
+                    'categoria': caminho,
+                    'id_categoria': ids_categoria[caminho],
+                    'url_imagem': None,
+                    'data_cadastro': agora - timedelta(seconds=rng.randint(0, args.dias * 86400)),
+                }
+
+        for lote in em_lotes(gerar_produtos(), args.lote):
+            db.session.execute(insert(Produto), lote)
+            db.session.commit()
+        produtos = dict(db.session.query(Produto.id_produto, Produto.preco).filter(
+            Produto.id_produto >= primeiro_produto).order_by(Produto.id_produto))
+        ids_produtos = list(produtos)
+        etapa(f'{len(ids_produtos)} produtos', inicio)
+
+        # Cauda longa: o peso do produto k é 1/(k+1)
+        pesos = []
+        acumulado = 0.0
+        for k in range(len(ids_produtos)):
+            acumulado += 1.0 / (k + 1)
+            pesos.append(acumulado)
+        ordem_popularidade = ids_produtos[:]
+        rng.shuffle(ordem_popularidade)
+
+        def sortear_produtos(quantidade):
+            return rng.choices(ordem_popularidade, cum_weights=pesos, k=quantidade)
+
+        # --- Pedidos e itens ---
+        inicio = time.perf_counter()
+        inserir_pedido = insert(Pedido).returning(Pedido.id_pedido, sort_by_parameter_order=True)
+        total_itens = 0
+        for numero_lote, lote in enumerate(em_lotes(range(args.pedidos), args.lote), start=1):
+            pedidos, itens = [], []
+            for _ in lote:
+                escolhidos = sortear_produtos(rng.choice((1, 1, 1, 2, 2, 3, 4)))
+                linhas = [(id_produto, rng.choice((1, 1, 1, 2, 3))) for id_produto in dict.fromkeys(escolhidos)]
+                subtotal = sum(produtos[id_produto] * quantidade for id_produto, quantidade in linhas)
+                total = (subtotal * Decimal('0.9')).quantize(Decimal('0.01')) if rng.random() < 0.1 else subtotal
+                pedidos.append({
+                    'id_usuario': rng.choice(clientes),
+                    'data_pedido': agora - timedelta(seconds=rng.randint(0, args.dias * 86400)),
+                    'status': rng.choices([s for s, _ in STATUS], weights=[p for _, p in STATUS])[0],
+                    'valor_total': total,
+                })
+                itens.append(linhas)
+
+            ids_pedidos = db.session.execute(inserir_pedido, pedidos).scalars().all()
+            linhas_itens = [
+                {'id_pedido': id_pedido, 'id_produto': id_produto, 'quantidade': quantidade,
+                 'preco_unitario': produtos[id_produto]}
+                for id_pedido, linhas in zip(ids_pedidos, itens)
+                for id_produto, quantidade in linhas
+            ]
+            db.session.execute(insert(ItensPedido), linhas_itens)
+            db.session.commit()
+            total_itens += len(linhas_itens)
+            if numero_lote % 20 == 0:
+                print(f'    {numero_lote * args.lote} pedidos...')
+        etapa(f'{args.pedidos} pedidos, {total_itens} itens', inicio)
+
+        # --- Carrinhos ativos ---
+        inicio = time.perf_counter()
+        carrinhos = []
+        for id_usuario in rng.sample(clientes, min(args.carrinhos, len(clientes))):
+            for id_produto in dict.fromkeys(sortear_produtos(rng.randint(1, 5))):
+                carrinhos.append({'id_usuario': id_usuario, 'id_produto': id_produto,
+                                  'quantidade': rng.randint(1, 3)})
+        for lote in em_lotes(carrinhos, args.lote):
+            db.session.execute(insert(ItemCarrinho), lote)
+        db.session.commit()
+        etapa(f'{len(carrinhos)} itens de carrinho', inicio)
+
+        # --- Tabelas derivadas ---
+        inicio = time.perf_counter()
+        recalcular_vendas()
+        recalcular_resumos()
+        etapa('contadores de vendas e resumo dos relatórios', inicio)
+
+    print(f'Concluído em {time.perf_counter() - inicio_total:.1f}s. '
+          f'Login dos usuários gerados: cliente0@{DOMINIO} / {SENHA_PADRAO}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
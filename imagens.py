@@ -0,0 +1,352 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import ssl
+import threading
+from urllib.parse import urlparse, urljoin
+from flask import current_app, url_for
+from PIL import Image, features
+
+# --- PROXY DE IMAGENS ---
+# Os cards exibiam a imagem original do produto (às vezes vários MB) num
+# espaço de 250px. A rota /img/<id>/<largura> busca a imagem original uma
+# única vez, reduz para uma das larguras fixas abaixo e converte para AVIF,
+# WebP ou JPEG conforme o Accept do navegador.
+#
+# Originais e variantes ficam num cache em disco endereçado pelo conteúdo
+# (sha256), com limite de tamanho e despejo LRU pela data de acesso. Como a
+# URL gerada pelos templates carrega um hash da url_imagem (?v=...), a
+# resposta pode ser servida com cache "immutable".
+
+LARGURAS = (80, 100, 160, 200, 400, 800, 1600)
+QUALIDADE = {'avif': 50, 'webp': 80, 'jpeg': 82}
+MIME = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+MAX_ORIGEM = 15 * 1024 * 1024  # bytes aceitos ao baixar uma imagem original
+TIMEOUT_ORIGEM = 5  # segundos
+MAX_REDIRECIONAMENTOS = 3
+MAX_CACHE_PADRAO = 512 * 1024 * 1024
+
+# AVIF precisa do Pillow >= 11.3 com libavif; sem o codificador, cai para WebP/JPEG
+AVIF_DISPONIVEL = features.check('avif') is True
+
+PLACEHOLDER = 'https://via.placeholder.com/400x400.png/091525/cfaf62?text=Midnight+Indigo'
+
+
+class ImagemIndisponivel(Exception):
+    pass
+
+
+def _sha256(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+class CacheDisco:
+    """Arquivos endereçados por hash, com limite de bytes e despejo LRU."""
+
+    def __init__(self, diretorio, maximo_bytes=MAX_CACHE_PADRAO):
+        self.diretorio = diretorio
+        self.maximo_bytes = maximo_bytes
+        self._lock = threading.Lock()
+        self._total = None
+        os.makedirs(diretorio, exist_ok=True)
+
+    def caminho(self, nome):
+        # Dois níveis de diretório para não acumular milhares de arquivos num só
+        return os.path.join(self.diretorio, nome[:2], nome)
+
+    def ler(self, nome):
+        caminho = self.caminho(nome)
+        try:
+            with open(caminho, 'rb') as arquivo:
+                dados = arquivo.read()
+        except FileNotFoundError:
+            return None
+        os.utime(caminho)  # marca o acesso para o LRU
+        return dados
+
+    def gravar(self, nome, dados):
+        caminho = self.caminho(nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f'{caminho}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, caminho)
+
+        with self._lock:
+            if self._total is None:
+                self._total = self._medir()
+            else:
+                self._total += len(dados)
+            if self._total > self.maximo_bytes:
+                self._despejar()
+
+    def _arquivos(self):
+        for raiz, _, nomes in os.walk(self.diretorio):
+            for nome in nomes:
+                if not nome.endswith('.tmp'):
+                    caminho = os.path.join(raiz, nome)
+                    try:
+                        info = os.stat(caminho)
+                    except FileNotFoundError:
+                        continue
+                    yield info.st_mtime, info.st_size, caminho
+
+    def _medir(self):
+        return sum(tamanho for _, tamanho, _ in self._arquivos())
+
+    def _despejar(self):
+        # Remove os menos usados até ficar em 90% do limite
+        alvo = self.maximo_bytes * 0.9
+        for _, tamanho, caminho in sorted(self._arquivos()):
+            if self._total <= alvo:
+                break
+            try:
+                os.remove(caminho)
+                self._total -= tamanho
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_origens = {}  # origem (url ou caminho + mtime) -> sha256 do conteúdo
+_lock = threading.Lock()
+
+
+def _obter_cache():
+    global _cache
+    with _lock:
+        if _cache is None:
+            diretorio = os.getenv('IMAGENS_CACHE_DIR') or os.path.join(current_app.instance_path, 'cache_imagens')
+            maximo = int(os.getenv('IMAGENS_CACHE_MAX_BYTES', MAX_CACHE_PADRAO))
+            _cache = CacheDisco(diretorio, maximo)
+        return _cache
+
+
+def _enderecos_publicos(host):
+    """IPs de `host`, ou [] se algum deles não for público (rede interna, loopback, metadados da nuvem)."""
+    try:
+        enderecos = [info[4][0] for info in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)]
+    except (socket.gaierror, UnicodeError):
+        return []
+    if not all(ipaddress.ip_address(endereco.split('%')[0]).is_global for endereco in enderecos):
+        return []
+    return enderecos
+
+
+class _ConexaoFixa(http.client.HTTPConnection):
+    """Conecta no IP já validado, sem resolver o DNS de novo; o Host enviado continua o da URL."""
+
+    def __init__(self, host, ip, **kwargs):
+        super().__init__(host, **kwargs)
+        self.ip = ip
+
+    def connect(self):
+        self.sock = socket.create_connection((self.ip, self.port), self.timeout)
+
+
+class _ConexaoFixaTLS(http.client.HTTPSConnection):
+    """Como _ConexaoFixa, com o certificado verificado contra o nome da URL."""
+
+    def __init__(self, host, ip, **kwargs):
+        self.contexto = ssl.create_default_context()
+        super().__init__(host, context=self.contexto, **kwargs)
+        self.ip = ip
+
+    def connect(self):
+        sock = socket.create_connection((self.ip, self.port), self.timeout)
+        self.sock = self.contexto.wrap_socket(sock, server_hostname=self.host)
+
+
+def _dentro_de(pasta, relativo, origem):
+    pasta = os.path.realpath(pasta)
+    caminho = os.path.realpath(os.path.join(pasta, relativo))
+    if not caminho.startswith(pasta + os.sep):
+        raise ImagemIndisponivel(origem)
+    return caminho
+
+
+def _caminho_local(origem):
+    """
+    Arquivo local para origens /static/... ou file://... (estas só dentro de
+    IMAGENS_DIR_LOCAL, útil em desenvolvimento e testes sem rede); senão None.
+    """
+    if origem.startswith('file://'):
+        pasta = os.getenv('IMAGENS_DIR_LOCAL')
+        if not pasta:
+            raise ImagemIndisponivel(origem)
+        return _dentro_de(pasta, os.path.relpath(urlparse(origem).path, pasta), origem)
+    if origem.startswith('/static/') or origem.startswith('static/'):
+        return _dentro_de(current_app.static_folder, origem.split('static/', 1)[1], origem)
+    return None
+
+
+def _baixar(origem):
+    caminho = _caminho_local(origem)
+    if caminho is not None:
+        try:
+            with open(caminho, 'rb') as arquivo:
+                return arquivo.read(MAX_ORIGEM + 1)
+        except OSError:
+            raise ImagemIndisponivel(origem)
+
+    # A URL vem do cadastro do vendedor: não deixa o servidor acessar a rede
+    # interna. Cada salto (redirecionamentos incluídos) é validado, e a conexão
+    # vai para o IP validado, então um DNS que muda de resposta não engana.
+    url_atual = origem
+    for _ in range(MAX_REDIRECIONAMENTOS + 1):
+        url = urlparse(url_atual)
+        enderecos = _enderecos_publicos(url.hostname) if url.scheme in ('http', 'https') and url.hostname else []
+        if not enderecos:
+            raise ImagemIndisponivel(origem)
+        try:
+            classe = _ConexaoFixaTLS if url.scheme == 'https' else _ConexaoFixa
+            conexao = classe(url.hostname, enderecos[0], port=url.port, timeout=TIMEOUT_ORIGEM)
+            caminho = (url.path or '/') + (f'?{url.query}' if url.query else '')
+            try:
+                conexao.request('GET', caminho, headers={'User-Agent': 'MidnightIndigo-Imagens/1.0'})
+                resposta = conexao.getresponse()
+                if resposta.status in (301, 302, 303, 307, 308) and resposta.getheader('Location'):
+                    url_atual = urljoin(url_atual, resposta.getheader('Location'))
+                    continue
+                if resposta.status != 200:
+                    raise ImagemIndisponivel(origem)
+                return resposta.read(MAX_ORIGEM + 1)
+            finally:
+                conexao.close()
+        except (OSError, ValueError, http.client.HTTPException):
+            raise ImagemIndisponivel(origem)
+    raise ImagemIndisponivel(origem)
+
+
+def _chave_origem(origem):
+    """Chave de `origem` em _origens: arquivos locais podem mudar no mesmo caminho, então a data de modificação entra."""
+    caminho = _caminho_local(origem)
+    try:
+        return (origem, os.stat(caminho).st_mtime_ns) if caminho else origem
+    except OSError:
+        raise ImagemIndisponivel(origem)
+
+
+def _original(origem):
+    """Conteúdo original (lido/baixado uma vez) e seu hash."""
+    cache = _obter_cache()
+    chave = _chave_origem(origem)
+    hash_origem = _origens.get(chave)
+    if hash_origem:
+        dados = cache.ler(hash_origem + '.orig')
+        if dados is not None:
+            return hash_origem, dados
+
+    dados = _baixar(origem)
+    if len(dados) > MAX_ORIGEM:
+        raise ImagemIndisponivel(origem)
+    hash_origem = _sha256(dados)
+    cache.gravar(hash_origem + '.orig', dados)
+    _origens[chave] = hash_origem
+    return hash_origem, dados
+
+
+def escolher_formato(accept):
+    accept = accept or ''
+    if 'image/avif' in accept and AVIF_DISPONIVEL:
+        return 'avif'
+    if 'image/webp' in accept:
+        return 'webp'
+    return 'jpeg'
+
+
+def _redimensionar(dados, largura, formato):
+    try:
+        imagem = Image.open(io.BytesIO(dados))
+        imagem.load()
+    except (OSError, Image.DecompressionBombError):
+        raise ImagemIndisponivel('formato de imagem inválido')
+
+    if imagem.width > largura:
+        altura = max(1, round(imagem.height * largura / imagem.width))
+        imagem = imagem.resize((largura, altura), Image.LANCZOS)
+
+    transparente = imagem.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagem.info
+    if formato == 'jpeg' and transparente:
+        formato = 'png'  # JPEG não tem canal alfa
+    if formato == 'jpeg':
+        imagem = imagem.convert('RGB')
+    elif imagem.mode not in ('RGB', 'RGBA'):
+        imagem = imagem.convert('RGBA' if transparente else 'RGB')
+
+    saida = io.BytesIO()
+    if formato == 'png':
+        imagem.save(saida, 'PNG', optimize=True)
+    elif formato == 'jpeg':
+        imagem.save(saida, 'JPEG', quality=QUALIDADE['jpeg'], optimize=True, progressive=True)
+    else:
+        imagem.save(saida, formato.upper(), quality=QUALIDADE[formato])
+    return saida.getvalue(), formato
+
+
+def _variante_salva(cache, hash_origem, largura, formato):
+    """(bytes, formato, etag) da variante no cache em disco, ou None."""
+    # Pedido de JPEG para imagem com transparência vira PNG
+    for formato_salvo in [formato] + (['png'] if formato == 'jpeg' else []):
+        nome = f'{hash_origem}-{largura}.{formato_salvo}'
+        salvo = cache.ler(nome)
+        if salvo is not None:
+            return salvo, formato_salvo, nome
+    return None
+
+
+def variante(origem, largura, formato):
+    """
+    Retorna (bytes, formato, etag) da imagem `origem` com `largura` px.
+    Levanta ImagemIndisponivel se a origem não puder ser lida.
+    """
+    cache = _obter_cache()
+    # Variante já gerada: serve sem ler (nem baixar) o original
+    hash_origem = _origens.get(_chave_origem(origem))
+    salvo = _variante_salva(cache, hash_origem, largura, formato) if hash_origem else None
+    if salvo is not None:
+        return salvo
+
+    hash_origem, dados = _original(origem)
+    salvo = _variante_salva(cache, hash_origem, largura, formato)
+    if salvo is not None:
+        return salvo
+
+    convertido, formato_final = _redimensionar(dados, largura, formato)
+    nome = f'{hash_origem}-{largura}.{formato_final}'
+    cache.gravar(nome, convertido)
+    return convertido, formato_final, nome
+
+
+# --- Helpers de template ---
+
+def _versao(origem):
+    return hashlib.sha1(origem.encode('utf-8')).hexdigest()[:10]
+
+
+def url_imagem(produto, largura=400):
+    if not produto.url_imagem:
+        return PLACEHOLDER
+    return url_for('imagem_produto', id_produto=produto.id_produto, largura=largura, v=_versao(produto.url_imagem))
+
+
+def srcset_imagem(produto, larguras=(200, 400, 800)):
+    if not produto.url_imagem:
+        return ''
+    return ', '.join(f'{url_imagem(produto, largura)} {largura}w' for largura in larguras)
+
+
+def url_estatica(arquivo, largura):
+    try:
+        versao = _versao(f'{arquivo}:{os.stat(os.path.join(current_app.static_folder, arquivo)).st_mtime_ns}')
+    except OSError:
+        versao = _versao(arquivo)
+    return url_for('imagem_estatica', largura=largura, arquivo=arquivo, v=versao)
+
+
+def srcset_estatico(arquivo, larguras):
+    return ', '.join(f'{url_estatica(arquivo, largura)} {largura}w' for largura in larguras)
@@ -0,0 +1,64 @@
+"""
+Importação em lote de produtos pela linha de comando, para arquivos grandes
+demais para o upload da tela de vendas. Usa o mesmo importador do app
+(importacao.py): leitura em streaming, executemany e commit por lote.
+
+Uso:
+    python import_products.py --vendedor vendedor@midnight.com --arquivo produtos.csv
+    python import_products.py --vendedor vendedor@midnight.com --arquivo produtos.jsonl --lote 5000
+"""
+import argparse
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa produtos de um CSV ou JSONL.')
+    parser.add_argument('--vendedor', required=True, help='e-mail do vendedor dono dos produtos')
+    parser.add_argument('--arquivo', required=True)
+    parser.add_argument('--formato', choices=('csv', 'jsonl'), help='padrão: pela extensão do arquivo')
+    parser.add_argument('--lote', type=int, default=1000, help='linhas por INSERT/commit')
+    args = parser.parse_args()
+
+    from app import app
+    from models import User
+    from importacao import importar_produtos, ler_linhas, formato_do_arquivo
+
+    formato = args.formato or formato_do_arquivo(args.arquivo)
+    inicio = time.perf_counter()
+
+    def progresso(relatorio):
+        decorrido = time.perf_counter() - inicio
+        print(f'  {relatorio.linhas} linhas lidas, {relatorio.inseridos} inseridos, '
+              f'{relatorio.atualizados} atualizados, {relatorio.total_erros} erros '
+              f'({relatorio.linhas / decorrido:.0f} linhas/s)')
+
+    with app.app_context():
+        vendedor = User.query.filter_by(email=args.vendedor).first()
+        if not vendedor or vendedor.tipo_usuario not in ('vendedor', 'admin'):
+            print(f'Vendedor não encontrado: {args.vendedor}', file=sys.stderr)
+            return 1
+
+        print(f'Importando {args.arquivo} ({formato}) para {vendedor.nome}...')
+        with open(args.arquivo, encoding='utf-8-sig', newline='') as arquivo:
+            relatorio = importar_produtos(ler_linhas(arquivo, formato), vendedor.id_usuario,
+                                          eh_admin=vendedor.tipo_usuario == 'admin',
+                                          tamanho_lote=args.lote, progresso=progresso)
+
+    print(f'Concluído em {time.perf_counter() - inicio:.1f}s: {relatorio.inseridos} inseridos, '
+          f'{relatorio.atualizados} atualizados, {relatorio.total_erros} com erro.')
+    for numero, mensagem in relatorio.erros:
+        print(f'  linha {numero}: {mensagem}')
+    if relatorio.total_erros > len(relatorio.erros):
+        print(f'  ... e mais {relatorio.total_erros - len(relatorio.erros)} erros.')
+    # Os caches (vitrines, categorias, índices de busca, páginas) são por
+    # processo: os servidores em execução só veem os produtos importados quando
+    # eles expiram, em até 5 minutos (TTL_VITRINES, TTL_ARVORE, TTL_INDICES,
+    # TTL_PAGINA). Para vê-los na hora, reinicie os servidores.
+    print('Servidores em execução mostram os produtos importados em até 5 minutos '
+          '(ou reinicie-os para vê-los na hora).')
+    return 0 if not relatorio.total_erros else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
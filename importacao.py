@@ -0,0 +1,207 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert, update
+from models import db, Produto
+from categorias import normalizar_caminho, garantir_categoria
+
+# --- IMPORTAÇÃO EM LOTE DE PRODUTOS ---
+# Lê um CSV ou JSONL linha a linha (sem carregar o arquivo em memória),
+# valida cada linha e grava em lotes: um INSERT/UPDATE com executemany por
+# lote e um commit por lote. Linhas com id_produto atualizam o produto
+# existente (upsert); as demais são inseridas. Erros de validação não
+# interrompem a importação: são contados e os primeiros ficam no relatório.
+#
+# Colunas: nome, descricao, preco, estoque, categoria, url_imagem, id_produto (opcional)
+
+TAMANHO_LOTE = 1000
+MAX_ERROS_RELATORIO = 200
+LIMITES = {'nome': 200, 'categoria': 300, 'url_imagem': 400}
+
+
+class ErroLinha(ValueError):
+    pass
+
+
+class RelatorioImportacao:
+    def __init__(self):
+        self.linhas = 0
+        self.inseridos = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.erros = []  # [(número da linha, mensagem)], só os primeiros
+        self.ids_atualizados = []
+
+    def erro(self, numero, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_RELATORIO:
+            self.erros.append((numero, mensagem))
+
+    def como_dict(self):
+        return {
+            'linhas': self.linhas,
+            'inseridos': self.inseridos,
+            'atualizados': self.atualizados,
+            'total_erros': self.total_erros,
+            'erros': [{'linha': numero, 'erro': mensagem} for numero, mensagem in self.erros],
+        }
+
+
+def ler_linhas(arquivo_texto, formato):
+    """Gera (número da linha, dict) a partir de um arquivo de texto aberto."""
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo_texto)
+        for dados in leitor:
+            yield leitor.line_num, dados
+    elif formato == 'jsonl':
+        for numero, texto in enumerate(arquivo_texto, start=1):
+            if not texto.strip():
+                continue
+            try:
+                dados = json.loads(texto)
+            except ValueError:
+                yield numero, ErroLinha('JSON inválido')
+                continue
+            yield numero, dados if isinstance(dados, dict) else ErroLinha('a linha deve ser um objeto JSON')
+    else:
+        raise ValueError(f'Formato não suportado: {formato}')
+
+
+def formato_do_arquivo(nome):
+    return 'jsonl' if nome.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _texto(dados, campo, obrigatorio=True):
+    valor = dados.get(campo)
+    valor = str(valor).strip() if valor is not None else ''
+    if obrigatorio and not valor:
+        raise ErroLinha(f'campo "{campo}" é obrigatório')
+    if campo in LIMITES and len(valor) > LIMITES[campo]:
+        raise ErroLinha(f'campo "{campo}" passa de {LIMITES[campo]} caracteres')
+    return valor or None
+
+
+def _preco(valor):
+    texto = str(valor if valor is not None else '').strip().replace('R$', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')  # formato 1.234,56
+    try:
+        preco = Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ErroLinha(f'preço inválido: {valor!r}')
+    if not preco.is_finite():  # NaN passa pelo quantize e quebra a comparação abaixo
+        raise ErroLinha(f'preço inválido: {valor!r}')
+    if preco < 0 or preco >= Decimal('100000000'):
+        raise ErroLinha(f'preço fora do intervalo: {valor!r}')
+    return preco
+
+
+def _inteiro(valor, campo, padrao=None):
+    if valor is None or str(valor).strip() == '':
+        if padrao is None:
+            raise ErroLinha(f'campo "{campo}" é obrigatório')
+        return padrao
+    try:
+        numero = int(str(valor).strip())
+    except ValueError:
+        raise ErroLinha(f'{campo} inválido: {valor!r}')
+    if numero < 0:
+        raise ErroLinha(f'{campo} não pode ser negativo')
+    return numero
+
+
+def validar(dados):
+    """Converte uma linha do arquivo nas colunas do Produto (ou ErroLinha)."""
+    linha = {
+        'nome': _texto(dados, 'nome'),
+        'descricao': _texto(dados, 'descricao'),
+        'preco': _preco(dados.get('preco')),
+        'estoque': _inteiro(dados.get('estoque'), 'estoque', padrao=1),
+        'categoria': normalizar_caminho(_texto(dados, 'categoria')),
+        'url_imagem': _texto(dados, 'url_imagem', obrigatorio=False),
+    }
+    if not linha['categoria']:
+        raise ErroLinha('categoria inválida')
+    if dados.get('id_produto') not in (None, ''):
+        linha['id_produto'] = _inteiro(dados.get('id_produto'), 'id_produto')
+    return linha
+
+
+class _Importador:
+    def __init__(self, id_vendedor, eh_admin, relatorio, progresso):
+        self.id_vendedor = id_vendedor
+        self.eh_admin = eh_admin
+        self.relatorio = relatorio
+        self.progresso = progresso
+        self.categorias = {}  # caminho -> id_categoria (evita ir à árvore a cada linha)
+
+    def _id_categoria(self, caminho):
+        if caminho not in self.categorias:
+            self.categorias[caminho] = garantir_categoria(caminho)
+        return self.categorias[caminho]
+
+    def gravar(self, lote):
+        novos, alteracoes = [], []
+        for numero, linha in lote:
+            linha['id_categoria'] = self._id_categoria(linha['categoria'])
+            (alteracoes if 'id_produto' in linha else novos).append((numero, linha))
+
+        if alteracoes:
+            # Só atualiza produtos do próprio vendedor (admin pode todos)
+            ids = [linha['id_produto'] for _, linha in alteracoes]
+            query = db.session.query(Produto.id_produto).filter(Produto.id_produto.in_(ids))
+            if not self.eh_admin:
+                query = query.filter(Produto.id_vendedor == self.id_vendedor)
+            permitidos = {row[0] for row in query}
+            validas = []
+            for numero, linha in alteracoes:
+                if linha['id_produto'] in permitidos:
+                    validas.append(linha)
+                else:
+                    self.relatorio.erro(numero, f"produto {linha['id_produto']} não encontrado")
+            if validas:
+                db.session.execute(update(Produto), validas)
+                self.relatorio.atualizados += len(validas)
+                self.relatorio.ids_atualizados.extend(linha['id_produto'] for linha in validas)
+
+        if novos:
+            db.session.execute(insert(Produto), [
+                dict(linha, id_vendedor=self.id_vendedor) for _, linha in novos
+            ])
+            self.relatorio.inseridos += len(novos)
+
+        db.session.commit()
+        if self.progresso:
+            self.progresso(self.relatorio)
+
+
+def importar_produtos(linhas, id_vendedor, eh_admin=False, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """
+    Importa as `linhas` (saída de ler_linhas) para o vendedor `id_vendedor`.
+    `progresso(relatorio)` é chamado após cada lote gravado.
+    """
+    relatorio = RelatorioImportacao()
+    importador = _Importador(id_vendedor, eh_admin, relatorio, progresso)
+    lote = []
+    try:
+        for numero, dados in linhas:
+            relatorio.linhas += 1
+            try:
+                if isinstance(dados, ErroLinha):
+                    raise dados
+                lote.append((numero, validar(dados)))
+            except ErroLinha as erro:
+                relatorio.erro(numero, str(erro))
+                continue
+            if len(lote) >= tamanho_lote:
+                importador.gravar(lote)
+                lote = []
+        if lote:
+            importador.gravar(lote)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        relatorio.erro(relatorio.linhas, 'o arquivo não está em UTF-8; importação interrompida')
+    except Exception:
+        db.session.rollback()
+        raise
+    return relatorio
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# --- MÉTRICAS E INSTRUMENTAÇÃO DE SQL ---
+# Eventos do SQLAlchemy contam as queries de cada requisição (quantidade,
+# tempo total, mais lentas). Uma mesma instrução repetida muitas vezes na
+# mesma requisição (ex: lazy load dentro de um loop) é registrada no log como
+# suspeita de N+1. Por rota são mantidos histogramas de latência e de número
+# de queries, além dos percentis p50/p95/p99, expostos em /metrics no formato
+# texto do Prometheus.
+#
+# METRICAS_CABECALHO_DEBUG=1 adiciona às respostas o cabeçalho X-SQL-Stats.
+# METRICAS_TOKEN, se definido, passa a ser exigido para ler /metrics.
+
+LIMITE_N_MAIS_1 = 5       # repetições da mesma instrução para suspeitar de N+1
+MAIS_LENTAS = 3           # instruções mais lentas guardadas por requisição
+AMOSTRAS_PERCENTIS = 1000  # últimas latências por rota usadas nos percentis
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PERCENTIS = (0.5, 0.95, 0.99)
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.soma += valor
+        self.total += 1
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+
+
+class _Rota:
+    def __init__(self):
+        self.latencia = Histograma(BUCKETS_LATENCIA)
+        self.queries = Histograma(BUCKETS_QUERIES)
+        self.tempo_db = 0.0
+        self.amostras = deque(maxlen=AMOSTRAS_PERCENTIS)
+        self.suspeitas_n_mais_1 = 0
+
+
+_lock = threading.Lock()
+_rotas = defaultdict(_Rota)
+_respostas = Counter()  # (rota, método, status) -> total
+_coletores = []  # funções extras que retornam linhas de métricas (caches etc.)
+
+
+# --- Eventos do SQLAlchemy ---
+
+def _estado():
+    if not has_request_context():
+        return None
+    estado = g.get('_metricas_sql')
+    if estado is None:
+        estado = g._metricas_sql = {'consultas': 0, 'tempo': 0.0, 'instrucoes': Counter(), 'lentas': []}
+    return estado
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_da_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metricas_inicio', []).append((statement, time.perf_counter()))
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_da_query(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('_metricas_inicio')
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()[1]
+    estado = _estado()
+    if estado is None:
+        return
+    estado['consultas'] += 1
+    estado['tempo'] += duracao
+    estado['instrucoes'][statement] += 1
+    lentas = estado['lentas']
+    lentas.append((duracao, statement))
+    if len(lentas) > MAIS_LENTAS:
+        lentas.sort(reverse=True)
+        del lentas[MAIS_LENTAS:]
+
+
+@event.listens_for(Engine, 'handle_error')
+def _erro_na_query(contexto):
+    # Instrução que falhou não chega ao after_cursor_execute: descarta o início dela
+    if contexto.connection is None:
+        return
+    inicios = contexto.connection.info.get('_metricas_inicio')
+    if inicios and inicios[-1][0] == contexto.statement:
+        inicios.pop()
+
+
+# --- Hooks do Flask ---
+
+def _inicio_requisicao():
+    g._metricas_inicio = time.perf_counter()
+
+
+def _fim_requisicao(resposta):
+    inicio = g.pop('_metricas_inicio', None)
+    if inicio is None:
+        return resposta
+    duracao = time.perf_counter() - inicio
+    estado = g.pop('_metricas_sql', None) or {'consultas': 0, 'tempo': 0.0, 'instrucoes': Counter(), 'lentas': []}
+    rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+
+    suspeitas = [(sql, vezes) for sql, vezes in estado['instrucoes'].items() if vezes >= LIMITE_N_MAIS_1]
+    for sql, vezes in suspeitas:
+        current_app.logger.warning('Possível N+1 em %s %s: %dx %s', request.method, rota, vezes,
+                                   ' '.join(sql.split())[:300])
+
+    with _lock:
+        dados = _rotas[rota]
+        dados.latencia.observar(duracao)
+        dados.queries.observar(estado['consultas'])
+        dados.tempo_db += estado['tempo']
+        dados.amostras.append(duracao)
+        dados.suspeitas_n_mais_1 += len(suspeitas)
+        _respostas[(rota, request.method, resposta.status_code)] += 1
+
+    if os.getenv('METRICAS_CABECALHO_DEBUG') == '1':
+        lenta = estado['lentas'][0][0] * 1000 if estado['lentas'] else 0.0
+        resposta.headers['X-SQL-Stats'] = (
+            f"queries={estado['consultas']}; db_ms={estado['tempo'] * 1000:.1f}; "
+            f"mais_lenta_ms={lenta:.1f}; n_mais_1={len(suspeitas)}; total_ms={duracao * 1000:.1f}"
+        )
+    return resposta
+
+
+def iniciar_metricas(app):
+    app.before_request(_inicio_requisicao)
+    app.after_request(_fim_requisicao)
+
+
+def registrar_coletor(funcao):
+    """`funcao()` retorna [(nome, {rótulos}, valor), ...] para incluir em /metrics."""
+    _coletores.append(funcao)
+
+
+# --- Formato texto do Prometheus ---
+
+def _rotulos(**rotulos):
+    pares = []
+    for chave, valor in rotulos.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{chave}="{valor}"')
+    return '{' + ','.join(pares) + '}'
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+
+def _linhas_histograma(nome, rota, histograma):
+    for limite, contagem in zip(histograma.buckets, histograma.contagens):
+        yield f'{nome}_bucket{_rotulos(rota=rota, le=limite)} {contagem}'
+    yield f'{nome}_bucket{_rotulos(rota=rota, le="+Inf")} {histograma.total}'
+    yield f'{nome}_sum{_rotulos(rota=rota)} {histograma.soma}'
+    yield f'{nome}_count{_rotulos(rota=rota)} {histograma.total}'
+
+
+def texto_prometheus():
+    with _lock:
+        rotas = {rota: (dados, sorted(dados.amostras)) for rota, dados in _rotas.items()}
+        respostas = dict(_respostas)
+
+        linhas = [
+            '# HELP midnight_requisicoes_total Requisições atendidas por rota, método e status.',
+            '# TYPE midnight_requisicoes_total counter',
+        ]
+        for (rota, metodo, status), total in sorted(respostas.items()):
+            linhas.append(f'midnight_requisicoes_total{_rotulos(rota=rota, metodo=metodo, status=status)} {total}')
+
+        linhas += ['# HELP midnight_requisicao_segundos Latência das requisições por rota.',
+                   '# TYPE midnight_requisicao_segundos histogram']
+        for rota, (dados, _) in sorted(rotas.items()):
+            linhas.extend(_linhas_histograma('midnight_requisicao_segundos', rota, dados.latencia))
+
+        linhas += ['# HELP midnight_requisicao_segundos_percentil Percentis das últimas requisições por rota.',
+                   '# TYPE midnight_requisicao_segundos_percentil gauge']
+        for rota, (_, amostras) in sorted(rotas.items()):
+            for p in PERCENTIS:
+                if amostras:
+                    valor = _percentil(amostras, p)
+                    linhas.append(f'midnight_requisicao_segundos_percentil{_rotulos(rota=rota, quantile=p)} {valor}')
+
+        linhas += ['# HELP midnight_queries_por_requisicao Número de queries SQL por requisição.',
+                   '# TYPE midnight_queries_por_requisicao histogram']
+        for rota, (dados, _) in sorted(rotas.items()):
+            linhas.extend(_linhas_histograma('midnight_queries_por_requisicao', rota, dados.queries))
+
+        linhas += ['# HELP midnight_db_segundos_total Tempo gasto no banco por rota.',
+                   '# TYPE midnight_db_segundos_total counter']
+        for rota, (dados, _) in sorted(rotas.items()):
+            linhas.append(f'midnight_db_segundos_total{_rotulos(rota=rota)} {dados.tempo_db}')
+
+        linhas += ['# HELP midnight_suspeitas_n_mais_1_total Instruções repetidas (possível N+1) por rota.',
+                   '# TYPE midnight_suspeitas_n_mais_1_total counter']
+        for rota, (dados, _) in sorted(rotas.items()):
+            linhas.append(f'midnight_suspeitas_n_mais_1_total{_rotulos(rota=rota)} {dados.suspeitas_n_mais_1}')
+
+    # Os coletores alternam métricas (ex: acertos/falhas de um cache, depois do
+    # outro); o formato exige cada família numa sequência só, com um # TYPE
+    familias = defaultdict(list)
+    for coletor in _coletores:
+        for nome, rotulos, valor in coletor():
+            familias[nome].append(f'{nome}{_rotulos(**rotulos)} {valor}')
+    for nome, amostras in familias.items():
+        linhas.append(f'# TYPE {nome} {"counter" if nome.endswith("_total") else "gauge"}')
+        linhas.extend(amostras)
+    return '\n'.join(linhas) + '\n'
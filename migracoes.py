@@ -0,0 +1,170 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from models import db, VersaoSchema, ItemCarrinho
+from categorias import vincular_categorias, invalidar_categorias
+
+# --- MIGRAÇÕES VERSIONADAS DO SCHEMA ---
+# Cada migração tem um número de versão e roda uma única vez: as versões
+# aplicadas ficam na tabela VersaoSchema. Em vez de recriar o banco pelo
+# Midnight_Indigo_DB.sql, um banco existente é atualizado com:
+#     python migrar.py
+# As migrações são idempotentes (conferem se o índice/coluna já existe), então
+# num banco novo, criado pelo create_all() com os modelos atuais, elas apenas
+# registram a versão. Índices no SQL Server são criados com ONLINE = ON (sem
+# bloquear a tabela) quando a edição do servidor permite.
+
+Migracao = namedtuple('Migracao', ['versao', 'descricao', 'aplicar'])
+MIGRACOES = []
+
+
+def migracao(versao, descricao):
+    def registrar(funcao):
+        MIGRACOES.append(Migracao(versao, descricao, funcao))
+        return funcao
+    return registrar
+
+
+# --- Operações auxiliares ---
+
+def _q(conexao, nome):
+    return conexao.dialect.identifier_preparer.quote(nome)
+
+
+def existe_indice(conexao, tabela, nome):
+    return any(indice['name'] == nome for indice in inspect(conexao).get_indexes(tabela))
+
+
+def criar_indice(conexao, nome, tabela, colunas, unico=False):
+    """CREATE INDEX se ainda não existir; online no SQL Server quando possível."""
+    if existe_indice(conexao, tabela, nome):
+        return False
+    ddl = 'CREATE {}INDEX {} ON {} ({})'.format(
+        'UNIQUE ' if unico else '', _q(conexao, nome), _q(conexao, tabela),
+        ', '.join(_q(conexao, coluna) for coluna in colunas),
+    )
+    if conexao.dialect.name == 'mssql':
+        try:
+            with conexao.begin_nested():
+                conexao.execute(text(ddl + ' WITH (ONLINE = ON)'))
+            return True
+        except DBAPIError:
+            pass  # Edição sem índice online (ex: Express/Standard): cria bloqueando
+    conexao.execute(text(ddl))
+    return True
+
+
+def adicionar_coluna(conexao, tabela, coluna, tipo):
+    if coluna in {c['name'] for c in inspect(conexao).get_columns(tabela)}:
+        return False
+    palavra = 'ADD' if conexao.dialect.name == 'mssql' else 'ADD COLUMN'
+    conexao.execute(text(f'ALTER TABLE {_q(conexao, tabela)} {palavra} {_q(conexao, coluna)} {tipo}'))
+    return True
+
+
+# --- Migrações ---
+
+@migracao(1, 'Tabelas novas (categorias, contadores e resumo de vendas) e Produtos.id_categoria')
+def _tabelas_novas(conexao):
+    # Só as tabelas desta versão: as das migrações seguintes são criadas por elas
+    for tabela in ('Categorias', 'VendasProdutos', 'VendasProdutosDia', 'VendasResumoDia'):
+        db.metadata.tables[tabela].create(conexao, checkfirst=True)
+    referencia = f"REFERENCES {_q(conexao, 'Categorias')} ({_q(conexao, 'id_categoria')})"
+    if adicionar_coluna(conexao, 'Produtos', 'id_categoria', f'INTEGER NULL {referencia}'):
+        criar_indice(conexao, 'ix_Produtos_id_categoria', 'Produtos', ['id_categoria'])
+        db.session.flush()
+        # Sem commit: entra na transação da migração, junto com o registro da versão
+        vincular_categorias()
+
+
+@migracao(2, 'Índices das rotas mais acessadas (catálogo, Home, pedidos, mais vendidos)')
+def _indices_rotas(conexao):
+    criar_indice(conexao, 'ix_Produtos_data_cadastro', 'Produtos', ['data_cadastro'])
+    criar_indice(conexao, 'ix_Produtos_estoque', 'Produtos', ['estoque'])
+    criar_indice(conexao, 'ix_Produtos_nome', 'Produtos', ['nome'])
+    criar_indice(conexao, 'ix_Produtos_preco', 'Produtos', ['preco'])
+    criar_indice(conexao, 'ix_Produtos_id_vendedor', 'Produtos', ['id_vendedor'])
+    criar_indice(conexao, 'ix_ItensPedido_id_produto', 'ItensPedido', ['id_produto'])
+    criar_indice(conexao, 'ix_ItensPedido_id_pedido', 'ItensPedido', ['id_pedido'])
+    criar_indice(conexao, 'ix_Pedidos_usuario_data', 'Pedidos', ['id_usuario', 'data_pedido', 'id_pedido'])
+
+
+@migracao(3, 'ItensCarrinho: um item por (usuário, produto)')
+def _carrinho_unico(conexao):
+    if existe_indice(conexao, 'ItensCarrinho', 'ux_ItensCarrinho_usuario_produto'):
+        return
+    # Junta itens repetidos no primeiro (somando as quantidades) antes do índice único
+    repetidos = db.session.query(
+        ItemCarrinho.id_usuario, ItemCarrinho.id_produto,
+        db.func.min(ItemCarrinho.id_item_carrinho), db.func.sum(ItemCarrinho.quantidade)
+    ).group_by(
+        ItemCarrinho.id_usuario, ItemCarrinho.id_produto
+    ).having(db.func.count() > 1).all()
+    for id_usuario, id_produto, id_mantido, quantidade in repetidos:
+        ItemCarrinho.query.filter(
+            ItemCarrinho.id_usuario == id_usuario, ItemCarrinho.id_produto == id_produto,
+            ItemCarrinho.id_item_carrinho != id_mantido
+        ).delete(synchronize_session=False)
+        ItemCarrinho.query.filter_by(id_item_carrinho=id_mantido).update(
+            {'quantidade': quantidade}, synchronize_session=False)
+    criar_indice(conexao, 'ux_ItensCarrinho_usuario_produto', 'ItensCarrinho',
+                 ['id_usuario', 'id_produto'], unico=True)
+
+
+@migracao(4, 'Fila de tarefas (Tarefas)')
+def _fila_tarefas(conexao):
+    db.metadata.tables['Tarefas'].create(conexao, checkfirst=True)
+
+
+@migracao(5, 'Pedidos já aplicados pelas tarefas de vendas/devolução (PedidosAplicados)')
+def _pedidos_aplicados(conexao):
+    db.metadata.tables['PedidosAplicados'].create(conexao, checkfirst=True)
+
+
+@migracao(6, 'Chave estrangeira de Produtos.id_categoria (bancos migrados sem ela)')
+def _fk_categoria_produto(conexao):
+    chaves = inspect(conexao).get_foreign_keys('Produtos')
+    if any(chave['constrained_columns'] == ['id_categoria'] for chave in chaves):
+        return
+    if conexao.dialect.name == 'sqlite':
+        return  # SQLite não adiciona constraint em tabela existente
+    # Vínculos para categorias que não existem mais impediriam a constraint
+    conexao.execute(text(
+        'UPDATE {p} SET {c} = NULL WHERE {c} IS NOT NULL AND {c} NOT IN (SELECT {c} FROM {cat})'.format(
+            p=_q(conexao, 'Produtos'), c=_q(conexao, 'id_categoria'), cat=_q(conexao, 'Categorias'))
+    ))
+    conexao.execute(text('ALTER TABLE {} ADD FOREIGN KEY ({}) REFERENCES {} ({})'.format(
+        _q(conexao, 'Produtos'), _q(conexao, 'id_categoria'), _q(conexao, 'Categorias'), _q(conexao, 'id_categoria'))
+    ))
+
+
+# --- Execução ---
+
+def versoes_aplicadas():
+    VersaoSchema.__table__.create(db.engine, checkfirst=True)
+    return {versao for (versao,) in db.session.query(VersaoSchema.versao)}
+
+
+def migrar(ate=None, saida=print):
+    """Aplica, em ordem, as migrações pendentes (até a versão `ate`). Retorna as aplicadas."""
+    aplicadas = versoes_aplicadas()
+    novas = []
+    for migracao_atual in sorted(MIGRACOES):
+        if migracao_atual.versao in aplicadas or (ate is not None and migracao_atual.versao > ate):
+            continue
+        saida(f'Aplicando migração {migracao_atual.versao}: {migracao_atual.descricao}...')
+        try:
+            # Cada migração numa transação, junto com o registro da versão
+            migracao_atual.aplicar(db.session.connection())
+            db.session.add(VersaoSchema(versao=migracao_atual.versao, descricao=migracao_atual.descricao,
+                                        aplicada_em=datetime.now()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            # A árvore em cache pode ter sido lida de dentro da transação da migração
+            invalidar_categorias()
+        novas.append(migracao_atual.versao)
+    return novas
@@ -0,0 +1,34 @@
+"""
+Atualiza o schema de um banco existente aplicando as migrações pendentes
+(migracoes.py), sem precisar recriar o banco.
+
+Uso:
+    python migrar.py             # aplica todas as pendentes
+    python migrar.py --status    # só lista aplicadas e pendentes
+    python migrar.py --ate 2     # aplica até a versão 2
+"""
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aplica as migrações pendentes do schema.')
+    parser.add_argument('--status', action='store_true', help='só mostra o estado das migrações')
+    parser.add_argument('--ate', type=int, help='última versão a aplicar')
+    args = parser.parse_args()
+
+    from app import app
+    from migracoes import MIGRACOES, migrar, versoes_aplicadas
+
+    with app.app_context():
+        if args.status:
+            aplicadas = versoes_aplicadas()
+            for migracao in sorted(MIGRACOES):
+                marca = 'aplicada' if migracao.versao in aplicadas else 'PENDENTE'
+                print(f'{migracao.versao:>4}  {marca:<9} {migracao.descricao}')
+            return
+        novas = migrar(ate=args.ate)
+    print(f'{len(novas)} migração(ões) aplicada(s).' if novas else 'Schema já está atualizado.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,14 @@
 import os
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.sql import func
 from sqlalchemy.orm import foreign
+from senhas import gerar_hash, verificar_senha, precisa_rehash
+from replicas import SessaoRoteada
 
-db = SQLAlchemy()
+# A sessão manda as leituras das rotas marcadas para as réplicas, se houver (replicas.py)
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 # --- TABELA DE USUÁRIOS (Adaptada) ---
 class User(db.Model, UserMixin):
@@ -37,36 +40,52 @@ class User(db.Model, UserMixin):
             self.set_password(senha)
 
     def set_password(self, senha):
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = gerar_hash(senha)
 
     def check_password(self, senha):
-        return check_password_hash(self.senha_hash, senha)
+        return verificar_senha(self.senha_hash, senha)
+
+    def precisa_rehash(self):
+        return precisa_rehash(self.senha_hash)
 
 # --- TABELA DE PRODUTOS (Nova - Substitui Filme/Serie) ---
 class Produto(db.Model):
     __tablename__ = 'Produtos'
     id_produto = db.Column(db.Integer, primary_key=True, autoincrement=True)
     
-    id_vendedor = db.Column(db.Integer, db.ForeignKey('Usuarios.id_usuario'), nullable=False)
+    id_vendedor = db.Column(db.Integer, db.ForeignKey('Usuarios.id_usuario'), nullable=False, index=True)
     
-    nome = db.Column(db.String(200), nullable=False)
+    # Índices: ordenações do catálogo (nome, preço, recentes) e vitrines da Home (estoque)
+    nome = db.Column(db.String(200), nullable=False, index=True)
     descricao = db.Column(db.Text, nullable=False)
-    preco = db.Column(db.Numeric(10, 2), nullable=False)
-    estoque = db.Column(db.Integer, nullable=False, default=1)
+    preco = db.Column(db.Numeric(10, 2), nullable=False, index=True)
+    estoque = db.Column(db.Integer, nullable=False, default=1, index=True)
     
     # ========================================
     #               (CORRIGIDO)
     # Aumentado de 100 para 300 caracteres
     # ========================================
     categoria = db.Column(db.String(300), nullable=False) 
+    # Nó (folha) da árvore normalizada de categorias, mantido junto com `categoria`
+    id_categoria = db.Column(db.Integer, db.ForeignKey('Categorias.id_categoria'), nullable=True, index=True)
     
     url_imagem = db.Column(db.String(400), nullable=True)
-    data_cadastro = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    data_cadastro = db.Column(db.DateTime(timezone=True), default=datetime.now, server_default=func.now(), index=True)
     
     # Relações
     itens_pedido = db.relationship('ItensPedido', backref='produto', lazy=True) 
     itens_carrinho = db.relationship('ItemCarrinho', backref='produto', lazy=True, cascade="all, delete-orphan")
 
+# --- TABELA DE CATEGORIAS (Árvore normalizada a partir de Produto.categoria) ---
+class Categoria(db.Model):
+    __tablename__ = 'Categorias'
+    id_categoria = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id_pai = db.Column(db.Integer, db.ForeignKey('Categorias.id_categoria'), nullable=True, index=True)
+    nome = db.Column(db.String(100), nullable=False)
+    # Caminho completo normalizado, ex: 'Relógios de Luxo / Suíço'
+    caminho = db.Column(db.String(300), unique=True, nullable=False)
+    nivel = db.Column(db.Integer, nullable=False, default=0)
+
 # --- TABELA DE CUPONS (Nova - Requisito) ---
 class Cupom(db.Model):
     __tablename__ = 'Cupons'
@@ -80,9 +99,11 @@ class Cupom(db.Model):
 # --- TABELAS DE PEDIDOS (Novas - Requisito) ---
 class Pedido(db.Model):
     __tablename__ = 'Pedidos'
+    # Histórico do cliente (pedidos()): WHERE id_usuario ORDER BY data_pedido, id_pedido
+    __table_args__ = (db.Index('ix_Pedidos_usuario_data', 'id_usuario', 'data_pedido', 'id_pedido'),)
     id_pedido = db.Column(db.Integer, primary_key=True, autoincrement=True)
     id_usuario = db.Column(db.Integer, db.ForeignKey('Usuarios.id_usuario'), nullable=False)
-    data_pedido = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    data_pedido = db.Column(db.DateTime(timezone=True), default=datetime.now, server_default=func.now())
     # 'pendente', 'pago', 'enviado', 'concluido', 'cancelado', 'Devolução Solicitada'
     status = db.Column(db.String(20), nullable=False, default='pendente')
     valor_total = db.Column(db.Numeric(10, 2), nullable=False)
@@ -92,16 +113,79 @@ class Pedido(db.Model):
 class ItensPedido(db.Model):
     __tablename__ = 'ItensPedido'
     id_item_pedido = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    id_pedido = db.Column(db.Integer, db.ForeignKey('Pedidos.id_pedido'), nullable=False)
-    id_produto = db.Column(db.Integer, db.ForeignKey('Produtos.id_produto'), nullable=False)
+    id_pedido = db.Column(db.Integer, db.ForeignKey('Pedidos.id_pedido'), nullable=False, index=True)
+    id_produto = db.Column(db.Integer, db.ForeignKey('Produtos.id_produto'), nullable=False, index=True)
     quantidade = db.Column(db.Integer, nullable=False)
     preco_unitario = db.Column(db.Numeric(10, 2), nullable=False) 
 
 # --- TABELA DE CARRINHO (Nova - Substitui Favoritos) ---
 class ItemCarrinho(db.Model):
     __tablename__ = 'ItensCarrinho'
+    # Um item por produto no carrinho de cada usuário (add_carrinho soma a quantidade)
+    __table_args__ = (db.Index('ux_ItensCarrinho_usuario_produto', 'id_usuario', 'id_produto', unique=True),)
     id_item_carrinho = db.Column(db.Integer, primary_key=True, autoincrement=True)
     id_usuario = db.Column(db.Integer, db.ForeignKey('Usuarios.id_usuario'), nullable=False)
     id_produto = db.Column(db.Integer, db.ForeignKey('Produtos.id_produto'), nullable=False)
     quantidade = db.Column(db.Integer, nullable=False, default=1)
-    data_adicionado = db.Column(db.DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    data_adicionado = db.Column(db.DateTime(timezone=True), default=datetime.now, server_default=func.now())
+
+# --- CONTADORES DE VENDAS (Mantidos no checkout e nas devoluções) ---
+class VendasProduto(db.Model):
+    __tablename__ = 'VendasProdutos'
+    id_produto = db.Column(db.Integer, db.ForeignKey('Produtos.id_produto'), primary_key=True)
+    # Unidades vendidas (já descontadas as devoluções)
+    quantidade = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+class VendasProdutoDia(db.Model):
+    __tablename__ = 'VendasProdutosDia'
+    id_produto = db.Column(db.Integer, db.ForeignKey('Produtos.id_produto'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True, index=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+# --- RESUMO DE VENDAS (Relatórios: dia x vendedor x categoria) ---
+class VendasResumoDia(db.Model):
+    __tablename__ = 'VendasResumoDia'
+    dia = db.Column(db.Date, primary_key=True)
+    id_vendedor = db.Column(db.Integer, primary_key=True, index=True)
+    # 0 = produto sem categoria na árvore
+    id_categoria = db.Column(db.Integer, primary_key=True, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    receita_bruta = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    descontos = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    unidades_devolvidas = db.Column(db.Integer, nullable=False, default=0)
+    # Valor devolvido já com o desconto do pedido aplicado
+    valor_devolvido = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+# --- FILA DE TAREFAS (Trabalho adiado, executado pelo worker.py) ---
+class Tarefa(db.Model):
+    __tablename__ = 'Tarefas'
+    # O worker busca as pendentes cujo horário já chegou
+    __table_args__ = (db.Index('ix_Tarefas_status_executar_em', 'status', 'executar_em'),)
+    id_tarefa = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    dados = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    # 'pendente', 'executando', 'concluida', 'falhou'
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    iniciada_em = db.Column(db.DateTime, nullable=True)
+    concluida_em = db.Column(db.DateTime, nullable=True)
+    reserva = db.Column(db.String(32), nullable=True, index=True)  # lote do worker que pegou a tarefa
+    erro = db.Column(db.Text, nullable=True)
+
+class PedidoAplicado(db.Model):
+    # Pedidos já somados por cada efeito ('venda_contadores', 'devolucao_contadores',
+    # 'venda_resumo', 'devolucao_resumo'): uma tarefa repetida (ex: reservada de novo
+    # depois de abandonada, ou pendente durante um backfill) não soma duas vezes
+    __tablename__ = 'PedidosAplicados'
+    id_pedido = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    efeito = db.Column(db.String(20), primary_key=True)
+    aplicado_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+# --- VERSÃO DO SCHEMA (Migrações aplicadas, ver migracoes.py) ---
+class VersaoSchema(db.Model):
+    __tablename__ = 'VersaoSchema'
+    versao = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descricao = db.Column(db.String(200), nullable=False)
+    aplicada_em = db.Column(db.DateTime, default=datetime.now, nullable=False)
@@ -0,0 +1,138 @@
+import base64
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import and_, or_
+
+# --- PAGINAÇÃO POR CURSOR (KEYSET) ---
+# Em vez de OFFSET, cada página continua a partir dos valores de ordenação do
+# último item da página anterior. O custo por página fica constante,
+# independente de quantas páginas já foram percorridas.
+
+POR_PAGINA_PADRAO = 24
+POR_PAGINA_MAXIMO = 60
+
+
+class Pagina:
+    def __init__(self, itens, proximo_cursor=None):
+        self.itens = itens
+        self.proximo_cursor = proximo_cursor
+
+    @property
+    def tem_proxima(self):
+        return self.proximo_cursor is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+def limitar_por_pagina(valor, padrao=POR_PAGINA_PADRAO, maximo=POR_PAGINA_MAXIMO):
+    """Converte o parâmetro da URL num tamanho de página válido (1..maximo)."""
+    try:
+        por_pagina = int(valor)
+    except (TypeError, ValueError):
+        return padrao
+    return max(1, min(por_pagina, maximo))
+
+
+def _serializar(valor):
+    if isinstance(valor, Decimal):
+        return {'d': str(valor)}
+    if isinstance(valor, datetime):
+        return {'t': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'a': valor.isoformat()}
+    return valor
+
+
+def _desserializar(valor):
+    """Valor do cursor (só str, int, float ou as formas marcadas acima); ValueError se for outra coisa."""
+    if isinstance(valor, dict) and len(valor) == 1:
+        marca, texto = next(iter(valor.items()))
+        if isinstance(texto, str):
+            if marca == 'd':
+                numero = Decimal(texto)
+                if numero.is_finite():
+                    return numero
+            elif marca == 't':
+                return datetime.fromisoformat(texto)
+            elif marca == 'a':
+                return date.fromisoformat(texto)
+    elif isinstance(valor, str) or (isinstance(valor, int) and not isinstance(valor, bool)):
+        return valor
+    elif isinstance(valor, float) and math.isfinite(valor):
+        return valor
+    raise ValueError(f'Valor inválido no cursor: {valor!r}')
+
+
+def _compativel(coluna, valor):
+    """O valor do cursor serve para comparar com a coluna (ex: nada de texto numa coluna numérica)?"""
+    try:
+        esperado = coluna.type.python_type
+    except (AttributeError, NotImplementedError):
+        return True
+    if esperado in (int, float, Decimal):
+        return isinstance(valor, (int, float, Decimal)) and (esperado is not int or isinstance(valor, int))
+    return isinstance(valor, esperado)
+
+
+def codificar_cursor(valores):
+    dados = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna a lista de valores do cursor, ou None se o cursor for inválido."""
+    if not cursor:
+        return None
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(dados)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list):
+        return None
+    try:
+        return [_desserializar(v) for v in valores]
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+def _filtro_apos(colunas, valores, decrescente):
+    # (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ... -- sem comparação de tuplas,
+    # que o SQL Server não suporta.
+    condicoes = []
+    for i, coluna in enumerate(colunas):
+        iguais = [c == v for c, v in zip(colunas[:i], valores[:i])]
+        passo = coluna < valores[i] if decrescente else coluna > valores[i]
+        condicoes.append(and_(*iguais, passo))
+    return or_(*condicoes)
+
+
+def paginar_keyset(query, colunas, cursor=None, por_pagina=POR_PAGINA_PADRAO, decrescente=False,
+                   extrair=None):
+    """
+    Pagina `query` ordenando por `colunas` (a última deve ser única, ex: a PK).
+    Por padrão os valores do cursor são lidos dos atributos com o mesmo nome
+    das colunas; `extrair(item)` permite informá-los quando não for o caso.
+    """
+    valores = decodificar_cursor(cursor)
+    # Cursor inválido ou de outra ordenação: começa do início
+    if valores is not None and len(valores) == len(colunas) \
+            and all(_compativel(c, v) for c, v in zip(colunas, valores)):
+        query = query.filter(_filtro_apos(colunas, valores, decrescente))
+
+    ordem = [c.desc() if decrescente else c.asc() for c in colunas]
+    itens = query.order_by(*ordem).limit(por_pagina + 1).all()
+
+    proximo = None
+    if len(itens) > por_pagina:
+        itens = itens[:por_pagina]
+        ultimo = itens[-1]
+        valores = extrair(ultimo) if extrair else [getattr(ultimo, c.key) for c in colunas]
+        proximo = codificar_cursor(valores)
+    return Pagina(itens, proximo)
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+from functools import wraps
+from flask import request, session, make_response
+from flask_login import current_user
+from cache import CacheLRU
+from replicas import leitura_no_primario
+
+# --- CACHE DE PÁGINAS (VISITANTES ANÔNIMOS) ---
+# Páginas públicas (Home, catálogo, produto, cupons) são iguais para todo
+# visitante não logado. Cada página declara as "tags" de que depende
+# (ex: 'catalogo', 'produto:42'); editar um produto ou cupom incrementa a
+# versão das tags afetadas (invalidar_paginas), o que invalida o HTML guardado
+# no cache do servidor.
+# O ETag é o hash do HTML (não das versões, que são por processo e recomeçam
+# do zero num restart): o mesmo conteúdo tem o mesmo ETag em qualquer
+# processo, e navegadores e proxies recebem 304 enquanto nada mudou.
+# Requisições com usuário logado ou com mensagens flash pendentes não passam
+# pelo cache. Como as versões são por processo, o TTL limita o tempo que uma
+# edição feita em outro processo demora a aparecer.
+
+TTL_PAGINA = 300  # segundos
+CABECALHOS_GUARDADOS = ('Content-Type', 'X-Proxima-Pagina')
+
+_cache = CacheLRU(maximo=512, ttl=TTL_PAGINA)
+_lock = threading.Lock()
+_versoes = {}
+
+
+def invalidar_paginas(*tags):
+    """Marca como desatualizadas as páginas que dependem de `tags`."""
+    with _lock:
+        for tag in tags:
+            _versoes[tag] = _versoes.get(tag, 0) + 1
+
+
+def estatisticas_paginas():
+    return {
+        'itens': len(_cache),
+        'acertos': _cache.acertos,
+        'falhas': _cache.falhas,
+        'taxa_acerto': round(_cache.taxa_acerto, 4),
+    }
+
+
+def _pode_usar_cache():
+    return (
+        request.method in ('GET', 'HEAD')
+        and not current_user.is_authenticated
+        and not session.get('_flashes')
+    )
+
+
+def _chave():
+    argumentos = tuple(sorted(request.args.items(multi=True)))
+    return request.path, argumentos
+
+
+def pagina_em_cache(*tags):
+    """
+    Decorator para views públicas. As tags podem usar os argumentos da rota,
+    ex: @pagina_em_cache('produto:{id}').
+    """
+    def decorador(view):
+        @wraps(view)
+        def envolvida(**kwargs):
+            if not _pode_usar_cache():
+                return view(**kwargs)
+
+            tags_pagina = [tag.format(**kwargs) for tag in tags]
+            with _lock:
+                versoes = tuple(_versoes.get(tag, 0) for tag in tags_pagina)
+            chave = _chave()
+
+            registro = _cache.get(chave)
+            if registro is not None and registro['versoes'] == versoes:
+                resposta = make_response(registro['corpo'], 200, registro['cabecalhos'])
+                resposta.headers['X-Cache'] = 'HIT'
+                etag = registro['etag']
+            else:
+                # A página fica em cache para todos: renderiza lendo do primário
+                with leitura_no_primario():
+                    resposta = make_response(view(**kwargs))
+                etag = hashlib.sha1(resposta.get_data()).hexdigest()[:20] if resposta.status_code == 200 else None
+                # Só guarda respostas "limpas": sem cookie novo e sem flash criado na view
+                if resposta.status_code == 200 and 'Set-Cookie' not in resposta.headers \
+                        and not session.get('_flashes'):
+                    _cache.set(chave, {
+                        'versoes': versoes,
+                        'etag': etag,
+                        'corpo': resposta.get_data(),
+                        'cabecalhos': [(nome, resposta.headers[nome]) for nome in CABECALHOS_GUARDADOS
+                                       if nome in resposta.headers],
+                    })
+                resposta.headers['X-Cache'] = 'MISS'
+
+            if resposta.status_code == 200:
+                resposta.set_etag(etag)
+                # no-cache: o navegador pode guardar, mas revalida (e recebe 304)
+                resposta.cache_control.no_cache = True
+                resposta.vary.add('Cookie')
+                resposta = resposta.make_conditional(request)
+            return resposta
+        return envolvida
+    return decorador
@@ -0,0 +1,118 @@
+import itertools
+from collections import namedtuple
+from decimal import Decimal
+from flask import session
+from models import db, User, Produto, Cupom, ItemCarrinho
+from cache import CacheLRU
+
+# --- PRECIFICAÇÃO DO CARRINHO ---
+# Calcula subtotal, desconto e total do carrinho com uma única query (itens +
+# produto + vendedor) e, se houver cupom, mais uma. O resumo é guardado em
+# cache pela versão do carrinho, que fica na sessão do usuário e muda a cada
+# alteração (add/update/remove), valendo para todos os processos do servidor.
+
+LinhaCarrinho = namedtuple('LinhaCarrinho', [
+    'id_item_carrinho', 'id_produto', 'nome', 'preco', 'quantidade', 'estoque',
+    'url_imagem', 'id_categoria', 'vendedor_nome', 'total',
+])
+
+CupomAplicado = namedtuple('CupomAplicado', ['codigo', 'tipo', 'valor'])
+
+
+class ResumoCarrinho:
+    def __init__(self, linhas, cupom=None, cupom_invalido=False):
+        self.linhas = linhas
+        self.cupom = cupom
+        self.cupom_invalido = cupom_invalido
+        self.subtotal = sum((linha.total for linha in linhas), Decimal('0.00'))
+        self.desconto = calcular_desconto(self.subtotal, cupom)
+        self.total = self.subtotal - self.desconto
+
+    def __bool__(self):
+        return bool(self.linhas)
+
+    def linha(self, id_item_carrinho):
+        for linha in self.linhas:
+            if linha.id_item_carrinho == id_item_carrinho:
+                return linha
+        return None
+
+
+def calcular_desconto(subtotal, cupom):
+    desconto = Decimal('0.00')
+    if cupom:
+        if cupom.tipo == 'porcentagem':
+            desconto = (subtotal * cupom.valor) / 100
+        elif cupom.tipo == 'fixo':
+            desconto = cupom.valor
+        desconto = min(desconto, subtotal)
+    return desconto
+
+
+# Versões globais do processo: mudam quando preços/estoques ou cupons mudam
+_versao_precos = itertools.count()
+_versao_cupons = itertools.count()
+_versoes = {'precos': next(_versao_precos), 'cupons': next(_versao_cupons)}
+
+# TTL curto: limita o tempo que uma edição feita em outro processo fica invisível
+TTL_CARRINHO = 60
+_cache = CacheLRU(maximo=4096, ttl=TTL_CARRINHO)
+
+# Versão por usuário; com o mesmo TTL do cache, quando ela expira os resumos
+# gravados com versões anteriores também já expiraram
+_versao_usuario = itertools.count(1)
+_versoes_usuario = CacheLRU(maximo=16384, ttl=TTL_CARRINHO)
+
+
+def invalidar_carrinho(id_usuario):
+    """Chamado pelas rotas que alteram o carrinho do usuário atual."""
+    session['versao_carrinho'] = session.get('versao_carrinho', 0) + 1
+    # Cobre outros dispositivos do mesmo usuário atendidos por este processo
+    _versoes_usuario.set(id_usuario, next(_versao_usuario))
+
+
+def invalidar_precos():
+    _versoes['precos'] = next(_versao_precos)
+
+
+def invalidar_cupons():
+    _versoes['cupons'] = next(_versao_cupons)
+
+
+def _carregar_linhas(id_usuario):
+    linhas = db.session.query(
+        ItemCarrinho.id_item_carrinho, ItemCarrinho.id_produto, Produto.nome, Produto.preco,
+        ItemCarrinho.quantidade, Produto.estoque, Produto.url_imagem, Produto.id_categoria,
+        User.nome
+    ).join(
+        Produto, Produto.id_produto == ItemCarrinho.id_produto
+    ).join(
+        User, User.id_usuario == Produto.id_vendedor
+    ).filter(
+        ItemCarrinho.id_usuario == id_usuario
+    ).order_by(ItemCarrinho.id_item_carrinho).all()
+
+    return [LinhaCarrinho(*linha, total=linha[3] * linha[4]) for linha in linhas]
+
+
+def _carregar_cupom(codigo):
+    cupom = db.session.query(Cupom.codigo, Cupom.tipo, Cupom.valor).filter(
+        Cupom.codigo == codigo, Cupom.ativo == True
+    ).first()
+    return CupomAplicado(*cupom) if cupom else None
+
+
+def resumo_carrinho(id_usuario, codigo_cupom=None, usar_cache=True):
+    """Resumo do carrinho de `id_usuario` com o cupom `codigo_cupom` aplicado."""
+    chave = (id_usuario, session.get('versao_carrinho', 0), _versoes_usuario.get(id_usuario, 0),
+             codigo_cupom, _versoes['precos'], _versoes['cupons'])
+    if usar_cache:
+        resumo = _cache.get(chave)
+        if resumo is not None:
+            return resumo
+
+    cupom = _carregar_cupom(codigo_cupom) if codigo_cupom else None
+    resumo = ResumoCarrinho(_carregar_linhas(id_usuario), cupom,
+                            cupom_invalido=bool(codigo_cupom) and cupom is None)
+    _cache.set(chave, resumo)
+    return resumo
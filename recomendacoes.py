@@ -0,0 +1,262 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from models import db, Produto, Pedido, ItensPedido
+from categorias import obter_arvore
+from vitrines import STATUS_DEVOLVIDOS
+
+# --- RECOMENDAÇÕES "QUEM COMPROU TAMBÉM COMPROU" ---
+# Modelo item-a-item construído a partir do histórico de pedidos: conta em
+# quantos pedidos cada par de produtos aparece junto (co-ocorrência) e guarda,
+# para cada produto, os K vizinhos mais parecidos pela similaridade do
+# cosseno (co-ocorrências / raiz(pedidos de A * pedidos de B)).
+#
+# A construção é vetorizada com NumPy e roda numa thread em segundo plano (no
+# primeiro uso e a cada TTL_MODELO): as requisições continuam usando o modelo
+# anterior e trocam de referência quando o novo fica pronto. Depois, cada
+# pedido finalizado só atualiza as contagens dos seus produtos
+# (registrar_cesta); os pedidos registrados durante uma construção que ela
+# não chegou a ler são reaplicados no modelo novo antes da troca. O carrinho e a página do produto apenas consultam a
+# tabela de vizinhos em memória; a categoria é usada quando o produto ainda
+# não tem histórico (e para todos, enquanto o primeiro modelo é construído).
+
+TOP_K = 20
+MAX_CESTA = 50  # pedidos muito grandes pouco dizem sobre afinidade (e geram N² pares)
+TTL_MODELO = 6 * 3600  # reconstrução completa periódica (corrige o desvio do incremental)
+LOTE_LEITURA = 10000  # linhas de ItensPedido lidas por vez na construção
+
+logger = logging.getLogger(__name__)
+
+
+class ModeloRecomendacao:
+    def __init__(self, ocorrencias=None, coocorrencias=None, vizinhos=None):
+        self.ocorrencias = ocorrencias or Counter()
+        self.coocorrencias = coocorrencias or defaultdict(Counter)
+        self.vizinhos = vizinhos or {}
+        self._lock = threading.Lock()
+
+    def _similaridade(self, a, b, juntos):
+        return juntos / math.sqrt(self.ocorrencias[a] * self.ocorrencias[b])
+
+    def _recalcular_vizinhos(self, a):
+        melhores = heapq.nlargest(
+            TOP_K,
+            ((b, self._similaridade(a, b, juntos)) for b, juntos in self.coocorrencias[a].items()),
+            key=lambda par: par[1],
+        )
+        self.vizinhos[a] = melhores
+
+    def registrar_cesta(self, ids_produtos):
+        """Atualização incremental com os produtos de um pedido recém-finalizado."""
+        cesta = set(ids_produtos)
+        if len(cesta) > MAX_CESTA:
+            return
+        with self._lock:
+            for a in cesta:
+                self.ocorrencias[a] += 1
+            if len(cesta) < 2:
+                return
+            for a in cesta:
+                for b in cesta:
+                    if a != b:
+                        self.coocorrencias[a][b] += 1
+            for a in cesta:
+                self._recalcular_vizinhos(a)
+
+    def vizinhos_de(self, id_produto):
+        return self.vizinhos.get(id_produto, [])
+
+
+def _pares_por_pedido(pedidos, itens):
+    """
+    Recebe (pedido, item) ordenados por pedido e sem repetição; devolve dois
+    vetores (a, b) com todos os pares a != b de itens do mesmo pedido.
+    """
+    inicio_grupo = np.flatnonzero(np.r_[True, pedidos[1:] != pedidos[:-1]])
+    tamanho_grupo = np.diff(np.r_[inicio_grupo, len(pedidos)])
+
+    # Para cada elemento: início e tamanho do seu pedido
+    tamanho = np.repeat(tamanho_grupo, tamanho_grupo)
+    inicio = np.repeat(inicio_grupo, tamanho_grupo)
+
+    usar = (tamanho > 1) & (tamanho <= MAX_CESTA)
+    tamanho, inicio, itens_usados = tamanho[usar], inicio[usar], itens[usar]
+
+    # Cada elemento se repete `tamanho` vezes, pareando com todos do pedido
+    a = np.repeat(itens_usados, tamanho)
+    inicio_bloco = np.repeat(np.cumsum(tamanho) - tamanho, tamanho)
+    posicao = np.repeat(inicio, tamanho) + (np.arange(len(a)) - inicio_bloco)
+    b = itens[posicao]
+
+    diferentes = a != b
+    return a[diferentes], b[diferentes]
+
+
+def construir_modelo():
+    """Job em lote: lê ItensPedido e calcula a tabela de vizinhos."""
+    consulta = select(ItensPedido.id_pedido, ItensPedido.id_produto).join(
+        Pedido, Pedido.id_pedido == ItensPedido.id_pedido
+    ).where(
+        Pedido.status.notin_(STATUS_DEVOLVIDOS)
+    )
+    # Cada lote vira um array (int64) na hora, sem uma lista de tuplas do histórico inteiro
+    blocos = [np.array(lote, dtype=np.int64).reshape(-1, 2) for lote in
+              db.session.execute(consulta, execution_options={'yield_per': LOTE_LEITURA}).partitions()]
+    dados = np.concatenate(blocos) if blocos else np.empty((0, 2), dtype=np.int64)
+    if not len(dados):
+        return ModeloRecomendacao()
+
+    # IDs de produto -> índices densos 0..n-1
+    ids_produtos, itens = np.unique(dados[:, 1], return_inverse=True)
+    n = len(ids_produtos)
+
+    # Um par (pedido, item) por linha, ordenado por pedido
+    codigos = np.unique(dados[:, 0] * n + itens)
+    pedidos, itens = codigos // n, codigos % n
+
+    ocorrencias_vet = np.bincount(itens, minlength=n)
+
+    a, b = _pares_por_pedido(pedidos, itens)
+    pares, juntos = np.unique(a * n + b, return_counts=True)
+    a, b = pares // n, pares % n
+    similaridade = juntos / np.sqrt(ocorrencias_vet[a] * ocorrencias_vet[b])
+
+    # Top-K por produto: ordena por (a, similaridade desc) e corta cada grupo
+    ordem = np.lexsort((-similaridade, a))
+    a, b, juntos, similaridade = a[ordem], b[ordem], juntos[ordem], similaridade[ordem]
+    inicio_grupo = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+    tamanho_grupo = np.diff(np.r_[inicio_grupo, len(a)])
+    posicao = np.arange(len(a)) - np.repeat(inicio_grupo, tamanho_grupo)
+    topo = posicao < TOP_K
+
+    ocorrencias = Counter(dict(zip(ids_produtos.tolist(), ocorrencias_vet.tolist())))
+    coocorrencias = defaultdict(Counter)
+    for x, y, total in zip(ids_produtos[a].tolist(), ids_produtos[b].tolist(), juntos.tolist()):
+        coocorrencias[x][y] = total
+
+    vizinhos = defaultdict(list)
+    for x, y, nota in zip(ids_produtos[a[topo]].tolist(), ids_produtos[b[topo]].tolist(),
+                          similaridade[topo].tolist()):
+        vizinhos[x].append((y, nota))
+
+    modelo = ModeloRecomendacao(ocorrencias, coocorrencias, dict(vizinhos))
+    modelo.pedidos_lidos = np.unique(dados[:, 0])
+    return modelo
+
+
+_lock = threading.Lock()
+_modelo = None
+_proxima_construcao = 0.0  # time.monotonic() a partir do qual o modelo é reconstruído
+_construindo = False
+_pendentes = None  # [(id_pedido, ids_produtos)] registrados durante a construção
+_VAZIO = ModeloRecomendacao()
+
+
+def _construir_em_segundo_plano(app):
+    global _modelo, _construindo, _pendentes
+    try:
+        with app.app_context():
+            # Fora de requisição: a sessão lê do primário (replicas.py)
+            modelo = construir_modelo()
+        lidos = getattr(modelo, 'pedidos_lidos', None)
+        modelo.pedidos_lidos = None
+        with _lock:
+            # Pedidos fechados durante a construção que a leitura não pegou
+            for id_pedido, ids_produtos in _pendentes:
+                if lidos is None or id_pedido is None or not np.isin(id_pedido, lidos):
+                    modelo.registrar_cesta(ids_produtos)
+            _modelo = modelo
+    except Exception:
+        # Continua com o modelo anterior; tenta de novo no próximo TTL
+        logger.exception('Falha ao construir o modelo de recomendações')
+    finally:
+        with _lock:
+            _pendentes = None
+            _construindo = False
+
+
+def obter_modelo():
+    """
+    Modelo do processo. No primeiro uso e a cada TTL_MODELO dispara a
+    reconstrução em segundo plano e devolve o modelo atual (vazio até o
+    primeiro ficar pronto).
+    """
+    global _construindo, _proxima_construcao, _pendentes
+    with _lock:
+        if not _construindo and time.monotonic() >= _proxima_construcao:
+            _construindo = True
+            _pendentes = []
+            _proxima_construcao = time.monotonic() + TTL_MODELO
+            threading.Thread(target=_construir_em_segundo_plano, args=(current_app._get_current_object(),),
+                             name='modelo-recomendacoes', daemon=True).start()
+        return _modelo or _VAZIO
+
+
+def registrar_cesta(ids_produtos, id_pedido=None):
+    """Chamado após o commit de um pedido."""
+    with _lock:
+        if _pendentes is not None:
+            _pendentes.append((id_pedido, list(ids_produtos)))
+        modelo = _modelo
+    if modelo is not None:
+        modelo.registrar_cesta(ids_produtos)
+
+
+def _ids_por_categoria(ids_base, excluir, limite):
+    # Partida a frio: produtos da mesma categoria principal
+    arvore = obter_arvore()
+    id_categorias = db.session.query(Produto.id_categoria).filter(
+        Produto.id_produto.in_(ids_base)
+    ).distinct().all()
+    categorias = set()
+    for (id_categoria,) in id_categorias:
+        raiz = arvore.raiz_de(id_categoria)
+        if raiz:
+            categorias.update(raiz.ids_subarvore)
+    if not categorias:
+        return []
+    return [row[0] for row in db.session.query(Produto.id_produto).filter(
+        Produto.id_categoria.in_(categorias),
+        Produto.id_produto.notin_(excluir)
+    ).order_by(Produto.data_cadastro.desc()).limit(limite).all()]
+
+
+def recomendar_produtos(ids_base, limite=4):
+    """
+    Produtos para recomendar junto de `ids_base` (itens do carrinho ou o
+    produto aberto), sem repetir os próprios `ids_base`.
+    """
+    ids_base = list(dict.fromkeys(ids_base))
+    if not ids_base:
+        return []
+
+    modelo = obter_modelo()
+    notas = Counter()
+    sem_historico = []
+    for id_produto in ids_base:
+        vizinhos = modelo.vizinhos_de(id_produto)
+        if not vizinhos:
+            sem_historico.append(id_produto)
+        for vizinho, nota in vizinhos:
+            notas[vizinho] += nota
+    for id_produto in ids_base:
+        notas.pop(id_produto, None)
+
+    escolhidos = [id_produto for id_produto, _ in notas.most_common(limite)]
+    if len(escolhidos) < limite and sem_historico:
+        escolhidos += _ids_por_categoria(sem_historico, ids_base + escolhidos, limite - len(escolhidos))
+    if not escolhidos:
+        return []
+
+    produtos = {
+        p.id_produto: p for p in Produto.query.options(joinedload(Produto.vendedor))
+        .filter(Produto.id_produto.in_(escolhidos)).all()
+    }
+    return [produtos[i] for i in escolhidos if i in produtos]
@@ -0,0 +1,221 @@
+import itertools
+from collections import defaultdict
+from datetime import datetime, time as hora
+from decimal import Decimal
+from sqlalchemy import insert, update, func
+from models import db, User, Produto, Pedido, ItensPedido, Categoria, VendasResumoDia
+from vitrines import STATUS_DEVOLVIDOS, marcar_aplicados
+
+# --- RELATÓRIOS DE VENDAS (Resumo por dia x vendedor x categoria) ---
+# Os relatórios leem só a tabela VendasResumoDia em vez de varrer
+# Pedidos/ItensPedido. O resumo é atualizado pelo worker (tarefas
+# 'vendas_pedido' e 'devolucao_pedido', enfileiradas na transação do checkout
+# e da devolução), então um pedido entra nos relatórios alguns segundos depois,
+# assim que o worker processa a fila.
+# O desconto do cupom é rateado entre os itens do pedido proporcionalmente ao
+# valor de cada um. Devoluções entram no dia do pedido (não há data de
+# devolução gravada), assim o backfill reproduz exatamente os mesmos números.
+
+CENTAVOS = Decimal('0.01')
+AGRUPAMENTOS = ('dia', 'vendedor', 'categoria')
+SEM_CATEGORIA = 0
+
+
+def _grupos_do_pedido(itens, valor_total):
+    """
+    `itens`: [(id_vendedor, id_categoria, quantidade, preco_unitario), ...].
+    Retorna {(id_vendedor, id_categoria): [unidades, bruto, desconto]}.
+    """
+    brutos = [Decimal(preco) * quantidade for _, _, quantidade, preco in itens]
+    subtotal = sum(brutos, Decimal('0.00'))
+    desconto_total = max(subtotal - Decimal(valor_total), Decimal('0.00')) if subtotal else Decimal('0.00')
+
+    grupos = defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.00')])
+    restante = desconto_total
+    for i, ((id_vendedor, id_categoria, quantidade, _), bruto) in enumerate(zip(itens, brutos)):
+        if i == len(itens) - 1:
+            desconto = restante  # o último item fica com a sobra do arredondamento
+        else:
+            desconto = (desconto_total * bruto / subtotal).quantize(CENTAVOS)
+            restante -= desconto
+        grupo = grupos[(id_vendedor, id_categoria or SEM_CATEGORIA)]
+        grupo[0] += quantidade
+        grupo[1] += bruto
+        grupo[2] += desconto
+    return grupos
+
+
+def _itens_do_pedido(id_pedido):
+    return db.session.query(
+        Produto.id_vendedor, Produto.id_categoria, ItensPedido.quantidade, ItensPedido.preco_unitario
+    ).join(
+        Produto, Produto.id_produto == ItensPedido.id_produto
+    ).filter(
+        ItensPedido.id_pedido == id_pedido
+    ).order_by(ItensPedido.id_item_pedido).all()
+
+
+def _somar(chave, **valores):
+    filtros = [getattr(VendasResumoDia, coluna) == valor for coluna, valor in chave.items()]
+    resultado = db.session.execute(
+        update(VendasResumoDia).where(*filtros).values(**{
+            coluna: getattr(VendasResumoDia, coluna) + valor for coluna, valor in valores.items()
+        })
+    )
+    if resultado.rowcount == 0:
+        db.session.add(VendasResumoDia(**chave, **valores))
+
+
+def resumir_venda(pedido):
+    """
+    Soma um pedido recém-criado (itens já gravados) ao resumo.
+    Não faz commit: roda na tarefa 'vendas_pedido' do worker, na mesma
+    transação que conclui a tarefa.
+    """
+    dia = pedido.data_pedido.date()
+    for (id_vendedor, id_categoria), (unidades, bruto, desconto) in \
+            _grupos_do_pedido(_itens_do_pedido(pedido.id_pedido), pedido.valor_total).items():
+        _somar({'dia': dia, 'id_vendedor': id_vendedor, 'id_categoria': id_categoria},
+               unidades=unidades, receita_bruta=bruto, descontos=desconto)
+
+
+def resumir_devolucao(pedido):
+    """Registra no resumo a devolução de `pedido` (sem commit)."""
+    dia = pedido.data_pedido.date()
+    for (id_vendedor, id_categoria), (unidades, bruto, desconto) in \
+            _grupos_do_pedido(_itens_do_pedido(pedido.id_pedido), pedido.valor_total).items():
+        _somar({'dia': dia, 'id_vendedor': id_vendedor, 'id_categoria': id_categoria},
+               unidades_devolvidas=unidades, valor_devolvido=bruto - desconto)
+
+
+def recalcular_resumos(inicio=None, fim=None):
+    """
+    Reconstrói o resumo a partir do histórico (backfill), opcionalmente só
+    para os dias entre `inicio` e `fim` (datas, inclusive). Os itens são lidos
+    em blocos, ordenados por pedido, sem carregar o histórico em memória.
+    """
+    # Só os pedidos que já existem agora: os que chegarem durante o backfill ficam para as tarefas
+    ultimo = db.session.query(func.max(Pedido.id_pedido)).scalar() or 0
+    filtros = [Pedido.id_pedido <= ultimo]
+    query = db.session.query(
+        ItensPedido.id_pedido, Pedido.data_pedido, Pedido.valor_total, Pedido.status,
+        Produto.id_vendedor, Produto.id_categoria, ItensPedido.quantidade, ItensPedido.preco_unitario
+    ).join(
+        Pedido, Pedido.id_pedido == ItensPedido.id_pedido
+    ).join(
+        Produto, Produto.id_produto == ItensPedido.id_produto
+    )
+    apagar = VendasResumoDia.query
+    if inicio:
+        filtros.append(Pedido.data_pedido >= datetime.combine(inicio, hora.min))
+        apagar = apagar.filter(VendasResumoDia.dia >= inicio)
+    if fim:
+        filtros.append(Pedido.data_pedido <= datetime.combine(fim, hora.max))
+        apagar = apagar.filter(VendasResumoDia.dia <= fim)
+    query = query.filter(*filtros)
+
+    resumo = defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.00'), 0, Decimal('0.00')])
+    linhas = query.order_by(ItensPedido.id_pedido, ItensPedido.id_item_pedido).yield_per(5000)
+    for _, itens in itertools.groupby(linhas, key=lambda linha: linha.id_pedido):
+        itens = list(itens)
+        primeiro = itens[0]
+        dia = primeiro.data_pedido.date()
+        devolvido = primeiro.status in STATUS_DEVOLVIDOS
+        grupos = _grupos_do_pedido([linha[4:] for linha in itens], primeiro.valor_total)
+        for (id_vendedor, id_categoria), (unidades, bruto, desconto) in grupos.items():
+            totais = resumo[(dia, id_vendedor, id_categoria)]
+            totais[0] += unidades
+            totais[1] += bruto
+            totais[2] += desconto
+            if devolvido:
+                totais[3] += unidades
+                totais[4] += bruto - desconto
+
+    apagar.delete(synchronize_session=False)
+    if resumo:
+        db.session.execute(insert(VendasResumoDia), [
+            {'dia': dia, 'id_vendedor': id_vendedor, 'id_categoria': id_categoria, 'unidades': unidades,
+             'receita_bruta': bruto, 'descontos': desconto, 'unidades_devolvidas': devolvidas,
+             'valor_devolvido': valor_devolvido}
+            for (dia, id_vendedor, id_categoria), (unidades, bruto, desconto, devolvidas, valor_devolvido)
+            in resumo.items()
+        ])
+    marcar_aplicados('venda_resumo', *filtros)
+    marcar_aplicados('devolucao_resumo', *filtros, Pedido.status.in_(STATUS_DEVOLVIDOS))
+    db.session.commit()
+    return len(resumo)
+
+
+# --- CONSULTAS (só sobre o resumo) ---
+
+def _somas():
+    return (
+        func.coalesce(func.sum(VendasResumoDia.unidades), 0).label('unidades'),
+        func.coalesce(func.sum(VendasResumoDia.receita_bruta), 0).label('receita_bruta'),
+        func.coalesce(func.sum(VendasResumoDia.descontos), 0).label('descontos'),
+        func.coalesce(func.sum(VendasResumoDia.unidades_devolvidas), 0).label('unidades_devolvidas'),
+        func.coalesce(func.sum(VendasResumoDia.valor_devolvido), 0).label('valor_devolvido'),
+    )
+
+
+def _como_dict(linha, **extra):
+    receita_bruta = Decimal(linha.receita_bruta)
+    descontos = Decimal(linha.descontos)
+    valor_devolvido = Decimal(linha.valor_devolvido)
+    return dict(
+        extra,
+        unidades=int(linha.unidades),
+        receita_bruta=receita_bruta,
+        descontos=descontos,
+        unidades_devolvidas=int(linha.unidades_devolvidas),
+        valor_devolvido=valor_devolvido,
+        receita_liquida=receita_bruta - descontos - valor_devolvido,
+    )
+
+
+def relatorio_vendas(inicio, fim, agrupar='dia', id_vendedor=None):
+    """
+    Totais do período [inicio, fim] e uma linha por dia, vendedor ou categoria.
+    Retorna {'totais': {...}, 'linhas': [{'chave', 'rotulo', ...}, ...]}.
+    """
+    if agrupar not in AGRUPAMENTOS:
+        raise ValueError(f'Agrupamento inválido: {agrupar}')
+
+    filtros = [VendasResumoDia.dia >= inicio, VendasResumoDia.dia <= fim]
+    if id_vendedor is not None:
+        filtros.append(VendasResumoDia.id_vendedor == id_vendedor)
+
+    totais = db.session.query(*_somas()).filter(*filtros).one()
+
+    coluna = {
+        'dia': VendasResumoDia.dia,
+        'vendedor': VendasResumoDia.id_vendedor,
+        'categoria': VendasResumoDia.id_categoria,
+    }[agrupar]
+    query = db.session.query(coluna.label('chave'), *_somas()).filter(*filtros).group_by(coluna)
+    if agrupar == 'dia':
+        query = query.order_by(coluna)
+    else:
+        query = query.order_by(func.sum(VendasResumoDia.receita_bruta).desc())
+    linhas = query.all()
+
+    # Nomes das dimensões numa query só (tabelas pequenas)
+    chaves = [linha.chave for linha in linhas]
+    rotulos = {}
+    if agrupar == 'vendedor' and chaves:
+        rotulos = dict(db.session.query(User.id_usuario, User.nome).filter(User.id_usuario.in_(chaves)))
+    elif agrupar == 'categoria' and chaves:
+        rotulos = dict(db.session.query(Categoria.id_categoria, Categoria.caminho)
+                       .filter(Categoria.id_categoria.in_(chaves)))
+
+    def rotulo(chave):
+        if agrupar == 'dia':
+            return chave.strftime('%d/%m/%Y')
+        if agrupar == 'categoria' and chave == SEM_CATEGORIA:
+            return 'Sem categoria'
+        return rotulos.get(chave, f'#{chave} (removido)')
+
+    return {
+        'totais': _como_dict(totais),
+        'linhas': [_como_dict(linha, chave=linha.chave, rotulo=rotulo(linha.chave)) for linha in linhas],
+    }
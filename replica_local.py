@@ -0,0 +1,61 @@
+"""
+Réplica de leitura local para desenvolvimento: copia periodicamente um banco
+SQLite (primário) para outro arquivo (réplica) com a API de backup do
+SQLite, simulando uma réplica assíncrona com atraso de --intervalo segundos.
+
+Com o app apontando para os dois arquivos dá para ver o roteamento de
+leituras, o read-your-writes depois de um checkout e o fallback quando a
+réplica some (apague o arquivo da réplica com o app rodando).
+
+Uso:
+    python replica_local.py --primario instance/midnight.db --replica instance/midnight_replica.db
+    DATABASE_URL=sqlite:///$PWD/instance/midnight.db \\
+    DATABASE_REPLICA_URLS=sqlite:///$PWD/instance/midnight_replica.db python app.py
+    python replica_local.py --primario instance/midnight.db --replica instance/midnight_replica.db --uma-vez
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+
+def copiar(primario, replica):
+    """Copia o primário inteiro para a réplica (conexões abertas na réplica passam a ver a cópia nova)."""
+    origem = sqlite3.connect(f'file:{primario}?mode=ro', uri=True)
+    destino = sqlite3.connect(replica)
+    try:
+        # O backup grava na réplica com o lock do próprio SQLite: quem está
+        # lendo vê a cópia antiga ou a nova inteira
+        origem.backup(destino)
+    finally:
+        destino.close()
+        origem.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simula uma réplica de leitura com dois arquivos SQLite.')
+    parser.add_argument('--primario', required=True, help='arquivo SQLite do primário')
+    parser.add_argument('--replica', required=True, help='arquivo SQLite da réplica (sobrescrito)')
+    parser.add_argument('--intervalo', type=float, default=5.0, help='segundos entre cópias (atraso da réplica)')
+    parser.add_argument('--uma-vez', action='store_true', help='copia uma vez e sai')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.primario):
+        print(f'Primário não encontrado: {args.primario}')
+        return 2
+
+    while True:
+        inicio = time.perf_counter()
+        copiar(args.primario, args.replica)
+        print(f'Réplica atualizada em {(time.perf_counter() - inicio) * 1000:.0f} ms')
+        if args.uma_vez:
+            return 0
+        try:
+            time.sleep(args.intervalo)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+# --- RÉPLICAS DE LEITURA ---
+# Com DATABASE_REPLICA_URLS definido, cada URL vira um bind 'replica1',
+# 'replica2'... e a sessão (SessaoRoteada) manda para uma réplica os SELECTs
+# das rotas marcadas com @ler_de_replica (Home, catálogo, busca, produto,
+# histórico de pedidos, API). Todo o resto (POSTs, escritas, rotas não
+# marcadas, worker, scripts) continua no primário.
+#
+# Read-your-writes: uma requisição que grava algo marca na sessão do usuário
+# (cookie) que, pelos próximos JANELA_PRIMARIO segundos, as leituras dele vão
+# para o primário. Assim o pedido recém-finalizado aparece em /pedidos mesmo
+# que a réplica ainda não o tenha recebido.
+#
+# Caches compartilhados do processo (árvore de categorias, vitrines, índices
+# de busca, páginas em cache...) são montados com leitura_no_primario(): eles
+# vivem além da requisição e não podem guardar um dado atrasado da réplica.
+#
+# Saúde: um erro de conexão numa réplica a tira de rodízio e a requisição em
+# andamento é refeita no primário; uma thread testa a réplica a cada
+# INTERVALO_VERIFICACAO segundos até ela voltar.
+
+PREFIXO_BIND = 'replica'
+JANELA_PRIMARIO = 10  # segundos lendo do primário depois de uma escrita
+INTERVALO_VERIFICACAO = 15  # segundos entre testes de uma réplica fora do ar
+METODOS_LEITURA = ('GET', 'HEAD')
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    def __init__(self, chave, engine):
+        self.chave = chave
+        self.engine = engine
+        self.saudavel = True
+        self.falhas = 0
+        self.verificando = False
+        self.proxima_verificacao = 0.0
+
+
+_replicas = []
+_rodizio = itertools.count()
+_lock = threading.Lock()
+_consultas = {}  # destino ('primario' ou chave da réplica) -> SELECTs roteados
+
+
+def configurar_replicas(app, urls):
+    """Adiciona um bind por URL de réplica (separadas por vírgula). Chamar antes de db.init_app."""
+    urls = [url.strip() for url in (urls or '').split(',') if url.strip()]
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for numero, url in enumerate(urls, start=1):
+        binds[f'{PREFIXO_BIND}{numero}'] = url
+
+
+def iniciar_replicas(app, db):
+    with app.app_context():
+        for chave, engine in db.engines.items():
+            if chave and chave.startswith(PREFIXO_BIND):
+                replica = Replica(chave, engine)
+                sa.event.listen(engine, 'handle_error', _ao_falhar(replica))
+                _replicas.append(replica)
+    if _replicas:
+        app.before_request(_escolher_replica)
+        app.after_request(_lembrar_escrita)
+
+
+# --- Roteamento ---
+
+def ler_de_replica(view):
+    """Marca a view como somente leitura: os SELECTs de GET/HEAD podem ir para uma réplica."""
+    @wraps(view)
+    def envolvida(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except sa.exc.DBAPIError:
+            if not g.pop('falha_replica', False):
+                raise
+            # A réplica caiu no meio da requisição: refaz tudo no primário
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.replica = None
+            return view(*args, **kwargs)
+    envolvida.ler_de_replica = True
+    return envolvida
+
+
+def _escolher_replica():
+    g.replica = None
+    if request.method not in METODOS_LEITURA:
+        return
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, 'ler_de_replica', False):
+        return
+    if session.get('primario_ate', 0) > time.time():
+        return
+    g.replica = _proxima_replica()
+
+
+def _proxima_replica():
+    agora = time.monotonic()
+    with _lock:
+        for replica in _replicas:
+            if not replica.saudavel and not replica.verificando and agora >= replica.proxima_verificacao:
+                replica.verificando = True
+                threading.Thread(target=_verificar, args=(replica,), daemon=True).start()
+        saudaveis = [replica for replica in _replicas if replica.saudavel]
+    if not saudaveis:
+        return None
+    return saudaveis[next(_rodizio) % len(saudaveis)]
+
+
+def _lembrar_escrita(resposta):
+    if g.get('escreveu'):
+        session['primario_ate'] = time.time() + JANELA_PRIMARIO
+    return resposta
+
+
+@contextmanager
+def leitura_no_primario():
+    """Dentro do bloco, as leituras vão para o primário (cache que dura além da requisição)."""
+    if not has_request_context() or g.get('replica') is None:
+        yield
+        return
+    replica, g.replica = g.replica, None
+    try:
+        yield
+    finally:
+        if not g.get('escreveu'):
+            g.replica = replica
+
+
+def _contar(destino):
+    _consultas[destino] = _consultas.get(destino, 0) + 1
+
+
+class SessaoRoteada(Session):
+    """Sessão do Flask-SQLAlchemy que envia os SELECTs das rotas de leitura para uma réplica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if not _replicas or bind is not None or not has_request_context():
+            return engine
+
+        # Alterações pendentes já foram gravadas pelo autoflush antes de chegar aqui
+        if self._flushing or isinstance(clause, sa.sql.dml.UpdateBase):
+            # Escrita: daqui em diante esta requisição (e o usuário, por um tempo) lê do primário
+            g.escreveu = True
+            g.replica = None
+            return engine
+
+        replica = g.get('replica')
+        if replica is None or not isinstance(clause, sa.sql.Select) or engine is not self._db.engines[None]:
+            _contar('primario')
+            return engine
+        _contar(replica.chave)
+        return replica.engine
+
+
+# --- Saúde ---
+
+def _ao_falhar(replica):
+    def tratar(contexto):
+        if contexto.is_disconnect or isinstance(contexto.sqlalchemy_exception, sa.exc.OperationalError):
+            _marcar_fora(replica, contexto.original_exception)
+            if has_request_context():
+                g.falha_replica = True
+    return tratar
+
+
+def _marcar_fora(replica, erro):
+    with _lock:
+        if replica.saudavel:
+            logger.warning('Réplica %s fora do rodízio: %s', replica.chave, erro)
+        replica.saudavel = False
+        replica.falhas += 1
+        replica.proxima_verificacao = time.monotonic() + INTERVALO_VERIFICACAO
+
+
+def _verificar(replica):
+    try:
+        with replica.engine.connect() as conexao:
+            conexao.execute(sa.text('SELECT 1'))
+        with _lock:
+            replica.saudavel = True
+        logger.warning('Réplica %s de volta ao rodízio', replica.chave)
+    except Exception as erro:
+        _marcar_fora(replica, erro)
+    finally:
+        replica.verificando = False
+
+
+def estado_replicas():
+    return [{'replica': r.chave, 'saudavel': r.saudavel, 'falhas': r.falhas} for r in _replicas]
+
+
+def metricas_replicas():
+    """Coletor para /metrics (metricas.registrar_coletor)."""
+    for destino, total in list(_consultas.items()):
+        yield 'midnight_db_leituras_total', {'destino': destino}, total
+    for replica in _replicas:
+        yield 'midnight_replica_saudavel', {'replica': replica.chave}, int(replica.saudavel)
+        yield 'midnight_replica_falhas_total', {'replica': replica.chave}, replica.falhas
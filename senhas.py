@@ -0,0 +1,132 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --- SERVIÇO DE HASH DE SENHAS ---
+# O hash de senha é lento de propósito. Para que uma rajada de logins não
+# ocupe todas as threads do servidor, o cálculo roda num pool limitado de
+# workers; se a fila estiver cheia, a requisição falha rápido com
+# ServicoSenhasOcupado (503) em vez de esperar indefinidamente.
+#
+# Algoritmo e custo vêm do ambiente:
+#   SENHA_ALGORITMO = scrypt (padrão) | pbkdf2 | bcrypt
+#   SENHA_CUSTO     = scrypt: log2(N) (15) | pbkdf2: iterações (600000) | bcrypt: rounds (12)
+# Hashes feitos com outra configuração continuam válidos e são refeitos no
+# próximo login bem-sucedido (ver precisa_rehash).
+
+CUSTO_PADRAO = {'scrypt': 15, 'pbkdf2': 600000, 'bcrypt': 12}
+
+
+class ServicoSenhasOcupado(Exception):
+    pass
+
+
+class ServicoSenhas:
+    def __init__(self, algoritmo='scrypt', custo=None, workers=None, fila=None, espera=2.0):
+        if algoritmo not in CUSTO_PADRAO:
+            raise ValueError(f'Algoritmo de senha desconhecido: {algoritmo}')
+        if algoritmo == 'bcrypt':
+            import bcrypt  # noqa: F401 (falha cedo se o pacote não estiver instalado)
+
+        self.algoritmo = algoritmo
+        self.custo = int(custo) if custo else CUSTO_PADRAO[algoritmo]
+        self.workers = workers or os.cpu_count() or 2
+        self.espera = espera
+        # Vagas = workers ocupados + fila de espera; além disso, recusa
+        self._vagas = threading.BoundedSemaphore(self.workers + (self.workers * 4 if fila is None else fila))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='senhas')
+
+    def _executar(self, funcao, *args):
+        if not self._vagas.acquire(timeout=self.espera):
+            raise ServicoSenhasOcupado()
+        try:
+            futuro = self._pool.submit(funcao, *args)
+        except BaseException:
+            self._vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        return futuro.result()
+
+    # --- Cálculo (roda nos workers) ---
+    def _metodo_werkzeug(self):
+        if self.algoritmo == 'scrypt':
+            return f'scrypt:{2 ** self.custo}:8:1'
+        return f'pbkdf2:sha256:{self.custo}'
+
+    def _gerar(self, senha):
+        if self.algoritmo == 'bcrypt':
+            import bcrypt
+            return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(self.custo)).decode('ascii')
+        return generate_password_hash(senha, method=self._metodo_werkzeug())
+
+    @staticmethod
+    def _verificar(senha_hash, senha):
+        if senha_hash.startswith('$2'):
+            import bcrypt
+            try:
+                return bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('ascii'))
+            except ValueError:
+                return False
+        return check_password_hash(senha_hash, senha)
+
+    # --- API pública ---
+    def gerar_hash(self, senha):
+        return self._executar(self._gerar, senha)
+
+    def verificar(self, senha_hash, senha):
+        if not senha_hash or senha is None:
+            return False
+        return self._executar(self._verificar, senha_hash, senha)
+
+    def precisa_rehash(self, senha_hash):
+        """True se o hash foi feito com outro algoritmo ou outro custo."""
+        if senha_hash.startswith('$2'):
+            partes = senha_hash.split('$')
+            return self.algoritmo != 'bcrypt' or len(partes) < 3 or partes[2] != f'{self.custo:02d}'
+
+        metodo = senha_hash.split('$', 1)[0]
+        return metodo != self._metodo_werkzeug() if self.algoritmo != 'bcrypt' else True
+
+    def encerrar(self):
+        self._pool.shutdown(wait=True)
+
+
+# Criado no primeiro uso, depois que o app já carregou o .env
+_servico = None
+_lock = threading.Lock()
+
+
+def obter_servico():
+    global _servico
+    if _servico is None:
+        with _lock:
+            if _servico is None:
+                _servico = ServicoSenhas(
+                    algoritmo=os.getenv('SENHA_ALGORITMO', 'scrypt'),
+                    custo=os.getenv('SENHA_CUSTO'),
+                    workers=int(os.getenv('SENHA_WORKERS', 0)) or None,
+                )
+    return _servico
+
+
+def configurar(**opcoes):
+    """Troca o serviço atual (usado pelo benchmark)."""
+    global _servico
+    with _lock:
+        anterior, _servico = _servico, ServicoSenhas(**opcoes)
+    if anterior is not None:
+        anterior.encerrar()
+    return _servico
+
+
+def gerar_hash(senha):
+    return obter_servico().gerar_hash(senha)
+
+
+def verificar_senha(senha_hash, senha):
+    return obter_servico().verificar(senha_hash, senha)
+
+
+def precisa_rehash(senha_hash):
+    return obter_servico().precisa_rehash(senha_hash)
@@ -22,6 +22,18 @@
     // Inicializa o botão "Voltar ao Topo"
     initScrollTopButton();
 
+    // Inicializa a rolagem infinita do catálogo
+    initInfiniteScroll();
+
+    // Inicializa o autocomplete da busca na navbar
+    initSearchSuggest();
+
+    // Inicializa os botões "Carregar Mais" das listas paginadas
+    initLoadMoreButtons();
+
+    // Inicializa o carrinho sem recarregar a página (API /api/cart)
+    initCart();
+
 }); // <-- FIM DO "DOMContentLoaded"
 
 
@@ -157,4 +169,308 @@ function initScrollTopButton() {
             });
         });
     }
-}
\ No newline at end of file
+}
+
+
+/**
+ * 5. ROLAGEM INFINITA DO CATÁLOGO
+ * Quando o link "Carregar Mais" entra na tela, busca apenas os cards
+ * da próxima página (?parcial=1) e os adiciona à grade.
+ * Sem JavaScript, o link continua funcionando como paginação normal.
+ */
+function initInfiniteScroll() {
+    const grid = document.getElementById('catalogo-grid');
+    const link = document.getElementById('catalogo-proxima');
+
+    if (!grid || !link) return;
+
+    let carregando = false;
+
+    async function carregarProxima() {
+        if (carregando || !link.getAttribute('href')) return;
+        carregando = true;
+
+        const url = new URL(link.href, window.location.origin);
+        url.searchParams.set('parcial', '1');
+
+        try {
+            const resposta = await fetch(url);
+            if (!resposta.ok) throw new Error(resposta.status);
+
+            grid.insertAdjacentHTML('beforeend', await resposta.text());
+
+            const proxima = resposta.headers.get('X-Proxima-Pagina');
+            if (proxima) {
+                link.href = proxima;
+            } else {
+                observer.disconnect();
+                link.parentElement.remove();
+            }
+        } catch (erro) {
+            // Em caso de falha, o link volta a funcionar como navegação normal
+            observer.disconnect();
+        } finally {
+            carregando = false;
+        }
+    }
+
+    const observer = new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) carregarProxima();
+    }, { rootMargin: '400px' });
+
+    observer.observe(link);
+
+    link.addEventListener('click', (e) => {
+        e.preventDefault();
+        carregarProxima();
+    });
+}
+
+
+/**
+ * 6. AUTOCOMPLETE DA BUSCA
+ * Consulta /api/search/suggest enquanto o usuário digita (com debounce)
+ * e mostra as sugestões de produtos e categorias abaixo do campo.
+ */
+function initSearchSuggest() {
+    const input = document.querySelector('.header-search input[data-suggest-url]');
+    if (!input) return;
+
+    const form = input.closest('form');
+    const lista = document.createElement('ul');
+    lista.className = 'search-suggestions';
+    form.appendChild(lista);
+
+    let timer = null;
+    let ultimaConsulta = '';
+    let controller = null;
+
+    function fechar() {
+        lista.classList.remove('active');
+        lista.innerHTML = '';
+    }
+
+    function renderizar(sugestoes) {
+        lista.innerHTML = '';
+        sugestoes.forEach(sugestao => {
+            const li = document.createElement('li');
+            const link = document.createElement('a');
+            link.href = sugestao.url;
+            link.textContent = sugestao.texto;
+            if (sugestao.tipo === 'categoria') link.classList.add('suggestion-category');
+            li.appendChild(link);
+            lista.appendChild(li);
+        });
+        lista.classList.toggle('active', sugestoes.length > 0);
+    }
+
+    async function buscar(consulta) {
+        // Cancela a requisição anterior, se ainda estiver em andamento
+        if (controller) controller.abort();
+        controller = new AbortController();
+
+        const url = new URL(input.dataset.suggestUrl, window.location.origin);
+        url.searchParams.set('q', consulta);
+
+        try {
+            const resposta = await fetch(url, { signal: controller.signal });
+            if (!resposta.ok) return;
+            const dados = await resposta.json();
+            if (consulta === ultimaConsulta) renderizar(dados.sugestoes);
+        } catch (erro) {
+            // Requisição cancelada ou falha de rede: mantém a busca normal
+        }
+    }
+
+    input.addEventListener('input', () => {
+        const consulta = input.value.trim();
+        ultimaConsulta = consulta;
+        clearTimeout(timer);
+
+        if (consulta.length < 2) {
+            fechar();
+            return;
+        }
+        timer = setTimeout(() => buscar(consulta), 200);
+    });
+
+    input.addEventListener('keydown', (e) => {
+        if (e.key === 'Escape') fechar();
+    });
+
+    window.addEventListener('click', (e) => {
+        if (!form.contains(e.target)) fechar();
+    });
+}
+
+
+/**
+ * 7. BOTÕES "CARREGAR MAIS"
+ * Links com data-load-more="<id do container>" buscam a próxima página
+ * (fragmento HTML) e a adicionam ao container. O endereço da página
+ * seguinte vem no cabeçalho X-Proxima-Pagina.
+ */
+function initLoadMoreButtons() {
+    document.querySelectorAll('[data-load-more]').forEach(link => {
+        const container = document.getElementById(link.dataset.loadMore);
+        if (!container) return;
+
+        link.addEventListener('click', async (e) => {
+            e.preventDefault();
+            if (link.classList.contains('loading')) return;
+            link.classList.add('loading');
+
+            try {
+                const resposta = await fetch(link.href);
+                if (!resposta.ok) throw new Error(resposta.status);
+
+                container.insertAdjacentHTML('beforeend', await resposta.text());
+
+                const proxima = resposta.headers.get('X-Proxima-Pagina');
+                if (proxima) {
+                    link.href = proxima;
+                } else {
+                    link.parentElement.remove();
+                }
+            } catch (erro) {
+                window.location.href = link.href;
+            } finally {
+                link.classList.remove('loading');
+            }
+        });
+    });
+}
+
+
+/**
+ * 8. CARRINHO SEM RECARREGAR A PÁGINA
+ * Os formulários do carrinho (quantidade, remover, cupom) e o "Adicionar ao
+ * Carrinho" da página do produto têm data-cart-* com o endereço da API.
+ * A resposta traz só a linha alterada e os novos totais, que são trocados
+ * no lugar. Sem JavaScript (ou se a API falhar), o formulário é enviado
+ * normalmente.
+ */
+function initCart() {
+    const carrinho = document.querySelector('[data-cart]');
+    const mensagens = document.getElementById('cart-messages');
+
+    function mostrarMensagem(texto, categoria, perto) {
+        if (!texto) return;
+        const aviso = document.createElement('div');
+        aviso.className = `alert alert-${categoria}`;
+        aviso.textContent = texto;
+
+        if (mensagens) {
+            mensagens.replaceChildren(aviso);
+        } else if (perto) {
+            perto.parentElement.querySelectorAll('.alert').forEach(antigo => antigo.remove());
+            perto.insertAdjacentElement('afterend', aviso);
+        }
+    }
+
+    async function enviar(url, metodo, dados) {
+        const resposta = await fetch(url, {
+            method: metodo,
+            headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+            body: dados ? JSON.stringify(dados) : undefined,
+        });
+        const corpo = await resposta.json().catch(() => ({}));
+        // Não logado ou erro inesperado: o formulário normal resolve
+        if (resposta.status === 401 || resposta.status >= 500) throw new Error(resposta.status);
+        return { ok: resposta.ok, corpo };
+    }
+
+    function atualizarTotais(totais) {
+        if (!carrinho || !totais) return;
+        // Último item removido: a página mostra o carrinho vazio
+        if (totais.itens === 0) {
+            window.location.reload();
+            return;
+        }
+        carrinho.querySelector('[data-cart-subtotal]').textContent = totais.subtotal.formatado;
+        carrinho.querySelector('[data-cart-total]').textContent = totais.total.formatado;
+        carrinho.querySelector('[data-cart-discount]').textContent = totais.desconto.formatado;
+        carrinho.querySelector('[data-cart-coupon-code]').textContent = totais.cupom || '';
+        carrinho.querySelector('[data-cart-discount-row]').hidden = Number(totais.desconto.valor) <= 0;
+
+        const removerCupom = carrinho.querySelector('[data-cart-coupon-remove]');
+        if (removerCupom) removerCupom.hidden = !totais.cupom;
+        const campoCupom = carrinho.querySelector('[data-cart-coupon]:not([data-cart-coupon-remove]) input[name="codigo_cupom"]');
+        if (campoCupom) campoCupom.value = totais.cupom || '';
+    }
+
+    function atualizarLinha(idItem, linha) {
+        const tr = carrinho && carrinho.querySelector(`[data-cart-item="${idItem}"]`);
+        if (!tr) return;
+        if (!linha) {
+            tr.remove();
+            return;
+        }
+        tr.querySelector('[data-cart-line-total]').textContent = linha.total.formatado;
+        const campo = tr.querySelector('input[name="quantidade"]');
+        campo.value = linha.quantidade;
+        campo.max = linha.estoque;
+    }
+
+    // Intercepta o envio de um formulário; `montar` devolve [url, método, dados]
+    function interceptar(form, montar, aoResponder) {
+        form.addEventListener('submit', async (e) => {
+            e.preventDefault();
+            const alvo = form.closest('tr') || form;
+            if (alvo.classList.contains('is-updating')) return;
+            alvo.classList.add('is-updating');
+
+            try {
+                const [url, metodo, dados] = montar();
+                const { ok, corpo } = await enviar(url, metodo, dados);
+                if (ok) {
+                    aoResponder(corpo);
+                    mostrarMensagem(corpo.mensagem, 'info', form);
+                } else {
+                    if (corpo.estoque !== undefined) {
+                        const campo = form.querySelector('input[name="quantidade"]');
+                        if (campo) campo.max = corpo.estoque;
+                    }
+                    mostrarMensagem(corpo.erro, 'danger', form);
+                }
+            } catch (erro) {
+                form.submit();
+            } finally {
+                alvo.classList.remove('is-updating');
+            }
+        });
+    }
+
+    document.querySelectorAll('form[data-cart-update]').forEach(form => {
+        interceptar(form, () => [
+            form.dataset.cartUpdate, 'PATCH',
+            { quantidade: form.querySelector('input[name="quantidade"]').value },
+        ], corpo => {
+            atualizarLinha(corpo.id_item, corpo.linha);
+            atualizarTotais(corpo.totais);
+        });
+    });
+
+    document.querySelectorAll('form[data-cart-remove]').forEach(form => {
+        interceptar(form, () => [form.dataset.cartRemove, 'DELETE', null], corpo => {
+            atualizarLinha(corpo.id_item, null);
+            atualizarTotais(corpo.totais);
+        });
+    });
+
+    document.querySelectorAll('form[data-cart-coupon]').forEach(form => {
+        interceptar(form, () => {
+            const codigo = form.querySelector('input[name="codigo_cupom"]').value.trim();
+            return codigo
+                ? [form.dataset.cartCoupon, 'PUT', { codigo_cupom: codigo }]
+                : [form.dataset.cartCoupon, 'DELETE', null];
+        }, corpo => atualizarTotais(corpo.totais));
+    });
+
+    document.querySelectorAll('form[data-cart-add]').forEach(form => {
+        interceptar(form, () => [form.dataset.cartAdd, 'POST', {
+            produto_id: form.querySelector('input[name="produto_id"]').value,
+            quantidade: form.querySelector('input[name="quantidade"]').value,
+        }], () => {});
+    });
+}
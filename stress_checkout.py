@@ -0,0 +1,193 @@
+"""
+Teste de estresse do checkout: várias threads finalizando pedidos do mesmo
+produto ao mesmo tempo. Verifica que o estoque nunca fica negativo, que não
+há venda acima do estoque e que todo pedido tem seus itens.
+
+Antes da disputa, as mesmas threads finalizam o mesmo número de pedidos, cada
+um de um produto diferente (linha de base sem disputa). O teste falha se a
+vazão com todos disputando o mesmo produto ficar abaixo de --fracao-minima da
+linha de base (ou de --vazao-minima checkouts/s, se informada).
+
+Uso (SQLite local por padrão):
+    python stress_checkout.py --clientes 200 --threads 16 --estoque 120
+    python stress_checkout.py --fracao-minima 0.7 --vazao-minima 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estresse do checkout concorrente.')
+    parser.add_argument('--clientes', type=int, default=200, help='clientes com o produto no carrinho')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--estoque', type=int, default=120, help='estoque inicial do produto disputado')
+    parser.add_argument('--quantidade', type=int, default=1, help='unidades por carrinho')
+    parser.add_argument('--db', help='URL do banco (padrão: SQLite temporário)')
+    parser.add_argument('--fracao-minima', type=float, default=0.5,
+                        help='vazão mínima com disputa, como fração da linha de base sem disputa')
+    parser.add_argument('--vazao-minima', type=float, default=0.0,
+                        help='vazão mínima absoluta com disputa, em checkouts/s (0 = sem limite)')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['DATABASE_URL'] = args.db
+    else:
+        arquivo = os.path.join(tempfile.mkdtemp(), 'stress_checkout.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{arquivo}'
+    os.environ.setdefault('SECRET_KEY', 'stress-checkout')
+
+    # Importado depois de definir DATABASE_URL
+    from app import app
+    from models import db, User, Produto, Pedido, ItensPedido, ItemCarrinho
+
+    print(f"Banco: {os.environ['DATABASE_URL']}")
+    with app.app_context():
+        db.create_all()
+        vendedor = User(nome='Vendedor Estresse', email='vendedor@stress.local', senha_hash='-', tipo_usuario='vendedor')
+        db.session.add(vendedor)
+        db.session.flush()
+        vendedor.id_usuario = vendedor.id
+
+        produto = Produto(id_vendedor=vendedor.id_usuario, nome='Produto Disputado', descricao='-',
+                          preco=100, estoque=args.estoque, categoria='Estresse')
+        db.session.add(produto)
+
+        # Linha de base: um produto (com estoque de sobra) por cliente
+        avulsos = [
+            Produto(id_vendedor=vendedor.id_usuario, nome=f'Produto Avulso {i}', descricao='-',
+                    preco=100, estoque=args.quantidade * 10, categoria='Estresse')
+            for i in range(args.clientes)
+        ]
+        db.session.add_all(avulsos)
+
+        clientes = [
+            User(nome=f'Cliente {i}', email=f'cliente{i}@stress.local', senha_hash='-')
+            for i in range(args.clientes)
+        ]
+        clientes_base = [
+            User(nome=f'Cliente Base {i}', email=f'base{i}@stress.local', senha_hash='-')
+            for i in range(args.clientes)
+        ]
+        db.session.add_all(clientes + clientes_base)
+        db.session.flush()
+        for cliente in clientes:
+            cliente.id_usuario = cliente.id
+            db.session.add(ItemCarrinho(id_usuario=cliente.id_usuario, id_produto=produto.id_produto,
+                                        quantidade=args.quantidade))
+        for cliente, avulso in zip(clientes_base, avulsos):
+            cliente.id_usuario = cliente.id
+            db.session.add(ItemCarrinho(id_usuario=cliente.id_usuario, id_produto=avulso.id_produto,
+                                        quantidade=args.quantidade))
+        db.session.commit()
+        id_produto = produto.id_produto
+        ids_clientes = [c.id_usuario for c in clientes]
+        ids_base = [c.id_usuario for c in clientes_base]
+
+    def rodar(ids_usuarios):
+        """
+        Finaliza o carrinho de cada usuário com args.threads threads.
+        Retorna (latências, resultados, duração, vazão dos pedidos aceitos).
+        """
+        fila = list(ids_usuarios)
+        lock = threading.Lock()
+        latencias = []
+        resultados = {'ok': 0, 'sem_estoque': 0, 'erro': 0}
+        ultimo_ok = [0.0]
+
+        def trabalhador():
+            client = app.test_client()
+            while True:
+                with lock:
+                    if not fila:
+                        return
+                    id_usuario = fila.pop()
+                with client.session_transaction() as sessao:
+                    sessao['_user_id'] = str(id_usuario)
+                    sessao['_fresh'] = True
+
+                inicio = time.perf_counter()
+                resposta = client.post('/finalizar-pedido')
+                duracao = time.perf_counter() - inicio
+
+                with client.session_transaction() as sessao:
+                    mensagens = [m for _, m in sessao.pop('_flashes', [])]
+                destino = resposta.headers.get('Location', '')
+                with lock:
+                    latencias.append(duracao)
+                    if resposta.status_code == 302 and destino.endswith('/pedidos'):
+                        resultados['ok'] += 1
+                        ultimo_ok[0] = max(ultimo_ok[0], time.perf_counter())
+                    elif any('Estoque insuficiente' in m for m in mensagens):
+                        resultados['sem_estoque'] += 1
+                    else:
+                        resultados['erro'] += 1
+                        print(f'Erro inesperado ({resposta.status_code}): {mensagens}')
+
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=trabalhador) for _ in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # Recusas por estoque esgotado são rápidas: a vazão conta só os aceitos,
+        # até o último deles terminar
+        vazao_aceitos = resultados['ok'] / (ultimo_ok[0] - inicio) if resultados['ok'] else 0.0
+        return latencias, resultados, time.perf_counter() - inicio, vazao_aceitos
+
+    _, resultados_base, _, vazao_base = rodar(ids_base)
+    latencias, resultados, duracao_total, vazao = rodar(ids_clientes)
+
+    with app.app_context():
+        estoque_final = db.session.get(Produto, id_produto).estoque
+        vendido = db.session.query(db.func.coalesce(db.func.sum(ItensPedido.quantidade), 0)).filter(
+            ItensPedido.id_produto == id_produto).scalar()
+        total_pedidos = Pedido.query.count()
+        pedidos_sem_itens = Pedido.query.filter(~Pedido.itens.any()).count()
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000
+
+    print(f"Pedidos: {resultados['ok']} ok, {resultados['sem_estoque']} recusados por estoque, {resultados['erro']} erros")
+    print(f"Vazão: {vazao:.1f} pedidos aceitos/s em {duracao_total:.2f}s "
+          f"(sem disputa: {vazao_base:.1f}/s, {vazao / vazao_base if vazao_base else 0:.0%})")
+    print(f"Latência (ms): p50={percentil(0.50):.1f} p95={percentil(0.95):.1f} "
+          f"p99={percentil(0.99):.1f} média={statistics.mean(latencias) * 1000:.1f}")
+    print(f"Estoque: inicial={args.estoque} final={estoque_final} vendido={vendido}")
+
+    falhas = []
+    if estoque_final < 0:
+        falhas.append('estoque negativo')
+    if vendido != args.estoque - estoque_final:
+        falhas.append('unidades vendidas não batem com a baixa de estoque')
+    if vendido > args.estoque:
+        falhas.append('venda acima do estoque (oversell)')
+    if total_pedidos != resultados['ok'] + resultados_base['ok']:
+        falhas.append('número de pedidos gravados diferente dos checkouts aceitos')
+    if pedidos_sem_itens:
+        falhas.append(f'{pedidos_sem_itens} pedido(s) sem itens')
+    if resultados['erro']:
+        falhas.append(f"{resultados['erro']} checkout(s) com erro inesperado")
+    esperado = min(args.clientes, args.estoque // args.quantidade)
+    if resultados['ok'] != esperado:
+        falhas.append(f"esperados {esperado} pedidos aceitos, houve {resultados['ok']}")
+    if resultados_base['ok'] != len(ids_base):
+        falhas.append(f"linha de base: {len(ids_base) - resultados_base['ok']} checkout(s) sem disputa falharam")
+    if vazao < args.fracao_minima * vazao_base:
+        falhas.append(f'vazão com disputa ({vazao:.1f}/s) abaixo de {args.fracao_minima:.0%} '
+                      f'da linha de base ({vazao_base:.1f}/s)')
+    if vazao < args.vazao_minima:
+        falhas.append(f'vazão com disputa ({vazao:.1f}/s) abaixo do mínimo de {args.vazao_minima:.1f}/s')
+
+    if falhas:
+        print('FALHOU: ' + '; '.join(falhas))
+        sys.exit(1)
+    print('OK: nenhuma venda acima do estoque e vazão estável sob disputa.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import update, func
+from sqlalchemy.orm import selectinload
+from models import db, Pedido, Produto, Tarefa, PedidoAplicado
+from vitrines import registrar_vendas, registrar_devolucao
+from relatorios import resumir_venda, resumir_devolucao
+from imagens import variante, ImagemIndisponivel
+
+# --- FILA DE TAREFAS (Trabalho adiado para o worker) ---
+# Efeitos colaterais que não precisam acontecer durante a requisição (contadores
+# de vendas, resumo dos relatórios, variantes de imagem) viram linhas na tabela
+# Tarefas, gravadas na MESMA transação do pedido/produto: se a transação falha,
+# a tarefa também não existe; se ela confirma, a tarefa não se perde.
+#
+# O worker (worker.py) pega tarefas do mesmo tipo em lote, roda o handler e
+# marca as tarefas como concluídas na mesma transação dos efeitos do handler,
+# só se o lote ainda for dele: uma tarefa que passou de TEMPO_MAXIMO_EXECUCAO
+# volta para a fila e pode ter sido pega por outro worker, e aí o primeiro
+# desfaz tudo. Os handlers de vendas/devolução ainda registram cada pedido
+# aplicado (PedidosAplicados), então uma tarefa repetida não soma duas vezes.
+# Falhas são repetidas com backoff exponencial até MAX_TENTATIVAS.
+#
+# Caches em memória (vitrines, páginas, índice de busca) continuam sendo
+# invalidados na própria requisição: o worker roda em outro processo.
+
+MAX_TENTATIVAS = 5
+ESPERA_BASE = 2.0  # segundos; dobra a cada tentativa
+TEMPO_MAXIMO_EXECUCAO = 300  # segundos até uma tarefa 'executando' ser considerada abandonada
+DIAS_HISTORICO = 7  # concluídas mais antigas que isso são apagadas
+JANELA_LATENCIA = 300  # segundos de tarefas concluídas usadas na latência média
+
+logger = logging.getLogger(__name__)
+
+
+class ReservaPerdida(Exception):
+    """O lote voltou para a fila (abandonado) e pode estar com outro worker."""
+
+TipoTarefa = namedtuple('TipoTarefa', ['nome', 'handler', 'lote'])
+_tipos = {}
+
+
+def tarefa(nome, lote=1):
+    """
+    Registra o handler de um tipo de tarefa. O handler recebe a lista de dados
+    (dicts) de até `lote` tarefas e não faz commit.
+    """
+    def registrar(handler):
+        _tipos[nome] = TipoTarefa(nome, handler, lote)
+        return handler
+    return registrar
+
+
+def tipos_registrados():
+    return sorted(_tipos)
+
+
+def enfileirar(tipo, atraso=0, **dados):
+    """Adiciona a tarefa à sessão atual; é gravada junto com o próximo commit."""
+    if tipo not in _tipos:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo}')
+    agora = datetime.now()
+    db.session.add(Tarefa(tipo=tipo, dados=json.dumps(dados), status='pendente',
+                          executar_em=agora + timedelta(seconds=atraso), criada_em=agora))
+
+
+# --- Execução (worker) ---
+
+def _reservar(tipos=None):
+    """Reserva um lote de tarefas pendentes do tipo da mais antiga. Retorna (tipo, [Tarefa])."""
+    agora = datetime.now()
+    prontas = Tarefa.query.filter(Tarefa.status == 'pendente', Tarefa.executar_em <= agora)
+    if tipos:
+        prontas = prontas.filter(Tarefa.tipo.in_(tipos))
+    primeira = prontas.order_by(Tarefa.executar_em, Tarefa.id_tarefa).first()
+    if primeira is None:
+        db.session.rollback()
+        return None, []
+
+    tipo = _tipos.get(primeira.tipo)
+    ids = [row[0] for row in db.session.query(Tarefa.id_tarefa).filter(
+        Tarefa.status == 'pendente', Tarefa.executar_em <= agora, Tarefa.tipo == primeira.tipo
+    ).order_by(Tarefa.id_tarefa).limit(tipo.lote if tipo else 1)]
+
+    # Vários workers podem ler os mesmos ids: o UPDATE condicional decide quem fica com cada um
+    reserva = uuid.uuid4().hex
+    db.session.execute(
+        update(Tarefa).where(Tarefa.id_tarefa.in_(ids), Tarefa.status == 'pendente')
+        .values(status='executando', reserva=reserva, iniciada_em=agora, tentativas=Tarefa.tentativas + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return tipo, Tarefa.query.filter_by(reserva=reserva).order_by(Tarefa.id_tarefa).all()
+
+
+def _executar(tipo, tarefas, reserva):
+    """Roda o handler e conclui as tarefas numa transação só (ReservaPerdida se o lote não é mais deste worker)."""
+    ids = [t.id_tarefa for t in tarefas]
+    tipo.handler([json.loads(t.dados) for t in tarefas])
+    resultado = db.session.execute(
+        update(Tarefa).where(Tarefa.id_tarefa.in_(ids), Tarefa.reserva == reserva, Tarefa.status == 'executando')
+        .values(status='concluida', concluida_em=datetime.now(), erro=None)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != len(ids):
+        db.session.rollback()
+        raise ReservaPerdida(f'{len(ids) - resultado.rowcount} de {len(ids)} tarefas {tipo.nome} não são mais deste lote')
+    db.session.commit()
+
+
+def _falhou(ids, reserva, erro):
+    db.session.rollback()
+    for t in Tarefa.query.filter(Tarefa.id_tarefa.in_(ids), Tarefa.reserva == reserva,
+                                 Tarefa.status == 'executando').all():
+        t.erro = f'{type(erro).__name__}: {erro}'[:2000]
+        if t.tentativas >= MAX_TENTATIVAS:
+            t.status = 'falhou'
+            logger.error('Tarefa %s (%s) falhou definitivamente: %s', t.id_tarefa, t.tipo, t.erro)
+        else:
+            espera = ESPERA_BASE * 2 ** (t.tentativas - 1) * (1 + random.random())
+            t.status = 'pendente'
+            t.executar_em = datetime.now() + timedelta(seconds=espera)
+    db.session.commit()
+
+
+def processar_lote(tipos=None):
+    """
+    Processa um lote de tarefas (só dos `tipos`, se informados).
+    Retorna quantas tarefas foram reservadas, com sucesso ou não (0 = nada pronto).
+    """
+    tipo, tarefas = _reservar(tipos)
+    if not tarefas:
+        return 0
+    ids = [t.id_tarefa for t in tarefas]
+    reserva = tarefas[0].reserva
+    if tipo is None:
+        _falhou(ids, reserva, ValueError(f'Tipo sem handler: {tarefas[0].tipo}'))
+        return len(ids)
+
+    try:
+        _executar(tipo, tarefas, reserva)
+        return len(ids)
+    except ReservaPerdida as erro:
+        if len(ids) == 1:
+            return 1  # outro worker cuida dela
+        logger.warning('%s; repetindo uma a uma', erro)
+    except Exception as erro:
+        db.session.rollback()
+        if len(ids) == 1:
+            _falhou(ids, reserva, erro)
+            return 1
+        logger.warning('Lote de %d tarefas %s falhou (%s); repetindo uma a uma', len(ids), tipo.nome, erro)
+
+    # Uma tarefa com problema não segura o lote inteiro
+    for id_tarefa in ids:
+        try:
+            _executar(tipo, [db.session.get(Tarefa, id_tarefa)], reserva)
+        except ReservaPerdida:
+            pass  # outro worker cuida dela
+        except Exception as erro:
+            _falhou([id_tarefa], reserva, erro)
+    return len(ids)
+
+
+def processar_pendentes(tipos=None):
+    """Processa lotes até não haver tarefa pronta. Retorna quantas foram reservadas."""
+    total = 0
+    while True:
+        processadas = processar_lote(tipos)
+        if not processadas:
+            return total
+        total += processadas
+
+
+def recuperar_abandonadas():
+    """
+    Volta para a fila as tarefas de workers que morreram no meio da execução.
+    A tentativa já foi contada na reserva: quem chegou a MAX_TENTATIVAS (ex: a
+    tarefa que derruba o worker) vira 'falhou' em vez de voltar para a fila.
+    """
+    limite = datetime.now() - timedelta(seconds=TEMPO_MAXIMO_EXECUCAO)
+    abandonadas = (Tarefa.status == 'executando', Tarefa.iniciada_em < limite)
+    erro = f'Abandonada: sem conclusão em {TEMPO_MAXIMO_EXECUCAO}s (worker interrompido?)'
+    falharam = db.session.execute(
+        update(Tarefa).where(*abandonadas, Tarefa.tentativas >= MAX_TENTATIVAS)
+        .values(status='falhou', reserva=None, erro=erro)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if falharam:
+        logger.error('%d tarefa(s) abandonadas %d vezes marcadas como falhas', falharam, MAX_TENTATIVAS)
+    resultado = db.session.execute(
+        update(Tarefa).where(*abandonadas)
+        .values(status='pendente', reserva=None, erro=erro)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def limpar_concluidas(dias=DIAS_HISTORICO):
+    limite = datetime.now() - timedelta(days=dias)
+    resultado = db.session.execute(
+        Tarefa.__table__.delete().where(Tarefa.status == 'concluida', Tarefa.concluida_em < limite)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def executar_worker(intervalo=1.0, parar=None, tipos=None):
+    """Laço do worker: processa lotes até `parar` (threading.Event) ser sinalizado."""
+    parar = parar or threading.Event()
+    ultima_manutencao = 0.0
+    while not parar.is_set():
+        if time.monotonic() - ultima_manutencao > 60:
+            recuperar_abandonadas()
+            limpar_concluidas()
+            ultima_manutencao = time.monotonic()
+        try:
+            processadas = processar_lote(tipos)
+        except Exception:
+            db.session.rollback()
+            logger.exception('Erro no worker de tarefas')
+            processadas = 0
+        if not processadas:
+            parar.wait(intervalo)
+
+
+def iniciar_worker_embutido(app, intervalo=1.0):
+    """Roda o worker numa thread do próprio app (desenvolvimento ou servidor único)."""
+    def rodar():
+        with app.app_context():
+            executar_worker(intervalo)
+    threading.Thread(target=rodar, name='worker-tarefas', daemon=True).start()
+
+
+# --- Métricas (lidas do banco: valem para todos os workers) ---
+
+def estatisticas_tarefas():
+    agora = datetime.now()
+    por_tipo = defaultdict(lambda: {'pendentes': 0, 'executando': 0, 'falhas': 0,
+                                    'idade_mais_antiga': 0.0, 'latencia_media': 0.0, 'concluidas_recentes': 0})
+    linhas = db.session.query(
+        Tarefa.tipo, Tarefa.status, func.count(Tarefa.id_tarefa), func.min(Tarefa.criada_em)
+    ).filter(Tarefa.status.in_(('pendente', 'executando', 'falhou'))).group_by(Tarefa.tipo, Tarefa.status)
+    for tipo, status, total, mais_antiga in linhas:
+        chave = {'pendente': 'pendentes', 'executando': 'executando', 'falhou': 'falhas'}[status]
+        por_tipo[tipo][chave] = total
+        if status == 'pendente' and mais_antiga:
+            por_tipo[tipo]['idade_mais_antiga'] = (agora - mais_antiga).total_seconds()
+
+    # Latência (enfileirada -> concluída) das tarefas concluídas na janela recente
+    recentes = db.session.query(Tarefa.tipo, Tarefa.criada_em, Tarefa.concluida_em).filter(
+        Tarefa.status == 'concluida', Tarefa.concluida_em >= agora - timedelta(seconds=JANELA_LATENCIA)
+    ).limit(10000)
+    somas = defaultdict(float)
+    for tipo, criada_em, concluida_em in recentes:
+        somas[tipo] += (concluida_em - criada_em).total_seconds()
+        por_tipo[tipo]['concluidas_recentes'] += 1
+    for tipo, soma in somas.items():
+        por_tipo[tipo]['latencia_media'] = soma / por_tipo[tipo]['concluidas_recentes']
+    return dict(por_tipo)
+
+
+def metricas_tarefas():
+    """Coletor para /metrics (metricas.registrar_coletor)."""
+    for tipo, dados in estatisticas_tarefas().items():
+        yield 'midnight_tarefas_pendentes', {'tipo': tipo}, dados['pendentes']
+        yield 'midnight_tarefas_executando', {'tipo': tipo}, dados['executando']
+        yield 'midnight_tarefas_falhas', {'tipo': tipo}, dados['falhas']
+        yield 'midnight_tarefas_idade_mais_antiga_segundos', {'tipo': tipo}, dados['idade_mais_antiga']
+        yield 'midnight_tarefas_latencia_media_segundos', {'tipo': tipo}, dados['latencia_media']
+
+
+# --- Tipos de tarefa ---
+# Os handlers só somam/geram coisas; a ordem entre tarefas não importa (uma
+# devolução processada antes da venda dá o mesmo total).
+
+def _pedidos(dados, efeito):
+    """Pedidos de `dados` que ainda não receberam `efeito`, já registrados como aplicados (sem commit)."""
+    ids = {item['id_pedido'] for item in dados}
+    # Dois workers com o mesmo pedido: o segundo INSERT viola a chave e o lote é refeito
+    ids -= {id_pedido for (id_pedido,) in db.session.query(PedidoAplicado.id_pedido).filter(
+        PedidoAplicado.efeito == efeito, PedidoAplicado.id_pedido.in_(ids))}
+    if not ids:
+        return []
+    db.session.add_all(PedidoAplicado(id_pedido=id_pedido, efeito=efeito) for id_pedido in ids)
+    return Pedido.query.options(selectinload(Pedido.itens)).filter(Pedido.id_pedido.in_(ids)).all()
+
+
+@tarefa('vendas_pedido', lote=200)
+def _vendas_pedido(dados):
+    """Contadores de Mais Vendidos e resumo dos relatórios de pedidos novos."""
+    # Cada total tem seu registro: os backfills reconstroem um ou outro
+    por_dia = defaultdict(list)
+    for pedido in _pedidos(dados, 'venda_contadores'):
+        por_dia[pedido.data_pedido.date()].extend((item.id_produto, item.quantidade) for item in pedido.itens)
+    for dia, itens in por_dia.items():
+        registrar_vendas(itens, dia=dia)
+    for pedido in _pedidos(dados, 'venda_resumo'):
+        resumir_venda(pedido)
+
+
+@tarefa('devolucao_pedido', lote=50)
+def _devolucao_pedido(dados):
+    for pedido in _pedidos(dados, 'devolucao_contadores'):
+        registrar_devolucao(pedido)
+    for pedido in _pedidos(dados, 'devolucao_resumo'):
+        resumir_devolucao(pedido)
+
+
+LARGURAS_PRE_GERADAS = (200, 400, 800)  # as do srcset dos cards e da página do produto
+FORMATOS_PRE_GERADOS = ('webp', 'jpeg')
+
+
+@tarefa('variantes_imagem', lote=20)
+def _variantes_imagem(dados):
+    """Gera antes as variantes mais pedidas da imagem de produtos novos/editados."""
+    ids = [item['id_produto'] for item in dados]
+    for id_produto, origem in db.session.query(Produto.id_produto, Produto.url_imagem).filter(
+            Produto.id_produto.in_(ids), Produto.url_imagem.isnot(None)):
+        try:
+            for largura in LARGURAS_PRE_GERADAS:
+                for formato in FORMATOS_PRE_GERADOS:
+                    variante(origem, largura, formato)
+        except ImagemIndisponivel as erro:
+            # Origem inválida não melhora com nova tentativa; a rota serve o placeholder
+            logger.info('Imagem do produto %s indisponível: %s', id_produto, erro)
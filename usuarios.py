@@ -0,0 +1,90 @@
+import itertools
+import os
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, User
+from cache import CacheLRU
+from replicas import leitura_no_primario
+
+# --- CACHE DO USUÁRIO LOGADO ---
+# O user_loader do Flask-Login roda em toda requisição autenticada. Em vez de
+# ir ao banco, guardamos as colunas do usuário num LRU com TTL curto, chaveado
+# por (id_usuario, versão). Cada alteração no usuário (perfil, senha, papel,
+# exclusão) incrementa a versão, então a próxima requisição já recarrega.
+#
+# Com CACHE_REDIS_URL definido (e o pacote redis instalado), as versões ficam
+# no Redis e a invalidação vale para todos os processos; sem ele, as versões
+# são locais e os outros processos enxergam a mudança quando o TTL expira.
+
+TTL_USUARIO = 30  # segundos
+
+_COLUNAS = [coluna.key for coluna in inspect(User).column_attrs]
+_cache = CacheLRU(maximo=2048, ttl=TTL_USUARIO)
+
+
+class _VersoesLocais:
+    # Uma versão só precisa sobreviver ao TTL do cache: depois disso as
+    # entradas gravadas com a versão anterior já expiraram
+    def __init__(self):
+        self._versoes = CacheLRU(maximo=16384, ttl=TTL_USUARIO)
+        self._contador = itertools.count(1)
+
+    def obter(self, id_usuario):
+        return self._versoes.get(id_usuario, 0)
+
+    def incrementar(self, id_usuario):
+        self._versoes.set(id_usuario, next(self._contador))
+
+
+class _VersoesRedis:
+    PREFIXO = 'midnight:versao_usuario:'
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def obter(self, id_usuario):
+        return int(self._cliente.get(self.PREFIXO + str(id_usuario)) or 0)
+
+    def incrementar(self, id_usuario):
+        self._cliente.incr(self.PREFIXO + str(id_usuario))
+
+
+def _criar_versoes():
+    url = os.getenv('CACHE_REDIS_URL')
+    if url:
+        try:
+            import redis
+            return _VersoesRedis(redis.Redis.from_url(url))
+        except ImportError:
+            print("Aviso: CACHE_REDIS_URL definido, mas o pacote 'redis' não está instalado. Usando cache local.")
+    return _VersoesLocais()
+
+
+_versoes = _criar_versoes()
+
+
+def invalidar_usuario(id_usuario):
+    """Chamado depois de qualquer commit que altere (ou exclua) o usuário."""
+    _versoes.incrementar(id_usuario)
+
+
+def _reconstruir(colunas):
+    # Objeto "detached" com as colunas já carregadas; o merge(load=False) o
+    # anexa à sessão atual sem SELECT (relações continuam com lazy load).
+    usuario = User(**colunas)
+    make_transient_to_detached(usuario)
+    return db.session.merge(usuario, load=False)
+
+
+def carregar_usuario(id_usuario):
+    chave = (id_usuario, _versoes.obter(id_usuario))
+    colunas = _cache.get(chave)
+    if colunas is not None:
+        return _reconstruir(colunas)
+
+    # Fica em cache além da requisição: lê do primário, não de uma réplica atrasada
+    with leitura_no_primario():
+        usuario = User.query.filter_by(id_usuario=id_usuario).first()
+    if usuario is not None:
+        _cache.set(chave, {coluna: getattr(usuario, coluna) for coluna in _COLUNAS})
+    return usuario
@@ -0,0 +1,195 @@
+"""
+Verificação dos planos de execução das rotas mais acessadas (SQLite).
+
+Percorre as rotas quentes com o test client, captura cada SELECT/UPDATE/DELETE
+executado e roda EXPLAIN QUERY PLAN com os mesmos parâmetros. Falha (código 1)
+se alguma instrução fizer varredura completa (SCAN sem índice) de uma tabela
+que cresce com o uso, por exemplo quando um índice some numa migração.
+
+Índices e estruturas montados em lote e guardados em memória (índice de
+busca, modelo de recomendações) são aquecidos antes e não entram na
+verificação.
+
+Uso:
+    python verificar_planos.py                 # banco SQLite temporário com dados mínimos
+    python verificar_planos.py --saida planos.txt
+    python verificar_planos.py --db sqlite:///carga.db   # banco existente, sem migrar
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from collections import defaultdict
+
+# Tabelas que crescem com o uso: varredura completa nelas é regressão
+TABELAS_GRANDES = {'Produtos', 'Pedidos', 'ItensPedido', 'ItensCarrinho', 'Usuarios',
+                   'VendasProdutos', 'VendasProdutosDia', 'VendasResumoDia'}
+VARREDURA = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+SENHA = 'planos123'
+
+
+def popular(db, modelos):
+    """Dados mínimos para as rotas terem o que mostrar."""
+    from categorias import garantir_categoria
+    User, Produto, Pedido, ItensPedido = modelos
+
+    vendedor = User(nome='Vendedor Planos', email='vendedor@planos.local', senha=SENHA, tipo_usuario='vendedor')
+    cliente = User(nome='Cliente Planos', email='cliente@planos.local', senha=SENHA)
+    db.session.add_all([vendedor, cliente])
+    db.session.flush()
+    vendedor.id_usuario, cliente.id_usuario = vendedor.id, cliente.id
+
+    caminhos = ['Relógios de Luxo / Suíço', 'Joias / Anéis', 'Joias / Colares', 'Bolsas / Couro']
+    produtos = []
+    for i in range(200):
+        caminho = caminhos[i % len(caminhos)]
+        produtos.append(Produto(id_vendedor=vendedor.id_usuario, nome=f'Colar Élite {i}',
+                                descricao=f'peça número {i} em ouro', preco=100 + i, estoque=50,
+                                categoria=caminho, id_categoria=garantir_categoria(caminho)))
+    db.session.add_all(produtos)
+    db.session.flush()
+    for i in range(30):
+        pedido = Pedido(id_usuario=cliente.id_usuario, valor_total=300, status='Enviado')
+        db.session.add(pedido)
+        db.session.flush()
+        for produto in produtos[i:i + 3]:
+            db.session.add(ItensPedido(id_pedido=pedido.id_pedido, id_produto=produto.id_produto,
+                                       quantidade=1, preco_unitario=produto.preco))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica os planos de execução das rotas quentes.')
+    parser.add_argument('--db', help='URL de um banco SQLite já populado (padrão: temporário)')
+    parser.add_argument('--saida', help='grava as instruções e os planos num arquivo texto')
+    args = parser.parse_args()
+
+    popular_banco = not args.db
+    if args.db:
+        os.environ['DATABASE_URL'] = args.db
+    else:
+        arquivo = os.path.join(tempfile.mkdtemp(), 'planos.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{arquivo}'
+    os.environ.setdefault('SECRET_KEY', 'verificar-planos')
+    if not os.environ['DATABASE_URL'].startswith('sqlite'):
+        print('A verificação usa EXPLAIN QUERY PLAN do SQLite; informe um banco sqlite:///.')
+        return 2
+
+    # Importado depois de definir DATABASE_URL
+    from sqlalchemy import event
+    from app import app
+    from models import db, User, Produto, Pedido, ItensPedido
+    from migracoes import migrar
+    from vitrines import invalidar_vitrines, recalcular_vendas
+    from categorias import invalidar_categorias
+
+    app.logger.setLevel('ERROR')
+    with app.app_context():
+        if popular_banco:
+            # Schema como o deploy deixa: create_all() + migrações
+            db.create_all()
+            migrar(saida=lambda _: None)
+            popular(db, (User, Produto, Pedido, ItensPedido))
+            recalcular_vendas()
+        if not db.session.query(ItensPedido.id_item_pedido).first():
+            print('O banco precisa ter produtos e pedidos (use gerar_dados.py).')
+            return 2
+        vendedor = db.session.query(Produto.id_vendedor).first()[0]
+        cliente = db.session.query(Pedido.id_usuario).first()[0]
+        id_produto = db.session.query(ItensPedido.id_produto).first()[0]
+        id_pedido = db.session.query(Pedido.id_pedido).filter(Pedido.id_usuario == cliente).first()[0]
+        engine = db.engine
+
+    # (rótulo, usuário logado, método, url, dados do formulário)
+    rotas = [
+        ('home', cliente, 'get', '/', None),
+        ('catalogo', cliente, 'get', '/catalogo', None),
+        ('catalogo por categoria', cliente, 'get', '/catalogo?categoria=Joias', None),
+        ('catalogo por preço', cliente, 'get', '/catalogo?ordem=preco', None),
+        ('catalogo recentes', cliente, 'get', '/catalogo?ordem=recentes&categoria=Joias', None),
+        ('produto', cliente, 'get', f'/produto/{id_produto}', None),
+        ('busca', cliente, 'get', '/search?query=colar', None),
+        ('sugestões', cliente, 'get', '/api/search/suggest?q=co', None),
+        ('api produtos', cliente, 'get', '/api/v1/products?ordem=preco&fields=id_produto,nome,vendedor', None),
+        ('api produtos por categoria', cliente, 'get', '/api/v1/products?categoria=Joias&ordem=recentes', None),
+        ('api produtos por id', cliente, 'get', f'/api/v1/products?ids={id_produto}', None),
+        ('add carrinho', cliente, 'post', '/add-carrinho', {'produto_id': id_produto, 'quantidade': 1}),
+        ('add carrinho (repetido)', cliente, 'post', '/add-carrinho', {'produto_id': id_produto, 'quantidade': 1}),
+        ('carrinho', cliente, 'get', '/carrinho', None),
+        ('checkout', cliente, 'post', '/finalizar-pedido', None),
+        ('pedidos', cliente, 'get', '/pedidos', None),
+        ('pedidos (resumo)', cliente, 'get', '/pedidos?resumo=1', None),
+        ('itens do pedido', cliente, 'get', f'/pedidos/{id_pedido}/itens', None),
+        ('venda', vendedor, 'get', '/venda', None),
+        ('relatório do vendedor', vendedor, 'get', '/venda/relatorios', None),
+        ('excluir produto com pedidos', vendedor, 'post', f'/produto/delete/{id_produto}', None),
+    ]
+
+    capturadas = defaultdict(list)
+    rota_atual = [None]
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        instrucao = statement.lstrip().split(None, 1)[0].upper()
+        if rota_atual[0] and not executemany and instrucao in ('SELECT', 'UPDATE', 'DELETE', 'WITH'):
+            capturadas[rota_atual[0]].append((statement, parameters))
+
+    def client_de(id_usuario):
+        client = app.test_client()
+        with client.session_transaction() as sessao:
+            sessao['_user_id'] = str(id_usuario)
+            sessao['_fresh'] = True
+        return client
+
+    clients = {cliente: client_de(cliente), vendedor: client_de(vendedor)}
+
+    # Aquecimento: índice de busca, prefixos, recomendações e árvore de categorias
+    for _, usuario, metodo, url, dados in rotas:
+        if metodo == 'get':
+            clients[usuario].get(url)
+    with app.app_context():
+        invalidar_vitrines()
+        invalidar_categorias()
+
+    for rotulo, usuario, metodo, url, dados in rotas:
+        rota_atual[0] = rotulo
+        resposta = getattr(clients[usuario], metodo)(url, data=dados)
+        rota_atual[0] = None
+        if resposta.status_code >= 400:
+            print(f'{rotulo}: resposta {resposta.status_code}')
+            return 1
+
+    violacoes = []
+    linhas = []
+    with engine.connect() as conexao:
+        for rotulo, *_ in rotas:
+            linhas.append(f'== {rotulo}')
+            for statement, parametros in capturadas[rotulo]:
+                plano = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parametros).fetchall()
+                detalhes = [linha[-1] for linha in plano]
+                linhas.append('   ' + ' '.join(statement.split()))
+                linhas.extend(f'      {detalhe}' for detalhe in detalhes)
+                for detalhe in detalhes:
+                    varredura = VARREDURA.match(detalhe)
+                    if varredura and varredura.group(1) in TABELAS_GRANDES:
+                        violacoes.append((rotulo, detalhe, ' '.join(statement.split())[:200]))
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(linhas) + '\n')
+        print(f'Planos gravados em {args.saida}')
+
+    total = sum(len(instrucoes) for instrucoes in capturadas.values())
+    print(f'{len(rotas)} rotas, {total} instruções verificadas.')
+    if violacoes:
+        print('FALHOU: varredura completa em tabela grande:')
+        for rotulo, detalhe, statement in violacoes:
+            print(f'  [{rotulo}] {detalhe}: {statement}')
+        return 1
+    print('OK: nenhuma rota quente faz varredura completa.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
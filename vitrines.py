@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, insert, literal, select, update, func
+from sqlalchemy.orm import joinedload
+from models import db, Produto, Pedido, ItensPedido, VendasProduto, VendasProdutoDia, PedidoAplicado
+from categorias import obter_arvore
+from replicas import leitura_no_primario
+
+# --- VITRINES DA HOME (Pré-calculadas) ---
+# A Home lê apenas os IDs guardados aqui e busca os produtos numa única query.
+# As vitrines são recalculadas quando invalidadas (produto ou pedido alterado)
+# ou quando o TTL expira.
+
+TAMANHO_VITRINE = 10
+TTL_VITRINES = 300  # segundos
+CATEGORIA_RELOGIOS = 'Relógios de Luxo'
+STATUS_DEVOLVIDOS = ('Devolução Solicitada',)
+
+_lock = threading.Lock()
+_vitrines = None
+_calculado_em = 0.0
+
+
+def invalidar_vitrines():
+    """Marca as vitrines para serem recalculadas no próximo acesso."""
+    global _vitrines
+    with _lock:
+        _vitrines = None
+
+
+def _calcular_vitrines():
+    relogios = obter_arvore().buscar(CATEGORIA_RELOGIOS)
+
+    def ids(query):
+        return [row[0] for row in query.limit(TAMANHO_VITRINE).all()]
+
+    return {
+        'produtos_recentes': ids(db.session.query(Produto.id_produto)
+                                 .order_by(Produto.data_cadastro.desc())),
+        'mais_vendidos': mais_vendidos_ids(),
+        'relogios_luxo': ids(db.session.query(Produto.id_produto)
+                             .filter(Produto.id_categoria.in_(relogios.ids_subarvore if relogios else ()))
+                             .order_by(Produto.data_cadastro.desc())),
+        'produtos_destaque': ids(db.session.query(Produto.id_produto)
+                                 .order_by(Produto.estoque.desc())),
+    }
+
+
+def obter_vitrines():
+    """Retorna um dict {nome_vitrine: [Produto, ...]} para a Home."""
+    global _vitrines, _calculado_em
+    with _lock:
+        vitrines = _vitrines
+        if vitrines is None or time.monotonic() - _calculado_em > TTL_VITRINES:
+            with leitura_no_primario():
+                vitrines = _vitrines = _calcular_vitrines()
+            _calculado_em = time.monotonic()
+
+    todos_ids = {id_produto for ids in vitrines.values() for id_produto in ids}
+    produtos = {}
+    if todos_ids:
+        produtos = {
+            p.id_produto: p for p in Produto.query.options(joinedload(Produto.vendedor))
+            .filter(Produto.id_produto.in_(todos_ids)).all()
+        }
+
+    return {
+        nome: [produtos[i] for i in ids if i in produtos]
+        for nome, ids in vitrines.items()
+    }
+
+
+# --- CONTADORES DE VENDAS ---
+
+def mais_vendidos_ids(limite=TAMANHO_VITRINE, dias=None):
+    """IDs dos produtos mais vendidos (no total ou nos últimos `dias` dias)."""
+    if dias is None:
+        query = db.session.query(VendasProduto.id_produto).filter(
+            VendasProduto.quantidade > 0
+        ).order_by(VendasProduto.quantidade.desc())
+    else:
+        inicio = date.today() - timedelta(days=dias)
+        total = func.sum(VendasProdutoDia.quantidade)
+        query = db.session.query(VendasProdutoDia.id_produto).filter(
+            VendasProdutoDia.dia >= inicio
+        ).group_by(VendasProdutoDia.id_produto).having(total > 0).order_by(total.desc())
+    return [row[0] for row in query.limit(limite).all()]
+
+
+def _somar(modelo, chave, quantidade):
+    filtros = [getattr(modelo, coluna) == valor for coluna, valor in chave.items()]
+    resultado = db.session.execute(
+        update(modelo).where(*filtros).values(quantidade=modelo.quantidade + quantidade)
+    )
+    if resultado.rowcount == 0:
+        db.session.add(modelo(quantidade=quantidade, **chave))
+
+
+def registrar_vendas(itens, dia=None, sinal=1):
+    """
+    Soma as quantidades de `itens` [(id_produto, quantidade), ...] aos contadores.
+    Não faz commit: roda nas tarefas de vendas/devolução do worker, na mesma
+    transação que conclui a tarefa (os contadores ficam atrás dos pedidos
+    enquanto a fila não é processada).
+    """
+    dia = dia or date.today()
+    totais = Counter()
+    for id_produto, quantidade in itens:
+        totais[id_produto] += quantidade
+
+    for id_produto, quantidade in totais.items():
+        _somar(VendasProduto, {'id_produto': id_produto}, sinal * quantidade)
+        _somar(VendasProdutoDia, {'id_produto': id_produto, 'dia': dia}, sinal * quantidade)
+
+
+def registrar_devolucao(pedido):
+    """Desconta dos contadores as unidades de um pedido devolvido."""
+    itens = [(item.id_produto, item.quantidade) for item in pedido.itens]
+    dia = pedido.data_pedido.date() if pedido.data_pedido else None
+    registrar_vendas(itens, dia=dia, sinal=-1)
+
+
+def marcar_aplicados(efeito, *filtros):
+    """
+    Registra os pedidos que passam em `filtros` como já aplicados por `efeito`
+    (PedidoAplicado), para as tarefas ainda na fila não somarem de novo o que
+    um backfill acabou de contar. Sem commit: roda na transação do backfill.
+    """
+    ids = select(Pedido.id_pedido).where(*filtros)
+    db.session.execute(delete(PedidoAplicado).where(
+        PedidoAplicado.efeito == efeito, PedidoAplicado.id_pedido.in_(ids)
+    ))
+    db.session.execute(insert(PedidoAplicado).from_select(
+        ['id_pedido', 'efeito', 'aplicado_em'],
+        select(Pedido.id_pedido, literal(efeito), literal(datetime.now())).where(*filtros)
+    ))
+
+
+def recalcular_vendas():
+    """Reconstrói os contadores a partir do histórico de ItensPedido (backfill)."""
+    # Só os pedidos que já existem agora: os que chegarem durante o backfill ficam para as tarefas
+    ultimo = db.session.query(func.max(Pedido.id_pedido)).scalar() or 0
+    linhas = db.session.query(
+        ItensPedido.id_produto, Pedido.data_pedido, ItensPedido.quantidade
+    ).join(
+        Pedido, Pedido.id_pedido == ItensPedido.id_pedido
+    ).filter(
+        Pedido.status.notin_(STATUS_DEVOLVIDOS), Pedido.id_pedido <= ultimo
+    ).yield_per(5000)
+
+    por_dia = Counter()
+    for id_produto, data_pedido, quantidade in linhas:
+        por_dia[(id_produto, data_pedido.date())] += quantidade
+
+    VendasProdutoDia.query.delete()
+    VendasProduto.query.delete()
+
+    totais = Counter()
+    for (id_produto, _), quantidade in por_dia.items():
+        totais[id_produto] += quantidade
+    # INSERT em lote (executemany): o histórico pode ter milhões de linhas
+    if por_dia:
+        db.session.execute(insert(VendasProdutoDia), [
+            {'id_produto': id_produto, 'dia': dia, 'quantidade': quantidade}
+            for (id_produto, dia), quantidade in por_dia.items()
+        ])
+    if totais:
+        db.session.execute(insert(VendasProduto), [
+            {'id_produto': id_produto, 'quantidade': quantidade} for id_produto, quantidade in totais.items()
+        ])
+    # Pedidos devolvidos ficaram de fora (venda e devolução se anulam)
+    marcar_aplicados('venda_contadores', Pedido.id_pedido <= ultimo)
+    marcar_aplicados('devolucao_contadores', Pedido.id_pedido <= ultimo, Pedido.status.in_(STATUS_DEVOLVIDOS))
+
+    db.session.commit()
+    invalidar_vitrines()
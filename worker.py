@@ -0,0 +1,54 @@
+"""
+Worker da fila de tarefas (tarefas.py): processa o trabalho adiado pelo app
+(contadores de vendas, resumo dos relatórios, variantes de imagem) fora das
+requisições. Pode haver vários workers no mesmo banco: cada tarefa é
+reservada por um só. SIGTERM/Ctrl+C terminam o lote atual antes de sair.
+
+Uso:
+    python worker.py                          # roda até ser interrompido
+    python worker.py --uma-vez                # esvazia a fila e sai (cron/deploy)
+    python worker.py --tipos vendas_pedido,devolucao_pedido --intervalo 0.5
+"""
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker da fila de tarefas.')
+    parser.add_argument('--uma-vez', action='store_true', help='processa o que estiver pronto e sai')
+    parser.add_argument('--intervalo', type=float, default=1.0, help='segundos de espera com a fila vazia')
+    parser.add_argument('--tipos', help='só estes tipos de tarefa (separados por vírgula)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    from app import app
+    from tarefas import executar_worker, processar_pendentes, recuperar_abandonadas, tipos_registrados
+
+    tipos = [tipo.strip() for tipo in args.tipos.split(',')] if args.tipos else []
+    desconhecidos = [tipo for tipo in tipos if tipo not in tipos_registrados()]
+    if desconhecidos:
+        print(f"Tipos desconhecidos: {', '.join(desconhecidos)} "
+              f"(disponíveis: {', '.join(tipos_registrados())})")
+        return 2
+
+    with app.app_context():
+        if args.uma_vez:
+            recuperar_abandonadas()
+            print(f'{processar_pendentes(tipos)} tarefa(s) processada(s).')
+            return 0
+
+        parar = threading.Event()
+        for sinal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sinal, lambda *_: parar.set())
+        print(f"Worker iniciado ({', '.join(tipos) or 'todos os tipos'}).")
+        executar_worker(args.intervalo, parar, tipos)
+        print('Worker encerrado.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())